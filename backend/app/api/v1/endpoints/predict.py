@@ -1,30 +1,42 @@
 """
 Flood prediction API endpoint.
 """
+import asyncio
+import base64
+import functools
 import io
+import json
 import logging
-import asyncio
-from typing import Tuple
-from fastapi import APIRouter, HTTPException
+import math
+import queue
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, List, Optional, Tuple, TypeVar
+from fastapi import APIRouter, Header, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 import numpy as np
-import rasterio
 from rasterio import transform as rasterio_transform
-from rasterio.warp import reproject, Resampling, calculate_default_transform
 from rasterio.crs import CRS
 from PIL import Image
-import os
-import httpx
-try:
-    from scipy.interpolate import griddata
-except ImportError:
-    # Fallback if scipy not installed
-    griddata = None
-
 from app.schemas.prediction import BoundingBoxRequest
 import app.services.flood_model
-from app.services.anuga_simulator import AnugaSimulator
+from app.services.anuga_simulator import AnugaSimulator, mesh_key
+from app.services.domain_decomposition import plan_subdomains, simulate_decomposed
+from app.services.raster_flood import raster_flood_simulator
+from app.services import open_meteo
+from app.services.weather_cache import weather_cache, lattice_for_bbox, current_forecast_cycle
+from app.services.forecast_cube import get_cube_store
+from app.services.job_queue import DISCONNECTED, INTERACTIVE, PREFETCH, JobCancelled, prediction_queue
+from app.services.prediction_cache import prediction_cache
+from app.services.prefetch import prefetch_scheduler
+from app.services.interpolation import regrid, fill_missing
+from app.services.terrain import load_conditioned_chip, load_terrain_chip
+from app.services.executor import get_stage_executor
 from app.core.config import settings
+from app.core.metrics import (
+    registry, StageTimings, PREDICTIONS, WEATHER_SOURCE, SIMULATION_METHOD, SIMULATION_MESH_CACHE, OUTPUT_BYTES,
+    WEATHER_POINTS_FILLED
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -32,6 +44,169 @@ router = APIRouter()
 # Initialize ANUGA simulator
 anuga_simulator = AnugaSimulator()
 
+T = TypeVar("T")
+
+# How often a streaming prediction checks for new simulation snapshots
+SNAPSHOT_POLL_INTERVAL = 0.25  # seconds
+
+# How often a waiting request checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.25  # seconds
+CLIENT_CLOSED_REQUEST = 499  # Status logged for requests abandoned by their client
+
+registry.callback(
+    "floodlert_prediction_requests_total",
+    "Prediction requests that ran the pipeline versus shared a queued or running run.",
+    "counter",
+    ["result"],
+    lambda: [(("executed",), prediction_queue.executed), (("coalesced",), prediction_queue.coalesced)]
+)
+
+
+def weather_cycle() -> datetime:
+    """
+    Forecast cycle the weather of a new prediction comes from (part of the cache keys).
+    
+    With WEATHER_API_PROVIDER=local_cube this is the cycle of the cube that is
+    actually active, however late it was ingested; otherwise the newest cycle
+    the upstream has published by now.
+    """
+    if settings.WEATHER_API_PROVIDER == "local_cube":
+        try:
+            cycle = get_cube_store(settings.WEATHER_CUBE_PATH).current().cycle
+            return cycle if cycle.tzinfo else cycle.replace(tzinfo=timezone.utc)
+        except (OSError, ValueError):
+            pass  # No cube yet: predictions use synthetic weather, which is never cached
+    return current_forecast_cycle()
+
+
+async def fetch_open_meteo(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    shape: Tuple[int, int]
+) -> Tuple[np.ndarray, str]:
+    """
+    Sample precipitation from Open-Meteo on the global lattice (through the weather cache).
+    
+    Returns:
+        Tuple of (precipitation array with the given shape, weather source label)
+    """
+    # Snap sample points to the global lattice so overlapping bboxes share them
+    lat_indices, lon_indices = lattice_for_bbox(min_lon, min_lat, max_lon, max_lat)
+    lats = lat_indices * settings.WEATHER_LATTICE_STEP
+    lons = lon_indices * settings.WEATHER_LATTICE_STEP
+    keys = [(int(i), int(j)) for i in lat_indices for j in lon_indices]
+    
+    # Serve known lattice points from the cache, fetch only the rest
+    cycle = current_forecast_cycle()
+    series_by_key = weather_cache.get_many(keys, cycle)
+    missing = [key for key in keys if key not in series_by_key]
+    
+    if missing:
+        logger.info(f"Fetching weather data from Open-Meteo for {len(missing)}/{len(keys)} lattice points...")
+        # One multi-location request over the shared connection pool
+        hourly_series = await open_meteo.fetch_hourly_precipitation(
+            [i * settings.WEATHER_LATTICE_STEP for i, _ in missing],
+            [j * settings.WEATHER_LATTICE_STEP for _, j in missing]
+        )
+        fetched = {
+            key: series for key, series in zip(missing, hourly_series) if series is not None
+        }
+        weather_cache.put_many(fetched, cycle)
+        series_by_key.update(fetched)
+    
+    # Points the upstream did not deliver in time: reuse the previous cycle's series
+    undelivered = [key for key in keys if key not in series_by_key]
+    if undelivered:
+        stale = weather_cache.get_stale_many(undelivered)
+        series_by_key.update(stale)
+        if stale:
+            WEATHER_POINTS_FILLED.inc(len(stale), source="stale_cache")
+    
+    if not series_by_key:
+        logger.error("All Open-Meteo API calls failed - no successful fetches")
+        raise Exception("All Open-Meteo API calls failed")
+    
+    logger.info(f"Weather data available for {len(series_by_key)}/{len(keys)} lattice points ({len(keys) - len(missing)} cached)")
+    
+    # Use maximum precipitation in next 24 hours (flood prediction)
+    # Grid rows follow ascending latitude, columns ascending longitude;
+    # points still missing take the value of their nearest neighbour
+    precip_grid = np.array(
+        [max(series_by_key[key]) if key in series_by_key else np.nan for key in keys]
+    ).reshape(len(lats), len(lons))
+    if len(series_by_key) < len(keys):
+        WEATHER_POINTS_FILLED.inc(len(keys) - len(series_by_key), source="neighbour")
+        precip_grid = fill_missing(precip_grid)
+    
+    # Interpolate to desired output resolution (cached bilinear weights;
+    # flip so row 0 is the northern edge)
+    precipitation = regrid(
+        np.flipud(precip_grid),
+        (lons[0], lats[0], lons[-1], lats[-1]),
+        shape,
+        (min_lon, min_lat, max_lon, max_lat)
+    )
+    
+    logger.info(f"Successfully fetched weather data. Max precipitation: {precipitation.max():.2f}mm")
+    weather_source = 'Open-Meteo (replay)' if settings.WEATHER_API_PROVIDER == "replay" else 'Open-Meteo'
+    return precipitation, weather_source
+
+
+def read_local_cube(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    shape: Tuple[int, int]
+) -> Tuple[np.ndarray, str]:
+    """
+    Slice the active local forecast cube and interpolate it to the output grid.
+    
+    Uses the maximum hourly rate over the next WEATHER_CUBE_WINDOW_HOURS.
+    
+    Returns:
+        Tuple of (precipitation array with the given shape, weather source label)
+    """
+    cube = get_cube_store(settings.WEATHER_CUBE_PATH).current()
+    hour_start, hour_stop = cube.hour_window(datetime.now(timezone.utc), settings.WEATHER_CUBE_WINDOW_HOURS)
+    values, extent = cube.max_precipitation(min_lon, min_lat, max_lon, max_lat, hour_start, hour_stop)
+    precipitation = regrid(values, extent, shape, (min_lon, min_lat, max_lon, max_lat))
+    logger.info(
+        f"Read local forecast cube (cycle {cube.cycle.isoformat()}, hours "
+        f"+{cube.hours[hour_start]:.0f}..+{cube.hours[hour_stop - 1]:.0f}). "
+        f"Max precipitation: {precipitation.max():.2f}mm"
+    )
+    return precipitation, f"GFS Local Cube ({cube.cycle.strftime('%Y-%m-%d %HZ')})"
+
+
+def read_local_cube_hours(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    shape: Tuple[int, int]
+) -> Optional[Tuple[np.ndarray, List[datetime]]]:
+    """
+    Hour-by-hour precipitation of the local forecast cube, for chained ANUGA runs.
+    
+    Covers the same WEATHER_CUBE_WINDOW_HOURS as read_local_cube.
+    
+    Returns:
+        Tuple of ((hours, height, width) precipitation rates on the output grid,
+        valid time of every hour), or None if no cube is available
+    """
+    try:
+        cube = get_cube_store(settings.WEATHER_CUBE_PATH).current()
+        hour_start, hour_stop = cube.hour_window(datetime.now(timezone.utc), settings.WEATHER_CUBE_WINDOW_HOURS)
+        values, extent = cube.precipitation_hours(min_lon, min_lat, max_lon, max_lat, hour_start, hour_stop)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No hourly forecast for chained simulation ({e}); simulating the peak rate instead")
+        return None
+    hourly = np.stack([regrid(rates, extent, shape, (min_lon, min_lat, max_lon, max_lat)) for rates in values])
+    return hourly, [cube.valid_time(hour) for hour in range(hour_start, hour_stop)]
+
 
 async def fetch_weather_data(
     min_lon: float,
@@ -43,6 +218,10 @@ async def fetch_weather_data(
     Fetch live weather data (precipitation) for the given bounding box from Open-Meteo.
     
     Uses Open-Meteo API (free, no API key required) to get precipitation forecasts.
+    Sample points are snapped to a global lattice and served from the weather
+    cache when already fetched in the current forecast cycle. With
+    WEATHER_API_PROVIDER=local_cube the locally ingested GFS cube is sliced
+    instead, without any network access.
     
     Args:
         min_lon, min_lat, max_lon, max_lat: Bounding box coordinates
@@ -53,131 +232,13 @@ async def fetch_weather_data(
     width, height = settings.PREDICTION_IMAGE_WIDTH, settings.PREDICTION_IMAGE_HEIGHT
     
     try:
-        # Create a grid of points to sample across the bounding box
-        # Sample every ~50km (adjust based on bounding box size)
-        lat_range = max_lat - min_lat
-        lon_range = max_lon - min_lon
-        
-        # Calculate grid spacing (adaptive based on area size)
-        # Target ~20-30 points total for efficiency
-        n_points = min(25, max(9, int((lat_range + lon_range) * 10)))
-        grid_size = int(np.sqrt(n_points))
-        
-        # Generate sampling grid
-        lats = np.linspace(min_lat, max_lat, grid_size)
-        lons = np.linspace(min_lon, max_lon, grid_size)
-        lat_grid, lon_grid = np.meshgrid(lats, lons)
-        
-        # Flatten for API calls
-        sample_lats = lat_grid.flatten()
-        sample_lons = lon_grid.flatten()
-        
-        logger.info(f"Fetching weather data from Open-Meteo for {len(sample_lats)} points...")
-        
-        # Fetch precipitation data for all points
-        precipitation_values = []
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Open-Meteo allows batch requests, but we'll do individual calls
-            # to ensure we get accurate data for each point
-            tasks = []
-            for lat, lon in zip(sample_lats, sample_lons):
-                url = "https://api.open-meteo.com/v1/forecast"
-                params = {
-                    "latitude": float(lat),
-                    "longitude": float(lon),
-                    "hourly": "precipitation",  # Get hourly precipitation
-                    "forecast_days": 1,  # Get next 24 hours
-                    "timezone": "UTC"
-                }
-                tasks.append(client.get(url, params=params))
-            
-            # Execute all requests in parallel
-            responses = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Extract precipitation data
-            successful_fetches = 0
-            for i, response in enumerate(responses):
-                if isinstance(response, Exception):
-                    logger.warning(f"Failed to fetch weather for point {i}: {response}")
-                    precipitation_values.append(0.0)
-                    continue
-                
-                try:
-                    if response.status_code != 200:
-                        logger.warning(f"API returned status {response.status_code} for point {i}")
-                        precipitation_values.append(0.0)
-                        continue
-                    
-                    data = response.json()
-                    
-                    # Debug: log response structure if missing data
-                    if "hourly" not in data:
-                        logger.warning(f"Open-Meteo response missing 'hourly' key for point {i}. Keys: {list(data.keys())}")
-                        
-                    if "hourly" in data and "precipitation" in data["hourly"]:
-                        # Get maximum precipitation in next 24 hours (flood prediction)
-                        precip_hourly = data["hourly"]["precipitation"]
-                        if precip_hourly and len(precip_hourly) > 0:
-                            # Filter out None values and convert to float
-                            precip_values = [float(p) if p is not None and p is not None else 0.0 for p in precip_hourly]
-                            max_precip = max(precip_values) if precip_values else 0.0
-                            precipitation_values.append(float(max_precip))
-                            successful_fetches += 1
-                        else:
-                            logger.warning(f"Empty precipitation array for point {i}")
-                            precipitation_values.append(0.0)
-                    elif "hourly" in data:
-                        logger.warning(f"Open-Meteo response missing 'precipitation' in hourly data for point {i}. Available: {list(data['hourly'].keys())}")
-                        precipitation_values.append(0.0)
-                    else:
-                        precipitation_values.append(0.0)
-                except (KeyError, ValueError, IndexError, TypeError) as e:
-                    logger.warning(f"Error parsing weather data for point {i}: {e}")
-                    precipitation_values.append(0.0)
-            
-            if successful_fetches == 0:
-                logger.error("All Open-Meteo API calls failed - no successful fetches")
-                raise Exception("All Open-Meteo API calls failed")
-            
-            logger.info(f"Successfully fetched weather data from {successful_fetches}/{len(sample_lats)} points from Open-Meteo")
-        
-        # Reshape to grid
-        precip_grid = np.array(precipitation_values).reshape(grid_size, grid_size)
-        
-        # Interpolate to desired output resolution
-        if griddata is not None:
-            # Create output grid coordinates
-            output_lats = np.linspace(max_lat, min_lat, height)  # Note: reverse for image coords
-            output_lons = np.linspace(min_lon, max_lon, width)
-            output_lat_grid, output_lon_grid = np.meshgrid(output_lats, output_lons)
-            
-            # Flatten input and output for interpolation
-            input_points = np.column_stack([lon_grid.flatten(), lat_grid.flatten()])
-            output_points = np.column_stack([output_lon_grid.flatten(), output_lat_grid.flatten()])
-            
-            # Interpolate using linear interpolation
-            precipitation = griddata(
-                input_points,
-                precip_grid.flatten(),
-                output_points,
-                method='linear',
-                fill_value=0.0
-            ).reshape(height, width)
-            
-            # Handle any NaN values
-            precipitation = np.nan_to_num(precipitation, nan=0.0)
+        if settings.WEATHER_API_PROVIDER == "local_cube":
+            precipitation, weather_source = read_local_cube(min_lon, min_lat, max_lon, max_lat, (height, width))
         else:
-            # Simple upsampling if scipy not available
-            from PIL import Image
-            precip_img = Image.fromarray(precip_grid.astype(np.float32))
-            precip_img = precip_img.resize((width, height), Image.Resampling.BILINEAR)
-            precipitation = np.array(precip_img, dtype=np.float32)
-        
-        logger.info(f"Successfully fetched weather data. Max precipitation: {precipitation.max():.2f}mm")
-        weather_source = 'Open-Meteo'
+            precipitation, weather_source = await fetch_open_meteo(min_lon, min_lat, max_lon, max_lat, (height, width))
         
     except Exception as e:
-        logger.error(f"Error fetching weather data from Open-Meteo: {e}", exc_info=True)
+        logger.error(f"Error fetching weather data ({settings.WEATHER_API_PROVIDER}): {e}", exc_info=True)
         logger.warning("Falling back to synthetic data with realistic typhoon pattern.")
         
         # Fallback to synthetic data with realistic typhoon-like pattern
@@ -229,73 +290,44 @@ async def fetch_weather_data(
     return precipitation, metadata
 
 
-def load_terrain_chip(
-    terrain_path: str,
-    weather_shape: Tuple[int, int],
-    weather_transform: rasterio.Affine,
-    weather_crs: CRS
-) -> np.ndarray:
+def weather_source_label(weather_source: str) -> str:
+    """Metric label for a weather source description."""
+    if weather_source.startswith('Open-Meteo'):
+        return "open-meteo"
+    if weather_source.startswith('GFS Local Cube'):
+        return "local_cube"
+    return "synthetic"
+
+
+def normalize_prediction(flood_prediction: np.ndarray) -> np.ndarray:
     """
-    Load terrain elevation data for the specific region using Rasterio.
+    Stretch a raw flood prediction to 0-1 using its 2nd-98th percentiles.
     
     Args:
-        terrain_path: Path to terrain_data.tif
-        weather_shape: (height, width) of weather data
-        weather_transform: Affine transform of weather data
-        weather_crs: CRS of weather data
+        flood_prediction: 2D array of flood risk
     
     Returns:
-        2D numpy array of terrain elevation [H, W]
+        2D array with values 0-1
     """
-    if not os.path.exists(terrain_path):
-        logger.warning(f"Terrain file not found. Using synthetic data.")
-        return np.random.rand(weather_shape[0], weather_shape[1]) * 1000
+    # Ensure prediction is valid and normalized
+    flood_prediction = np.nan_to_num(flood_prediction, nan=0.0)
+    flood_prediction = np.clip(flood_prediction, 0.0, 1.0)
     
-    terrain_file = rasterio.open(terrain_path)
+    # Use percentile-based normalization for better contrast
+    # This prevents everything from looking the same if values are clustered
+    pred_min = np.percentile(flood_prediction, 2)  # Ignore bottom 2%
+    pred_max = np.percentile(flood_prediction, 98)  # Ignore top 2%
     
-    try:
-        # Get bounding box from weather data transform
-        bounds = rasterio_transform.array_bounds(
-            weather_shape[0], weather_shape[1], weather_transform
-        )
-        
-        # Calculate transform to reproject terrain to match weather data
-        dst_transform, dst_width, dst_height = calculate_default_transform(
-            terrain_file.crs,
-            weather_crs,
-            terrain_file.width,
-            terrain_file.height,
-            left=bounds[0],
-            bottom=bounds[1],
-            right=bounds[2],
-            top=bounds[3]
-        )
-        
-        # Ensure output shape matches weather data
-        if dst_height != weather_shape[0] or dst_width != weather_shape[1]:
-            dst_transform = weather_transform
-            dst_height, dst_width = weather_shape
-        
-        # Read terrain data
-        terrain_data = terrain_file.read(1)
-        
-        # Reproject terrain to match weather data
-        terrain_warped = np.zeros((weather_shape[0], weather_shape[1]), dtype=np.float32)
-        
-        reproject(
-            source=terrain_data,
-            destination=terrain_warped,
-            src_transform=terrain_file.transform,
-            src_crs=terrain_file.crs,
-            dst_transform=weather_transform,
-            dst_crs=weather_crs,
-            resampling=Resampling.bilinear
-        )
-        
-        return terrain_warped
+    if pred_max > pred_min:
+        flood_prediction = (flood_prediction - pred_min) / (pred_max - pred_min)
+        flood_prediction = np.clip(flood_prediction, 0.0, 1.0)
+    else:
+        # If all values are same, add some variation
+        flood_prediction = flood_prediction * 0.3  # Make it mostly low risk
     
-    finally:
-        terrain_file.close()
+    logger.info(f"Flood prediction generated. Range: [{flood_prediction.min():.3f}, {flood_prediction.max():.3f}], Percentiles: [{pred_min:.3f}, {pred_max:.3f}]")
+    
+    return flood_prediction
 
 
 def array_to_png(arr: np.ndarray) -> bytes:
@@ -376,121 +408,427 @@ def array_to_png(arr: np.ndarray) -> bytes:
     return img_bytes.getvalue()
 
 
-@router.post("/predict")
-async def predict_flood(request: BoundingBoxRequest):
+def normalize_bbox(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float
+) -> Tuple[float, float, float, float]:
     """
-    Generate flood prediction for a given bounding box.
+    Snap a bounding box outward to the PREDICTION_BBOX_SNAP grid.
     
-    Flow:
-    1. Fetch live weather data for bounding box
-    2. Load terrain data chip
-    3. Align terrain with weather data
-    4. Stack arrays and run AI model
-    5. Return PNG image
+    Near-identical requests map to the same normalized bbox, so they can share
+    one computation. The response bounds headers report the normalized bbox.
     """
-    flood_model_service = app.services.flood_model.flood_model_service
-    if flood_model_service is None or flood_model_service.model is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Model not loaded. Server may still be initializing."
-        )
+    step = settings.PREDICTION_BBOX_SNAP
+    eps = 1e-9  # Keep coordinates already on the grid from snapping a full step outward
+    return (
+        round(math.floor(min_lon / step + eps) * step, 6),
+        round(math.floor(min_lat / step + eps) * step, 6),
+        round(math.ceil(max_lon / step - eps) * step, 6),
+        round(math.ceil(max_lat / step - eps) * step, 6),
+    )
+
+
+def preview_prediction(
+    precipitation: np.ndarray,
+    weather_transform: rasterio_transform.Affine,
+    weather_crs: CRS
+) -> bytes:
+    """
+    Coarse heuristic estimate for the first frame of a streamed prediction.
     
-    try:
-        # Step 1: Fetch live weather data
-        logger.info(f"Fetching weather data for bbox: {request.min_lon}, {request.min_lat}, {request.max_lon}, {request.max_lat}")
+    Precipitation and terrain are taken at PREDICTION_STREAM_PREVIEW_SIZE²
+    (the terrain pyramid and chip cache serve such small chips cheaply).
+    
+    Returns:
+        PNG image bytes
+    """
+    size = settings.PREDICTION_STREAM_PREVIEW_SIZE
+    bounds = rasterio_transform.array_bounds(precipitation.shape[0], precipitation.shape[1], weather_transform)
+    terrain = load_terrain_chip(
+        settings.TERRAIN_DATA_PATH,
+        (size, size),
+        rasterio_transform.from_bounds(*bounds, size, size),
+        weather_crs
+    )
+    extent = (bounds[0], bounds[1], bounds[2], bounds[3])
+    rain = regrid(precipitation, extent, (size, size), extent)
+    return array_to_png(normalize_prediction(anuga_simulator._simple_flood_estimation(rain, terrain)))
+
+
+def newest_snapshot(snapshots):
+    """Empty a snapshot queue and return the newest item (None if it was empty)."""
+    latest = None
+    while True:
+        try:
+            latest = snapshots.get_nowait()
+        except queue.Empty:
+            return latest
+
+
+async def forward_snapshots(snapshots, progress: asyncio.Queue, done: asyncio.Event) -> None:
+    """
+    Encode simulation snapshots as stream frames until the simulation has finished.
+    
+    Only the newest waiting snapshot is encoded, so a slow client or encoder
+    skips intermediate states instead of falling behind. The queue is read on
+    the thread pool, since reading a manager queue is a blocking round-trip.
+    """
+    executor = get_stage_executor()
+    while True:
+        finished = done.is_set()
+        latest = await executor.run_in_thread("progress", newest_snapshot, snapshots)
+        if latest is not None:
+            simulated_time, raster = latest
+            png_bytes = await executor.run_in_thread("png_encode", array_to_png, raster / 255.0)
+            progress.put_nowait(("snapshot", {"png": png_bytes, "simulated_time": simulated_time}))
+        elif finished:
+            return
+        else:
+            await asyncio.sleep(SNAPSHOT_POLL_INTERVAL)
+
+
+async def generate_prediction(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    progress: Optional[asyncio.Queue] = None
+) -> Tuple[bytes, dict]:
+    """
+    Run the full prediction pipeline for a bounding box.
+    
+    Args:
+        progress: Receives (event, payload) frames of intermediate results
+            while the pipeline runs (see predict_flood_stream)
+    
+    Returns:
+        Tuple of (png_bytes, response_headers)
+    """
+    timings = StageTimings()
+    
+    # Step 1: Fetch live weather data
+    logger.info(f"Fetching weather data for bbox: {min_lon}, {min_lat}, {max_lon}, {max_lat}")
+    with timings.stage("weather"):
         precipitation, weather_metadata = await fetch_weather_data(
-            request.min_lon,
-            request.min_lat,
-            request.max_lon,
-            request.max_lat
+            min_lon,
+            min_lat,
+            max_lon,
+            max_lat
         )
-        
-        # Track weather source
-        weather_source = weather_metadata.get('source', 'Synthetic')
-        
-        # Step 2: Load terrain chip
-        terrain_path = settings.TERRAIN_DATA_PATH
-        terrain = load_terrain_chip(
+    
+    # Track weather source
+    weather_source = weather_metadata.get('source', 'Synthetic')
+    WEATHER_SOURCE.inc(source=weather_source_label(weather_source))
+    
+    executor = get_stage_executor()
+    
+    if progress is not None:
+        with timings.stage("preview"):
+            preview = await executor.run_in_thread(
+                "preview",
+                preview_prediction,
+                precipitation,
+                weather_metadata['transform'],
+                weather_metadata['crs']
+            )
+        progress.put_nowait(("preview", {"png": preview}))
+    
+    # Step 2: Load terrain chip (GDAL releases the GIL, so a thread is enough)
+    terrain_path = settings.TERRAIN_DATA_PATH
+    with timings.stage("terrain"):
+        terrain = await executor.run_in_thread(
+            "terrain",
+            load_terrain_chip,
             terrain_path,
             (precipitation.shape[0], precipitation.shape[1]),
             weather_metadata['transform'],
             weather_metadata['crs']
         )
-        
-        # Step 3 & 4: Run prediction (ANUGA physics-based simulation)
-        logger.info("Running flood prediction simulation...")
-        
-        # Use ANUGA for physics-based flood simulation
+        # Offline hydrologic conditioning, read like the terrain itself
+        conditioned_chip = None
+        if settings.PREDICTION_METHOD == "raster":
+            conditioned_chip = await executor.run_in_thread(
+                "terrain",
+                load_conditioned_chip,
+                (precipitation.shape[0], precipitation.shape[1]),
+                weather_metadata['transform'],
+                weather_metadata['crs']
+            )
+    
+    # Step 3 & 4: Run prediction (ANUGA physics-based simulation)
+    logger.info("Running flood prediction simulation...")
+    
+    # Use ANUGA for physics-based flood simulation
+    # Bboxes too large for one ANUGA mesh are split into overlapping subdomains
+    subdomains = plan_subdomains(precipitation.shape, (min_lon, min_lat, max_lon, max_lat))
+    with timings.stage("simulation"):
         try:
-            if anuga_simulator.available:
-                logger.info("Using ANUGA shallow water equation simulator")
-                flood_prediction = anuga_simulator.simulate_flood(
+            if settings.PREDICTION_METHOD == "raster" and conditioned_chip is not None:
+                logger.info("Using raster flood engine on precomputed terrain conditioning")
+                flood_prediction, simulation_metadata = await executor.run_in_thread(
+                    "simulation",
+                    raster_flood_simulator.simulate_conditioned,
+                    precipitation,
+                    conditioned_chip,
+                    min_lon,
+                    min_lat,
+                    max_lon,
+                    max_lat
+                )
+            elif settings.PREDICTION_METHOD == "raster":
+                # Vectorized NumPy engine: fast enough to stay on the thread pool
+                logger.info("Using raster flood engine (fill, flow routing, ponding)")
+                flood_prediction, simulation_metadata = await executor.run_in_thread(
+                    "simulation",
+                    raster_flood_simulator.simulate_flood_with_metadata,
                     precipitation,
                     terrain,
-                    request.min_lon,
-                    request.min_lat,
-                    request.max_lon,
-                    request.max_lat
+                    min_lon,
+                    min_lat,
+                    max_lon,
+                    max_lat
                 )
+            elif anuga_simulator.available:
+                # With warm starts, the local cube's forecast hours are simulated one after another
+                chain = None
+                if settings.ANUGA_WARM_START and settings.WEATHER_API_PROVIDER == "local_cube":
+                    chain = await executor.run_in_thread(
+                        "weather", read_local_cube_hours, min_lon, min_lat, max_lon, max_lat, precipitation.shape
+                    )
+                # Set if this job is cancelled, so superseded runs stop in their workers
+                cancel = await executor.run_in_thread("progress", executor.cancel_event)
+                # Streamed predictions also get intermediate states: after every yieldstep of
+                # a single domain, or every hour of a decomposed one (stitched in this process)
+                snapshots = None
+                if progress is not None and len(subdomains) > 1:
+                    snapshots = queue.Queue()
+                elif progress is not None:
+                    snapshots = await executor.run_in_thread("progress", executor.progress_queue)
+                if snapshots is not None:
+                    simulation_done = asyncio.Event()
+                    forwarder = asyncio.ensure_future(forward_snapshots(snapshots, progress, simulation_done))
+                try:
+                    if len(subdomains) > 1:
+                        # Large bbox: overlapping subdomains on all process workers
+                        logger.info("Using ANUGA shallow water equation simulator on a decomposed domain")
+                        hourly_precipitation, hours = chain if chain is not None else (precipitation, None)
+                        flood_prediction, simulation_metadata = await simulate_decomposed(
+                            functools.partial(executor.run_in_process, "simulation", cancel=cancel),
+                            anuga_simulator.simulate_subdomain,
+                            hourly_precipitation,
+                            terrain,
+                            subdomains,
+                            cancel,
+                            hours,
+                            snapshots
+                        )
+                    else:
+                        logger.info("Using ANUGA shallow water equation simulator")
+                        if chain is not None:
+                            hourly_precipitation, hours = chain
+                            simulate = anuga_simulator.simulate_forecast_hours
+                            forcing = (hourly_precipitation, terrain, min_lon, min_lat, max_lon, max_lat, hours)
+                        else:
+                            simulate = anuga_simulator.simulate_flood_with_metadata
+                            forcing = (precipitation, terrain, min_lon, min_lat, max_lon, max_lat, None)
+                        flood_prediction, simulation_metadata = await executor.run_in_process(
+                            "simulation",
+                            simulate,
+                            *forcing,
+                            snapshots,
+                            cancel,
+                            affinity=mesh_key(min_lon, min_lat, max_lon, max_lat),
+                            cancel=cancel
+                        )
+                finally:
+                    if snapshots is not None:
+                        simulation_done.set()
+                        await forwarder
             else:
                 # Fallback to U-Net model if ANUGA not available
                 logger.info("ANUGA not available, using simplified estimation")
-                flood_prediction = anuga_simulator._simple_flood_estimation(precipitation, terrain)
+                flood_prediction = await executor.run_in_thread(
+                    "simulation", anuga_simulator._simple_flood_estimation, precipitation, terrain
+                )
+                simulation_metadata = {'method': 'heuristic'}
         except Exception as e:
             logger.error(f"Error in flood prediction: {e}", exc_info=True)
             # Final fallback: simple heuristic
             logger.warning("Using final fallback: simple flood estimation")
-            flood_prediction = anuga_simulator._simple_flood_estimation(precipitation, terrain)
-        
-        # Ensure prediction is valid and normalized
-        flood_prediction = np.nan_to_num(flood_prediction, nan=0.0)
-        flood_prediction = np.clip(flood_prediction, 0.0, 1.0)
-        
-        # Use percentile-based normalization for better contrast
-        # This prevents everything from looking the same if values are clustered
-        pred_min = np.percentile(flood_prediction, 2)  # Ignore bottom 2%
-        pred_max = np.percentile(flood_prediction, 98)  # Ignore top 2%
-        
-        if pred_max > pred_min:
-            flood_prediction = (flood_prediction - pred_min) / (pred_max - pred_min)
-            flood_prediction = np.clip(flood_prediction, 0.0, 1.0)
-        else:
-            # If all values are same, add some variation
-            flood_prediction = flood_prediction * 0.3  # Make it mostly low risk
-        
-        logger.info(f"Flood prediction generated. Range: [{flood_prediction.min():.3f}, {flood_prediction.max():.3f}], Percentiles: [{pred_min:.3f}, {pred_max:.3f}]")
-        
-        # Step 5: Convert to PNG
-        png_bytes = array_to_png(flood_prediction)
-        
-        # Calculate weather stats for display
-        max_precip = float(precipitation.max())
-        avg_precip = float(precipitation.mean())
-        min_precip = float(precipitation.min())
-        
-        logger.info(f"Weather stats - Source: {weather_source}, Max: {max_precip:.2f}mm, Avg: {avg_precip:.2f}mm, Min: {min_precip:.2f}mm")
+            flood_prediction = await executor.run_in_thread(
+                "simulation", anuga_simulator._simple_flood_estimation, precipitation, terrain
+            )
+            simulation_metadata = {'method': 'heuristic'}
+    SIMULATION_METHOD.inc(method=simulation_metadata['method'])
+    if 'mesh_cache' in simulation_metadata:
+        SIMULATION_MESH_CACHE.inc(result=simulation_metadata['mesh_cache'])
+    
+    with timings.stage("normalization"):
+        flood_prediction = await executor.run_in_thread("normalization", normalize_prediction, flood_prediction)
+    
+    # Step 5: Convert to PNG
+    with timings.stage("png_encode"):
+        png_bytes = await executor.run_in_thread("png_encode", array_to_png, flood_prediction)
+    OUTPUT_BYTES.observe(len(png_bytes))
+    
+    # Calculate weather stats for display
+    max_precip = float(precipitation.max())
+    avg_precip = float(precipitation.mean())
+    min_precip = float(precipitation.min())
+    
+    logger.info(f"Weather stats - Source: {weather_source}, Max: {max_precip:.2f}mm, Avg: {avg_precip:.2f}mm, Min: {min_precip:.2f}mm")
+    
+    response_headers = {
+        "X-Bounds-MinLon": str(min_lon),
+        "X-Bounds-MinLat": str(min_lat),
+        "X-Bounds-MaxLon": str(max_lon),
+        "X-Bounds-MaxLat": str(max_lat),
+        "X-Weather-MaxPrecip": str(max_precip),
+        "X-Weather-AvgPrecip": str(avg_precip),
+        "X-Weather-MinPrecip": str(min_precip),
+        "X-Weather-Source": weather_source,
+        "X-Simulation-Method": simulation_metadata['method'],
+        "Server-Timing": timings.server_timing(),
+    }
+    if 'simulated_time' in simulation_metadata:
+        response_headers["X-Simulation-Time"] = f"{simulation_metadata['simulated_time']:.0f}"
+        response_headers["X-Simulation-Steps"] = str(simulation_metadata['steps'])
+        response_headers["X-Simulation-Converged"] = str(simulation_metadata['converged']).lower()
+        response_headers["X-Simulation-Warm-Start"] = str(simulation_metadata.get('warm_start', False)).lower()
+    if 'forecast_hours' in simulation_metadata:
+        response_headers["X-Simulation-Forecast-Hours"] = str(simulation_metadata['forecast_hours'])
+    if 'subdomains' in simulation_metadata:
+        response_headers["X-Simulation-Subdomains"] = str(simulation_metadata['subdomains'])
+    
+    return png_bytes, response_headers
+
+
+def runs_simulation() -> bool:
+    """Whether generate_prediction runs ANUGA in a worker process (the job queue limits those separately)."""
+    return settings.PREDICTION_METHOD != "raster" and anuga_simulator.available
+
+
+def cache_prediction(key, png_bytes: bytes, response_headers: dict, prefetched: bool = False) -> None:
+    """Keep a finished prediction for the rest of its forecast cycle (synthetic fallbacks are not kept)."""
+    if response_headers.get("X-Weather-Source", "").startswith("Synthetic"):
+        return
+    prediction_cache.put(key, png_bytes, response_headers, prefetched=prefetched)
+
+
+async def prefetch_prediction(bbox: Tuple[float, float, float, float], cycle) -> None:
+    """Compute and cache a prediction ahead of demand (run by the prefetch scheduler)."""
+    if cycle != weather_cycle():
+        return  # Superseded by a newer forecast cycle while queued
+    key = (bbox, cycle)
+    png_bytes, response_headers = await prediction_queue.run(
+        key, lambda: generate_prediction(*bbox), priority=PREFETCH, simulation=runs_simulation()
+    )
+    cache_prediction(key, png_bytes, response_headers, prefetched=True)
+
+
+async def cancel_on_disconnect(http_request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Await a prediction, abandoning it if the client disconnects first.
+    
+    Raises:
+        JobCancelled: The client disconnected (or the queue cancelled the request)
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise JobCancelled(DISCONNECTED)
+    finally:
+        # Leaving the queue cancels the job once no other request waits for it
+        task.cancel()
+
+
+@router.post("/predict")
+async def predict_flood(
+    request: BoundingBoxRequest,
+    http_request: Request,
+    x_session_id: Optional[str] = Header(None)
+):
+    """
+    Generate flood prediction for a given bounding box.
+    
+    Flow:
+    1. Fetch live weather data for bounding box
+    2. Load terrain data chip
+    3. Align terrain with weather data
+    4. Stack arrays and run AI model
+    5. Return PNG image
+    
+    Concurrent requests for the same normalized bbox within a forecast cycle
+    share a single computation, and finished predictions are served from the
+    prediction cache for the rest of the cycle. The Server-Timing header
+    carries the stage durations of that computation (or a cache hit) plus
+    this request's own total.
+    
+    Computations go through the prediction job queue ahead of prefetch work.
+    A computation nobody waits for any more is cancelled: the client
+    disconnected, or its session (X-Session-Id header) sent a newer request,
+    in which case this one is answered with 409.
+    """
+    flood_model_service = app.services.flood_model.flood_model_service
+    if flood_model_service is None or flood_model_service.model is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded. Server may still be initializing."
+        )
+    
+    started = time.perf_counter()
+    try:
+        bbox = normalize_bbox(request.min_lon, request.min_lat, request.max_lon, request.max_lat)
+        key = (bbox, weather_cycle())
+        with prefetch_scheduler.live_request(bbox):
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                png_bytes, response_headers = cached.png_bytes, cached.headers
+                stage_timings = 'cache;desc="hit"'
+            else:
+                png_bytes, response_headers = await cancel_on_disconnect(
+                    http_request,
+                    prediction_queue.run(
+                        key,
+                        lambda: generate_prediction(*bbox),
+                        priority=INTERACTIVE,
+                        session=x_session_id,
+                        simulation=runs_simulation()
+                    )
+                )
+                cache_prediction(key, png_bytes, response_headers)
+                stage_timings = response_headers["Server-Timing"]
         
-        # Return as streaming response
-        response_headers = {
-            "X-Bounds-MinLon": str(request.min_lon),
-            "X-Bounds-MinLat": str(request.min_lat),
-            "X-Bounds-MaxLon": str(request.max_lon),
-            "X-Bounds-MaxLat": str(request.max_lat),
-            "X-Weather-MaxPrecip": str(max_precip),
-            "X-Weather-AvgPrecip": str(avg_precip),
-            "X-Weather-MinPrecip": str(min_precip),
-            "X-Weather-Source": weather_source,
-        }
+        total = time.perf_counter() - started
+        # Copy: coalesced and cached requests share the same headers dict
+        response_headers = dict(response_headers)
+        response_headers["Server-Timing"] = f"{stage_timings}, total;dur={total * 1000:.1f}"
+        PREDICTIONS.inc(outcome="success")
         
         logger.debug(f"Sending response headers: {response_headers}")
         
+        # Return as streaming response
         return StreamingResponse(
             io.BytesIO(png_bytes),
             media_type="image/png",
             headers=response_headers
         )
     
+    except JobCancelled as e:
+        PREDICTIONS.inc(outcome="cancelled")
+        logger.info(f"Prediction request cancelled ({e.reason})")
+        if e.reason == DISCONNECTED:
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+        raise HTTPException(status_code=409, detail="Superseded by a newer request from the same session")
+    
     except Exception as e:
+        PREDICTIONS.inc(outcome="error")
         logger.error(f"Error generating flood prediction: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
@@ -498,6 +836,114 @@ async def predict_flood(request: BoundingBoxRequest):
         )
 
 
+def sse_event(event: str, payload: dict) -> bytes:
+    """Format one Server-Sent Event; PNG bytes in the payload are base64-encoded."""
+    if "png" in payload:
+        payload = dict(payload, png=base64.b64encode(payload["png"]).decode("ascii"))
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+async def stream_prediction(
+    bbox: Tuple[float, float, float, float],
+    key,
+    session: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Produce the events of a streamed prediction, ending with the final raster.
+    
+    A cache hit sends the final frame straight away. A request joining a
+    prediction already queued or running only receives the final frame, since
+    the intermediate ones go to the request that started it. Closing the
+    stream (client disconnect) leaves the job queue.
+    """
+    started = time.perf_counter()
+    progress: asyncio.Queue = asyncio.Queue()
+    getter = None
+    run = None
+    try:
+        with prefetch_scheduler.live_request(bbox):
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                png_bytes, response_headers = cached.png_bytes, cached.headers
+                stage_timings = 'cache;desc="hit"'
+            else:
+                run = asyncio.ensure_future(prediction_queue.run(
+                    key,
+                    lambda: generate_prediction(*bbox, progress=progress),
+                    priority=INTERACTIVE,
+                    session=session,
+                    simulation=runs_simulation()
+                ))
+                while True:
+                    getter = asyncio.ensure_future(progress.get())
+                    await asyncio.wait({getter, run}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        break
+                    yield sse_event(*getter.result())
+                getter.cancel()
+                while not progress.empty():
+                    yield sse_event(*progress.get_nowait())
+                
+                png_bytes, response_headers = run.result()
+                cache_prediction(key, png_bytes, response_headers)
+                stage_timings = response_headers["Server-Timing"]
+        
+        total = time.perf_counter() - started
+        response_headers = dict(response_headers)
+        response_headers["Server-Timing"] = f"{stage_timings}, total;dur={total * 1000:.1f}"
+        PREDICTIONS.inc(outcome="success")
+        yield sse_event("final", {"png": png_bytes, "headers": response_headers})
+    
+    except JobCancelled as e:
+        PREDICTIONS.inc(outcome="cancelled")
+        yield sse_event("cancelled", {"reason": e.reason})
+    except Exception as e:
+        PREDICTIONS.inc(outcome="error")
+        logger.error(f"Error streaming flood prediction: {e}", exc_info=True)
+        yield sse_event("error", {"detail": f"Failed to generate prediction: {str(e)}"})
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if run is not None:
+            run.cancel()
+
+
+@router.post("/predict/stream")
+async def predict_flood_stream(request: BoundingBoxRequest, x_session_id: Optional[str] = Header(None)):
+    """
+    Generate a flood prediction as a stream of progressively better rasters.
+    
+    Server-Sent Events, each with a JSON payload whose "png" field is a
+    base64-encoded PNG:
+    
+    - preview: heuristic estimate at PREDICTION_STREAM_PREVIEW_SIZE², sent as
+      soon as the weather is in
+    - snapshot: ANUGA state after a yieldstep, with "simulated_time" (seconds);
+      only when ANUGA runs. Bboxes split into subdomains send one stitched
+      snapshot per forecast hour instead
+    - final: the same image as /predict, with its response headers in "headers"
+    - cancelled: "reason" is "superseded" when the session (X-Session-Id)
+      sent a newer request; the stream ends
+    - error: "detail" describes the failure; the stream ends
+    
+    Caching, coalescing and queueing work as for /predict.
+    """
+    flood_model_service = app.services.flood_model.flood_model_service
+    if flood_model_service is None or flood_model_service.model is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded. Server may still be initializing."
+        )
+    
+    bbox = normalize_bbox(request.min_lon, request.min_lat, request.max_lon, request.max_lat)
+    key = (bbox, weather_cycle())
+    return StreamingResponse(
+        stream_prediction(bbox, key, x_session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
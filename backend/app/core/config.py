@@ -16,13 +16,83 @@ class Settings(BaseSettings):
     # Model Configuration
     MODEL_PATH: Optional[str] = None  # Will default to data/flood_model.pth
     TERRAIN_DATA_PATH: str = "data/terrain_data.tif"
+    TERRAIN_PYRAMID_PATH: Optional[str] = None  # Built by app.tools.build_terrain_pyramid, e.g. "data/terrain_pyramid"
+    TERRAIN_CHIP_CACHE_PATH: Optional[str] = None  # Shared across workers, e.g. "/dev/shm/floodlert_terrain_chips"
+    TERRAIN_CHIP_CACHE_MB: int = 256  # Byte budget of the shared chip cache
+    TERRAIN_HANDLES_PER_THREAD: int = 4  # Open terrain datasets kept per worker thread
+    TERRAIN_GDAL_CACHE_MB: int = 512  # GDAL block cache, keeps hot terrain blocks in memory
     
     # Weather API Configuration
     # Using Open-Meteo (free, no API key required)
-    WEATHER_API_PROVIDER: str = "open-meteo"  # Options: "open-meteo", "synthetic"
-    
+    WEATHER_API_PROVIDER: str = "open-meteo"  # Options: "open-meteo", "synthetic", "record", "replay", "local_cube"
+    OPEN_METEO_URL: str = "https://api.open-meteo.com/v1/forecast"
+    WEATHER_HTTP_TIMEOUT: float = 30.0  # seconds
+    WEATHER_HTTP_MAX_CONNECTIONS: int = 10  # Shared keep-alive pool size
+    WEATHER_HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds
+    WEATHER_BATCH_CHUNK_SIZE: int = 10  # Points per request when a full batch fails
+    WEATHER_FETCH_DEADLINE: float = 4.0  # seconds, overall budget for one weather fetch
+    WEATHER_HEDGE_DELAY: float = 1.0  # seconds before a duplicate request is sent for a straggler
+    WEATHER_BREAKER_ERROR_RATE: float = 0.5  # Recent error rate that opens the circuit breaker
+    WEATHER_BREAKER_MIN_REQUESTS: int = 10  # Requests in the window before the breaker may open
+    WEATHER_BREAKER_WINDOW: float = 60.0  # seconds of request history considered
+    WEATHER_BREAKER_COOLDOWN: float = 30.0  # seconds the breaker stays open before a trial request
+
+    # Weather Record/Replay Configuration
+    WEATHER_ARCHIVE_PATH: str = "data/weather_archive.sqlite"  # Written by "record", served by "replay"
+    WEATHER_REPLAY_LATENCY_MS: float = 0.0  # Injected latency per replayed upstream request
+    WEATHER_REPLAY_LATENCY_JITTER_MS: float = 0.0  # Uniform +/- jitter on the injected latency
+    WEATHER_REPLAY_ERROR_RATE: float = 0.0  # Fraction of replayed requests that fail
+    WEATHER_REPLAY_CYCLE: Optional[str] = None  # ISO forecast cycle to replay (default: newest recorded)
+    WEATHER_REPLAY_SEED: Optional[int] = None  # Seed for injected latency/errors
+
+    # Local Forecast Cube Configuration (WEATHER_API_PROVIDER=local_cube)
+    WEATHER_CUBE_PATH: str = "data/forecast_cube"  # Written by app.tools.ingest_forecast
+    WEATHER_CUBE_WINDOW_HOURS: float = 24.0  # Forecast hours ahead to take the maximum over
+
+    # Weather Cache Configuration
+    WEATHER_LATTICE_STEP: float = 0.05  # degrees, global sampling lattice
+    WEATHER_LATTICE_MAX_POINTS_PER_SIDE: int = 8  # Lattice is coarsened (x2) beyond this
+    WEATHER_CACHE_MAX_POINTS: int = 20000  # LRU bound on cached lattice points
+    WEATHER_CACHE_PATH: Optional[str] = None  # e.g. "data/weather_cache.json" to persist across restarts
+    WEATHER_FORECAST_CYCLE_HOURS: int = 6  # GFS runs at 00/06/12/18 UTC
+    WEATHER_FORECAST_PUBLISH_DELAY_HOURS: float = 4.0  # Time until a cycle is available
+
     # Prediction Method Configuration
-    PREDICTION_METHOD: str = "anuga"  # Options: "anuga" (physics-based), "unet" (ML-based)
+    PREDICTION_METHOD: str = "anuga"  # Options: "anuga" (physics-based), "raster" (fill/route/pond; needs a pyramid conditioned by app.tools.condition_terrain), "unet" (ML-based)
+    PREDICTION_BBOX_SNAP: float = 0.01  # degrees, requests are snapped outward to this grid
+    PREDICTION_CACHE_MB: int = 64  # Finished PNGs kept for the current forecast cycle
+    PREDICTION_MAX_RUNNING: int = 0  # Pipeline runs at once, the rest queue by priority (0 = simulation slots plus one per thread worker)
+    PREDICTION_MAX_SIMULATIONS: int = 0  # Of those, runs simulating in worker processes (0 = one per process worker)
+    PREDICTION_STREAM_PREVIEW_SIZE: int = 64  # First frame of /predict/stream (pixels per side)
+
+    # Prefetch Configuration
+    PREFETCH_ENABLED: bool = True  # Precompute hot bboxes when a new forecast cycle is published
+    PREFETCH_TOP_N: int = 20  # Hottest bboxes prefetched per cycle
+    PREFETCH_HALF_LIFE_HOURS: float = 6.0  # Decay of per-bbox request counts
+    PREFETCH_CPU_BUDGET: float = 0.25  # Max fraction of wall time spent prefetching
+    PREFETCH_CHECK_INTERVAL: float = 60.0  # seconds between forecast cycle checks
+    PREFETCH_MAX_TRACKED: int = 1000  # Bboxes tracked before the coldest are dropped
+    
+    # Execution Configuration
+    EXECUTOR_THREAD_WORKERS: int = 4  # Terrain loading, normalization, PNG encoding
+    EXECUTOR_PROCESS_WORKERS: int = 2  # ANUGA simulations (0 = run them on the thread pool)
+    
+    # Raster Flood Engine Configuration
+    RASTER_STORM_HOURS: float = 1.0  # Duration the precipitation rates are applied for
+    
+    # ANUGA Configuration
+    ANUGA_MAX_TRIANGLE_AREA: float = 0.001  # Mesh resolution (degrees²)
+    ANUGA_MESH_CACHE_SIZE: int = 8  # Meshes kept warm per simulation worker
+    ANUGA_STORAGE_DIR: str = ""  # SWW output for debugging, e.g. /dev/shm/floodlert ("" = no output)
+    ANUGA_FINAL_TIME: float = 3600.0  # Simulated seconds at most of a cold run (spin-up when chaining hours)
+    ANUGA_MIN_YIELDSTEP: float = 60.0  # seconds, first and shortest convergence check interval
+    ANUGA_MAX_YIELDSTEP: float = 600.0  # seconds
+    ANUGA_STEADY_TOLERANCE: float = 0.001  # meters/hour, max change of any depth trend between yieldsteps counted as steady flow
+    ANUGA_WARM_START: bool = False  # Chain the local cube's forecast hours, each starting from the previous hour's end state
+    ANUGA_CHECKPOINT_PATH: str = "data/simulation_checkpoints"  # float32 end states per bbox and hour
+    ANUGA_CHECKPOINT_MAX_AGE_HOURS: float = 6.0
+    ANUGA_SUBDOMAIN_MAX_TRIANGLES: int = 20000  # Larger meshes are split into subdomains run in parallel (0 = never)
+    ANUGA_SUBDOMAIN_OVERLAP: float = 0.15  # Overlap per interior side, as a fraction of the subdomain size
     
     # Image Generation
     PREDICTION_IMAGE_WIDTH: int = 512
@@ -0,0 +1,248 @@
+"""
+Lightweight Prometheus metrics and per-request stage timings.
+
+Implements just enough of the Prometheus text exposition format (counters,
+histograms and callback-backed metrics) to serve /metrics without an extra
+dependency. Metrics are per worker process, like prometheus_client without
+its multiprocess mode.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Dict[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in (extra or {}).items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increase the counter for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """Current value for the given label values."""
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """Record one observation."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        """Number of observations for the given label values."""
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class CallbackMetric:
+    """Metric whose samples are read from existing counters when /metrics is scraped."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]]
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics of this process and renders them for /metrics."""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, object]" = OrderedDict()
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]]
+    ) -> CallbackMetric:
+        metric = CallbackMetric(name, documentation, metric_type, labelnames, collect)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "floodlert_stage_duration_seconds",
+    "Duration of each prediction pipeline stage.",
+    ["stage"]
+)
+PREDICTIONS = registry.counter(
+    "floodlert_predictions_total",
+    "Prediction requests by outcome.",
+    ["outcome"]
+)
+WEATHER_SOURCE = registry.counter(
+    "floodlert_weather_source_total",
+    "Weather fetches by data source actually used (open-meteo, local_cube or synthetic fallback).",
+    ["source"]
+)
+WEATHER_POINTS_FILLED = registry.counter(
+    "floodlert_weather_points_filled_total",
+    "Weather lattice points not delivered by the provider, by how they were filled.",
+    ["source"]
+)
+SIMULATION_METHOD = registry.counter(
+    "floodlert_simulation_method_total",
+    "Flood simulations by method actually used (anuga, raster or heuristic fallback).",
+    ["method"]
+)
+SIMULATION_MESH_CACHE = registry.counter(
+    "floodlert_simulation_mesh_cache_total",
+    "ANUGA runs by whether the worker had the bbox's mesh cached (hit) or had to mesh it (miss).",
+    ["result"]
+)
+OUTPUT_BYTES = registry.histogram(
+    "floodlert_output_bytes",
+    "Size of encoded prediction images.",
+    buckets=BYTES_BUCKETS
+)
+
+
+class StageTimings:
+    """
+    Collects stage durations for one request.
+
+    Every stage is also observed in the floodlert_stage_duration_seconds histogram.
+    """
+
+    def __init__(self):
+        self.durations: "OrderedDict[str, float]" = OrderedDict()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one pipeline stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            self.durations[name] = self.durations.get(name, 0.0) + duration
+            STAGE_DURATION.observe(duration, stage=name)
+
+    def server_timing(self, extra: Dict[str, float] = None) -> str:
+        """Format durations as a Server-Timing header value (milliseconds)."""
+        durations = OrderedDict(self.durations)
+        durations.update(extra or {})
+        return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in durations.items())
@@ -2,12 +2,24 @@
 Main FastAPI application for FloodLert AI.
 """
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 from app.api.v1.endpoints import predict
 from app.core.config import settings
+from app.core.metrics import registry
+from app.services.anuga_simulator import warm_worker
 from app.services.flood_model import FloodModelService
+from app.services import open_meteo
+from app.services import weather_archive
+from app.services.weather_cache import weather_cache
+from app.services import terrain
+from app.services import chip_cache
+from app.services import executor
+from app.services.job_queue import prediction_queue
+from app.services.prediction_cache import prediction_cache
+from app.services.prefetch import prefetch_scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -39,6 +51,14 @@ app.add_middleware(
         "X-Weather-AvgPrecip",
         "X-Weather-MinPrecip",
         "X-Weather-Source",
+        "X-Simulation-Method",
+        "X-Simulation-Time",
+        "X-Simulation-Steps",
+        "X-Simulation-Converged",
+        "X-Simulation-Warm-Start",
+        "X-Simulation-Forecast-Hours",
+        "X-Simulation-Subdomains",
+        "Server-Timing",
     ],
 )
 
@@ -54,6 +74,26 @@ app.include_router(
 async def startup_event():
     """Load the flood prediction model when the server starts."""
     logger.info("Starting FloodLert AI server...")
+
+    # Must happen before the first terrain read sizes GDAL's block cache
+    terrain.configure_gdal_cache(settings.TERRAIN_GDAL_CACHE_MB)
+
+    # The raster engine only meets its latency budget on offline-conditioned terrain
+    if settings.PREDICTION_METHOD == "raster" and not terrain.conditioning_available():
+        logger.warning(
+            "PREDICTION_METHOD is 'raster' but TERRAIN_PYRAMID_PATH has no conditioned levels: "
+            "every request will condition its own terrain, well over 100 ms at 512x512. "
+            "Run python -m app.tools.condition_terrain on the pyramid."
+        )
+
+    # Warped terrain chips shared by all workers
+    if settings.TERRAIN_CHIP_CACHE_PATH:
+        chip_cache.chip_cache = chip_cache.create_chip_cache(
+            settings.TERRAIN_CHIP_CACHE_PATH,
+            settings.TERRAIN_CHIP_CACHE_MB,
+            (settings.PREDICTION_IMAGE_HEIGHT, settings.PREDICTION_IMAGE_WIDTH)
+        )
+
     logger.info("Loading flood prediction model...")
     
     model_service = FloodModelService(model_path=settings.MODEL_PATH)
@@ -62,7 +102,23 @@ async def startup_event():
     # Make it globally accessible
     import app.services.flood_model
     app.services.flood_model.flood_model_service = model_service
-    
+
+    # Shared keep-alive connection pool for weather API requests
+    open_meteo.http_client = open_meteo.create_http_client()
+
+    # Thread/process pools for CPU-bound prediction stages; workers import ANUGA as they spawn
+    executor.stage_executor = executor.create_stage_executor(initializer=warm_worker)
+    executor.stage_executor.start()
+
+    # Start with a warm weather cache if one was persisted
+    if settings.WEATHER_CACHE_PATH:
+        weather_cache.load(settings.WEATHER_CACHE_PATH)
+
+    # Precompute hot regions whenever a new forecast cycle is published
+    if settings.PREFETCH_ENABLED:
+        prefetch_scheduler.cycle_fn = predict.weather_cycle  # Follows the active cube with local_cube
+        prefetch_scheduler.start(predict.prefetch_prediction, skip=lambda key: key in prediction_cache)
+
     logger.info("Server startup complete. Model loaded and ready.")
 
 
@@ -70,6 +126,22 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on server shutdown."""
     logger.info("Shutting down FloodLert AI server...")
+    await prefetch_scheduler.stop()
+    await open_meteo.close_http_client()
+    weather_archive.close_archive()
+    if executor.stage_executor is not None:
+        executor.stage_executor.shutdown()
+        executor.stage_executor = None
+    terrain.terrain_pool.close_all()
+    if chip_cache.chip_cache is not None:
+        chip_cache.chip_cache.close()
+        chip_cache.chip_cache = None
+
+    if settings.WEATHER_CACHE_PATH:
+        try:
+            weather_cache.save(settings.WEATHER_CACHE_PATH)
+        except OSError as e:
+            logger.error(f"Could not save weather cache: {e}")
 
 
 @app.get("/")
@@ -89,6 +161,23 @@ async def health():
     flood_model_service = app.services.flood_model.flood_model_service
     return {
         "status": "healthy",
-        "model_loaded": flood_model_service is not None and flood_model_service.model is not None
+        "model_loaded": flood_model_service is not None and flood_model_service.model is not None,
+        "weather_cache": weather_cache.stats(),
+        "weather_breaker": open_meteo.breaker.stats(),
+        "prediction_queue": prediction_queue.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "prefetch": dict(
+            prefetch_scheduler.stats(),
+            # Share of live requests answered by a prefetched prediction
+            hit_contribution=prediction_cache.prefetch_hits / max(1, prefetch_scheduler.live_requests)
+        ),
+        "terrain_handles": terrain.terrain_pool.stats(),
+        "terrain_chip_cache": chip_cache.chip_cache.stats() if chip_cache.chip_cache is not None else None,
+        "stages": executor.stage_executor.stats() if executor.stage_executor is not None else {}
     }
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker process."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,13 +1,57 @@
 """
 ANUGA-based flood simulation service.
 Uses physics-based shallow water equation simulation for flood prediction.
+
+Simulations run in long-lived worker processes (see executor.StageExecutor).
+Meshing is the expensive, request-independent part of a run, so every worker
+keeps the domains it has built in a small LRU cache keyed by the snapped bbox
+and mesh resolution. A repeat request for the same bbox resets the quantities
+on the cached domain instead of meshing again.
+
+Runs touch no disk: the mesh is generated in memory (a rectangular cross mesh
+in local metric coordinates) and SWW output is switched off, since only the
+final centroid depths are used. Setting ANUGA_STORAGE_DIR (ideally a tmpfs
+such as /dev/shm) keeps SWW output for debugging, one file per mesh that each
+run overwrites.
+
+Inputs are sampled onto the mesh with one sparse product per run: terrain at
+the triangle vertices (elevation) and precipitation at the centroids
+(per-triangle rainfall, applied through a rate operator).
+
+Runs stop early once the flow is steady. Under constant rain in a closed
+domain depths never stop rising, but every triangle settles into a constant
+depth trend: hillslopes reach an equilibrium film and depressions fill at a
+constant rate. Depth trends (meters per simulated hour) are compared at
+every yieldstep and the run ends when no triangle's trend changed by more
+than ANUGA_STEADY_TOLERANCE. The remaining time up to the final time is then
+extrapolated along those trends, which is what the full run would give for
+as long as the flow stays steady. Yieldsteps start short, so quiet domains
+are detected quickly, and grow while the trends keep settling.
+
+With ANUGA_WARM_START, the end state of every run is checkpointed per bbox and
+forecast hour (see simulation_checkpoint), and simulate_forecast_hours
+chains the hours of a forecast: the first hour is a cold run (spin-up, up to
+ANUGA_FINAL_TIME under that hour's rain), every later hour starts from the
+previous hour's checkpoint and simulates only the interval between the two
+hours under its own rain. A run that finds the checkpoint of the hour before
+its own (e.g. written by an earlier chain) starts from it as well.
+
+Bboxes too large for one mesh are split into overlapping subdomains, one run
+per process worker, by domain_decomposition (see simulate_subdomain).
 """
+import hashlib
 import logging
+import math
+import threading
+from collections import OrderedDict
 import numpy as np
-from typing import Tuple, Optional
-import tempfile
+from typing import Callable, Hashable, Optional, Sequence, Tuple
 import os
-from pathlib import Path
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.services.simulation_checkpoint import checkpoint_store, forecast_hour
+from app.services.interpolation import Extent, grid_to_points_weights, points_to_grid
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +62,292 @@ except ImportError:
     ANUGA_AVAILABLE = False
     logger.warning("ANUGA not installed. Install with: conda install -c conda-forge anuga")
 
+# Coordinates are rounded in mesh keys so float noise does not defeat reuse
+_KEY_DECIMALS = 6
+
+METERS_PER_DEGREE = 111320.0  # Along a meridian, and along the equator
+
+
+class SimulationCancelled(Exception):
+    """Raised inside a simulation whose cancel event was set (see StageExecutor.cancel_event)."""
+
+
+def mesh_key(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    resolution: Optional[float] = None
+) -> Tuple[float, ...]:
+    """
+    Key of the mesh for a (snapped) bbox and maximum triangle area.
+
+    Also used as the executor affinity key, so requests for the same bbox go
+    to the worker that already holds its mesh.
+    """
+    resolution = settings.ANUGA_MAX_TRIANGLE_AREA if resolution is None else resolution
+    return tuple(round(float(v), _KEY_DECIMALS) for v in (min_lon, min_lat, max_lon, max_lat, resolution))
+
+
+def mesh_dimensions(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> Tuple[int, int]:
+    """(columns, rows) of square cells meshing the bbox; each cell holds four triangles."""
+    # Cells of four triangles, each no larger than the configured area
+    cell_size = 2.0 * math.sqrt(settings.ANUGA_MAX_TRIANGLE_AREA)  # degrees
+    columns = max(1, math.ceil((max_lon - min_lon) / cell_size))
+    rows = max(1, math.ceil((max_lat - min_lat) / cell_size))
+    return columns, rows
+
+
+class SimulationMesh:
+    """A meshed ANUGA domain and its vertex/centroid geometry, reusable across runs."""
+
+    def __init__(
+        self,
+        domain,
+        vertex_x: np.ndarray,
+        vertex_y: np.ndarray,
+        centroid_x: np.ndarray,
+        centroid_y: np.ndarray
+    ):
+        """
+        Args:
+            domain: ANUGA domain with boundaries set
+            vertex_x, vertex_y: Absolute coordinates of the 3 vertices of every
+                triangle, flattened triangle by triangle (3 * N)
+            centroid_x, centroid_y: Absolute centroid coordinates (N)
+        """
+        self.domain = domain
+        self.vertex_x = vertex_x
+        self.vertex_y = vertex_y
+        self.centroid_x = centroid_x
+        self.centroid_y = centroid_y
+        self.rainfall = None  # Rate operator, created on the first run
+        self.runs = 0
+        self.lock = threading.Lock()  # Held for a whole run; only matters when workers are threads
+        self._weights: dict = {}
+
+    def sampling_weights(self, shape: Tuple[int, int], extent: Extent):
+        """Bilinear weights from a raster to all vertices followed by all centroids."""
+        key = (tuple(shape), extent)
+        weights = self._weights.get(key)
+        if weights is None:
+            weights = grid_to_points_weights(
+                shape,
+                extent,
+                np.concatenate([self.vertex_x, self.centroid_x]),
+                np.concatenate([self.vertex_y, self.centroid_y])
+            )
+            self._weights = {key: weights}  # Inputs keep one shape per mesh in practice
+        return weights
+
+
+def sample_mesh_inputs(
+    mesh: SimulationMesh,
+    terrain: np.ndarray,
+    precipitation: np.ndarray,
+    extent: Extent
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sample terrain and precipitation rasters onto a mesh in one sparse product.
+
+    Args:
+        mesh: Target mesh
+        terrain: 2D terrain elevation (meters), same grid as precipitation
+        precipitation: 2D precipitation rates (mm/hour)
+        extent: (min_lon, min_lat, max_lon, max_lat) of both rasters
+
+    Returns:
+        Tuple of (vertex elevations (N, 3) in meters, centroid rainfall rates (N,) in m/s)
+    """
+    if terrain.shape != precipitation.shape:
+        raise ValueError(f"Terrain {terrain.shape} and precipitation {precipitation.shape} grids differ")
+    weights = mesh.sampling_weights(precipitation.shape, extent)
+    rasters = np.column_stack([
+        np.asarray(terrain, dtype=np.float64).ravel(),
+        np.asarray(precipitation, dtype=np.float64).ravel(),
+    ])
+    samples = weights @ rasters
+    n_vertices = mesh.vertex_x.size
+    elevation = samples[:n_vertices, 0].reshape(-1, 3)
+    rainfall = np.maximum(samples[n_vertices:, 1], 0.0) / (1000.0 * 3600.0)  # mm/hour -> m/s
+    return elevation, rainfall
+
+
+class MeshCache:
+    """Per-process LRU cache of simulation meshes."""
+
+    def __init__(self, max_meshes: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_meshes: Meshes kept before evicting the least recently used one
+        """
+        self.max_meshes = max_meshes
+        self.hits = 0
+        self.misses = 0
+        self._meshes: "OrderedDict[Hashable, SimulationMesh]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], SimulationMesh]) -> Tuple[SimulationMesh, bool]:
+        """
+        Return the cached mesh for key, building it on a miss.
+
+        Returns:
+            Tuple of (mesh, True if it came from the cache)
+        """
+        with self._lock:
+            mesh = self._meshes.get(key)
+            if mesh is not None:
+                self._meshes.move_to_end(key)
+                self.hits += 1
+                return mesh, True
+            self.misses += 1
+
+        mesh = build()
+        if self.max_meshes > 0:
+            with self._lock:
+                self._meshes[key] = mesh
+                while len(self._meshes) > self.max_meshes:
+                    self._meshes.popitem(last=False)
+        return mesh, False
+
+    def __len__(self) -> int:
+        return len(self._meshes)
+
+    def clear(self) -> None:
+        """Drop all meshes and reset counters."""
+        with self._lock:
+            self._meshes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return mesh count and hit/miss counters."""
+        return {"meshes": len(self._meshes), "hits": self.hits, "misses": self.misses}
+
+
+# Meshes built by this process
+mesh_cache = MeshCache(settings.ANUGA_MESH_CACHE_SIZE)
+
+
+def _configure_storage(domain, key: Hashable) -> None:
+    """Switch SWW output off, or send it to ANUGA_STORAGE_DIR under a name derived from the mesh key."""
+    if not settings.ANUGA_STORAGE_DIR:
+        domain.set_store(False)
+        return
+    os.makedirs(settings.ANUGA_STORAGE_DIR, exist_ok=True)
+    domain.set_datadir(settings.ANUGA_STORAGE_DIR)
+    # Same name in every worker and after restarts, so crashed workers leave nothing new behind
+    domain.set_name("floodlert_" + hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest())
+
+
+def warm_worker() -> None:
+    """
+    Initializer for simulation worker processes.
+
+    Unpickling this function imports the module (and ANUGA) in the new worker,
+    so the first simulation does not pay for the import.
+    """
+    logger.info(f"Simulation worker {os.getpid()} ready (ANUGA available: {ANUGA_AVAILABLE})")
+
+
+def next_yieldstep(
+    yieldstep: float,
+    change_rate: float,
+    previous_rate: Optional[float],
+    min_yieldstep: float,
+    max_yieldstep: float
+) -> float:
+    """
+    Adapt the yieldstep to how fast the flow is changing.
+
+    Doubles it while the depth trends change less and less (approaching
+    steady flow) and halves it when they change faster again (e.g. a front
+    arriving).
+    """
+    if previous_rate is None or change_rate <= previous_rate:
+        return min(yieldstep * 2.0, max_yieldstep)
+    return max(yieldstep / 2.0, min_yieldstep)
+
+
+def evolve_until_steady(
+    domain,
+    final_time: float,
+    min_yieldstep: float,
+    max_yieldstep: float,
+    tolerance: float,
+    on_yield: Optional[Callable[[float, np.ndarray], None]] = None
+) -> dict:
+    """
+    Evolve a domain from its current state until final_time or steady flow.
+
+    Once steady, the centroid stage is extrapolated to final_time along the
+    last depth trends, so the domain ends in the state a full run would reach.
+
+    Args:
+        domain: ANUGA domain with quantities, boundaries and operators set
+        final_time: Simulated seconds to run at most
+        min_yieldstep, max_yieldstep: Bounds of the adaptive yieldstep (seconds)
+        tolerance: Steady once no triangle's depth trend changes by more than
+            this between yieldsteps (meters/hour)
+        on_yield: Called after every yieldstep with (simulated seconds, centroid depths)
+
+    Returns:
+        Dict with 'simulated_time' (seconds), 'extrapolated_time' (seconds
+        covered by extrapolation), 'steps' (internal timesteps), 'yieldsteps'
+        and 'converged'
+    """
+    def centroid_depth():
+        return domain.get_quantity('stage').centroid_values - domain.get_quantity('elevation').centroid_values
+    
+    start_time = domain.get_time()
+    previous_depth = centroid_depth()
+    previous_trend = None
+    previous_rate = None
+    yieldstep = min_yieldstep
+    elapsed = 0.0
+    steps = 0
+    yieldsteps = 0
+    converged = False
+    
+    while elapsed < final_time - 1e-9:
+        yieldstep = min(yieldstep, final_time - elapsed)
+        for _ in domain.evolve(yieldstep=yieldstep, duration=yieldstep, skip_initial_step=True):
+            steps += domain.number_of_steps
+        yieldsteps += 1
+        interval = domain.get_time() - start_time - elapsed
+        elapsed = domain.get_time() - start_time
+        
+        depth = centroid_depth()
+        if on_yield is not None:
+            on_yield(elapsed, depth)
+        trend = (depth - previous_depth) / max(interval, 1e-9) * 3600.0  # meters/hour per triangle
+        if previous_trend is not None:
+            change_rate = float(np.abs(trend - previous_trend).max())
+            if change_rate < tolerance:
+                converged = True
+                break
+            yieldstep = next_yieldstep(yieldstep, change_rate, previous_rate, min_yieldstep, max_yieldstep)
+            previous_rate = change_rate
+        previous_depth = depth
+        previous_trend = trend
+    
+    extrapolated = 0.0
+    if converged and elapsed < final_time - 1e-9:
+        extrapolated = final_time - elapsed
+        elevation = domain.get_quantity('elevation').centroid_values
+        future_depth = np.maximum(depth + trend * extrapolated / 3600.0, 0.0)
+        domain.set_quantity('stage', elevation + future_depth, location='centroids')
+    
+    return {
+        'simulated_time': elapsed,
+        'extrapolated_time': extrapolated,
+        'steps': steps,
+        'yieldsteps': yieldsteps,
+        'converged': converged,
+    }
+
 
 class AnugaSimulator:
     """
@@ -55,181 +385,354 @@ class AnugaSimulator:
         Returns:
             2D numpy array of water depth/flood risk (0-1 normalized)
         """
+        flood_risk, _ = self.simulate_flood_with_metadata(
+            precipitation, terrain, min_lon, min_lat, max_lon, max_lat
+        )
+        return flood_risk
+    
+    def simulate_flood_with_metadata(
+        self,
+        precipitation: np.ndarray,
+        terrain: np.ndarray,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        hour: Optional[datetime] = None,
+        snapshots=None,
+        cancel=None
+    ) -> Tuple[np.ndarray, dict]:
+        """
+        Run ANUGA flood simulation and report how the result was produced.
+        
+        Args:
+            hour: Forecast hour simulated, for warm starts (default: the current hour)
+            snapshots: Queue receiving an intermediate (simulated seconds, uint8
+                flood risk raster) after every yieldstep (see StageExecutor.progress_queue)
+            cancel: Event checked after every yieldstep; once set the run stops
+                (see StageExecutor.cancel_event)
+        
+        Returns:
+            Tuple of (flood risk array, metadata dict with the 'method' used:
+            'anuga' or 'heuristic'; ANUGA runs add 'mesh_cache' ('hit' or 'miss'),
+            'warm_start', 'simulated_time' (seconds), 'steps', 'yieldsteps' and 'converged')
+        
+        Raises:
+            SimulationCancelled: cancel was set during the run
+        """
         if not self.available:
             # Fallback: simple heuristic based on precipitation and terrain
             logger.warning("ANUGA not available, using simplified flood estimation")
-            return self._simple_flood_estimation(precipitation, terrain)
+            return self._simple_flood_estimation(precipitation, terrain), {'method': 'heuristic'}
         
         try:
-            return self._run_anuga_simulation(precipitation, terrain, min_lon, min_lat, max_lon, max_lat)
+            flood_risk, run_metadata = self._run_anuga_simulation(
+                precipitation, terrain, min_lon, min_lat, max_lon, max_lat, hour, snapshots, cancel=cancel
+            )
+            return flood_risk, dict(run_metadata, method='anuga')
+        except SimulationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error running ANUGA simulation: {e}", exc_info=True)
             logger.warning("Falling back to simplified flood estimation")
-            return self._simple_flood_estimation(precipitation, terrain)
+            return self._simple_flood_estimation(precipitation, terrain), {'method': 'heuristic'}
     
-    def _run_anuga_simulation(
+    def simulate_subdomain(
         self,
         precipitation: np.ndarray,
         terrain: np.ndarray,
         min_lon: float,
         min_lat: float,
         max_lon: float,
+        max_lat: float,
+        hour: Optional[datetime] = None,
+        cancel=None,
+        previous_hour: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, dict]:
+        """
+        Run ANUGA on one subdomain of a decomposed bbox (see domain_decomposition).
+        
+        Unlike simulate_flood_with_metadata, the result is water depth in
+        meters rather than normalized risk, so subdomains can be blended, and
+        errors are raised rather than replaced by the heuristic for this
+        window alone. The subdomain checkpoints under its own mesh key.
+        
+        Args:
+            hour: Forecast hour simulated, for warm starts (default: the current hour)
+            cancel: Event checked after every yieldstep (see StageExecutor.cancel_event)
+            previous_hour: Hour whose checkpoint the run starts from (default: the hour before hour)
+        
+        Returns:
+            Tuple of (water depth array, run metadata as for simulate_flood_with_metadata)
+        """
+        depth, run_metadata = self._run_anuga_simulation(
+            precipitation, terrain, min_lon, min_lat, max_lon, max_lat, hour,
+            normalize=False,
+            cancel=cancel,
+            previous_hour=previous_hour
+        )
+        return depth, dict(run_metadata, method='anuga')
+    
+    def simulate_forecast_hours(
+        self,
+        hourly_precipitation: np.ndarray,
+        terrain: np.ndarray,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        hours: Sequence[datetime],
+        snapshots=None,
+        cancel=None
+    ) -> Tuple[np.ndarray, dict]:
+        """
+        Simulate consecutive forecast hours, each warm-started from the one before.
+        
+        Needs ANUGA_WARM_START (the hours are chained through the checkpoint
+        store). The first hour is a cold run, unless the hour before it was
+        checkpointed earlier; every later hour runs for the interval since the
+        previous one under its own rain.
+        
+        Args:
+            hourly_precipitation: (hours, rows, cols) precipitation rates (mm/hour)
+            terrain: 2D array of terrain elevation (meters)
+            min_lon, min_lat, max_lon, max_lat: Bounding box coordinates
+            hours: Valid time of every precipitation slice, ascending
+            snapshots: Queue receiving (forecast seconds simulated, uint8 flood
+                risk raster of the maximum depth so far) after every hour
+            cancel: Event checked after every yieldstep (see StageExecutor.cancel_event)
+        
+        Returns:
+            Tuple of (flood risk array from the maximum depth over all hours,
+            metadata as for simulate_flood_with_metadata plus 'forecast_hours'
+            and 'warm_starts', with times and steps summed over the hours)
+        
+        Raises:
+            SimulationCancelled: cancel was set during the run
+        """
+        if not self.available:
+            logger.warning("ANUGA not available, using simplified flood estimation")
+            return self._simple_flood_estimation(hourly_precipitation.max(axis=0), terrain), {'method': 'heuristic'}
+        
+        try:
+            max_depth = np.zeros(terrain.shape)
+            runs = []
+            for index, hour in enumerate(hours):
+                depth, run = self._run_anuga_simulation(
+                    hourly_precipitation[index], terrain, min_lon, min_lat, max_lon, max_lat, hour,
+                    normalize=False,
+                    cancel=cancel,
+                    previous_hour=hours[index - 1] if index > 0 else None
+                )
+                np.maximum(max_depth, depth, out=max_depth)
+                runs.append(run)
+                if snapshots is not None and max_depth.max() > 0:
+                    elapsed = (hour - hours[0]).total_seconds() + runs[0]['simulated_time']
+                    snapshots.put((elapsed, (max_depth / max_depth.max() * 255).astype(np.uint8)))
+        except SimulationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error running chained ANUGA simulation: {e}", exc_info=True)
+            logger.warning("Falling back to simplified flood estimation")
+            return self._simple_flood_estimation(hourly_precipitation.max(axis=0), terrain), {'method': 'heuristic'}
+        
+        warm_starts = sum(run['warm_start'] for run in runs)
+        logger.info(f"Chained {len(runs)} forecast hours ({warm_starts} warm-started)")
+        if max_depth.max() > 0:
+            max_depth = max_depth / max_depth.max()
+        return max_depth, {
+            'method': 'anuga',
+            'forecast_hours': len(runs),
+            'warm_starts': warm_starts,
+            'mesh_cache': runs[0]['mesh_cache'],
+            'warm_start': runs[0]['warm_start'],
+            'simulated_time': sum(run['simulated_time'] for run in runs),
+            'extrapolated_time': sum(run['extrapolated_time'] for run in runs),
+            'steps': sum(run['steps'] for run in runs),
+            'yieldsteps': sum(run['yieldsteps'] for run in runs),
+            'converged': all(run['converged'] for run in runs),
+        }
+    
+    def _build_mesh(
+        self,
+        key: Hashable,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
         max_lat: float
-    ) -> np.ndarray:
+    ) -> SimulationMesh:
+        """
+        Mesh the bbox and set up the parts of the domain that do not depend on the inputs.
+        
+        The domain is a rectangular cross mesh in meters relative to the
+        bbox's south-west corner (shallow water physics needs metric
+        distances); vertex and centroid coordinates are kept in lon/lat for
+        sampling the input rasters.
+        """
+        logger.info(f"Meshing ANUGA domain for bbox: {min_lon}, {min_lat}, {max_lon}, {max_lat}")
+        
+        columns, rows = mesh_dimensions(min_lon, min_lat, max_lon, max_lat)
+        
+        # Local equirectangular projection of the bbox
+        width_m = (max_lon - min_lon) * METERS_PER_DEGREE * math.cos(math.radians((min_lat + max_lat) / 2))
+        height_m = (max_lat - min_lat) * METERS_PER_DEGREE
+        
+        # Generated in memory: no mesh file is written or read
+        domain = anuga.rectangular_cross_domain(columns, rows, len1=width_m, len2=height_m)
+        _configure_storage(domain, key)
+        
+        # Set boundary conditions (reflective walls)
+        Br = anuga.Reflective_boundary(domain)
+        domain.set_boundary({'left': Br, 'right': Br, 'top': Br, 'bottom': Br})
+        
+        def to_lon_lat(coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            lon = min_lon + coords[:, 0] / width_m * (max_lon - min_lon)
+            lat = min_lat + coords[:, 1] / height_m * (max_lat - min_lat)
+            return lon, lat
+        
+        vertex_x, vertex_y = to_lon_lat(domain.get_vertex_coordinates())  # (3 * N, 2), triangle by triangle
+        centroid_x, centroid_y = to_lon_lat(domain.get_centroid_coordinates())
+        return SimulationMesh(domain, vertex_x, vertex_y, centroid_x, centroid_y)
+    
+    def _run_anuga_simulation(
+        self,
+        precipitation: np.ndarray,
+        terrain: np.ndarray,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        hour: Optional[datetime] = None,
+        snapshots=None,
+        normalize: bool = True,
+        cancel=None,
+        previous_hour: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, dict]:
         """
         Run actual ANUGA shallow water equation simulation.
         
-        This creates a mesh, sets boundary conditions, and runs the simulation.
+        Takes the bbox's mesh from the worker's mesh cache (meshing it on a
+        miss), resets all quantities for the new inputs and runs the simulation
+        until steady state or ANUGA_FINAL_TIME. With warm starts enabled and a
+        checkpoint of previous_hour (default: the hour before hour) available,
+        the run starts from that state and covers only the time from
+        previous_hour to hour.
+        
+        Returns:
+            Tuple of (flood risk array, or water depth in meters with
+            normalize=False; run metadata: 'mesh_cache', 'warm_start' plus the
+            fields reported by evolve_until_steady)
+        
+        Raises:
+            SimulationCancelled: cancel was set; the run stops at the next yieldstep
         """
         logger.info("Starting ANUGA flood simulation...")
         
-        # Create temporary directory for ANUGA output
-        temp_dir = tempfile.mkdtemp()
+        # Input rasters are north-up grids spanning the bounding box
+        extent = (min_lon, min_lat, max_lon, max_lat)
         
-        try:
-            # Create domain polygon (bounding box)
-            boundary_polygon = [
-                [min_lon, min_lat],
-                [max_lon, min_lat],
-                [max_lon, max_lat],
-                [min_lon, max_lat]
-            ]
-            
-            # Create ANUGA domain
-            # Resolution based on array size
-            height, width = precipitation.shape
-            # Create mesh - ANUGA uses triangle mesh, we'll create a simple rectangular grid
-            # For simplicity, we'll use a coarse mesh and interpolate results
-            
-            # Create mesh using points
-            # Generate mesh points
-            n_points_x = max(20, min(width // 10, 50))  # Adaptive mesh size
-            n_points_y = max(20, min(height // 10, 50))
-            
-            # Create domain
-            domain_name = os.path.join(temp_dir, "flood_simulation")
-            
-            # Create mesh points
-            x = np.linspace(min_lon, max_lon, n_points_x)
-            y = np.linspace(min_lat, max_lat, n_points_y)
-            X, Y = np.meshgrid(x, y)
-            
-            # Interpolate terrain to mesh points
-            from scipy.interpolate import griddata
-            terrain_points = griddata(
-                np.column_stack([
-                    np.linspace(min_lon, max_lon, width),
-                    np.linspace(max_lat, min_lat, height)
-                ]),
-                terrain.flatten(),
-                (X.flatten(), Y.flatten()),
-                method='linear',
-                fill_value=terrain.min()
-            )
-            
-            # Interpolate precipitation to mesh points
-            precip_points = griddata(
-                np.column_stack([
-                    np.linspace(min_lon, max_lon, width),
-                    np.linspace(max_lat, min_lat, height)
-                ]),
-                precipitation.flatten(),
-                (X.flatten(), Y.flatten()),
-                method='linear',
-                fill_value=0.0
-            )
-            
-            # Create ANUGA domain using simple rectangular mesh
-            # ANUGA API: create_domain_from_regions or create_domain_from_file
-            try:
-                # Try modern ANUGA API
-                domain = anuga.create_domain_from_regions(
-                    boundary_polygon,
-                    boundary_tags={'exterior': [0, 1, 2, 3]},
-                    maximum_triangle_area=0.001,
-                    mesh_filename=domain_name,
-                    interior_regions=[]
-                )
-            except (AttributeError, TypeError):
-                # Fallback to alternative API or manual mesh creation
-                logger.warning("ANUGA API mismatch, using simplified approach")
-                raise NotImplementedError("ANUGA API needs version-specific implementation")
-            
-            # Set terrain (bathymetry) - ANUGA uses elevation function
-            def topography(x, y):
-                """Terrain function for ANUGA."""
-                z = griddata(
-                    (X.flatten(), Y.flatten()),
-                    terrain_points,
-                    (x, y),
-                    method='linear',
-                    fill_value=terrain.min()
-                )
-                return -z  # ANUGA: negative = above sea level
+        key = mesh_key(min_lon, min_lat, max_lon, max_lat)
+        mesh, cached = mesh_cache.get_or_build(
+            key,
+            lambda: self._build_mesh(key, min_lon, min_lat, max_lon, max_lat)
+        )
+        
+        # Vertex elevations and per-triangle rainfall rates in one pass
+        elevation, rainfall = sample_mesh_inputs(mesh, terrain, precipitation, extent)
+        
+        with mesh.lock:
+            domain = mesh.domain
             
-            domain.set_quantity('elevation', topography)
+            # Reset every evolved quantity so nothing carries over from the previous run
+            domain.set_time(0.0)
+            domain.set_quantity('elevation', elevation, location='vertices')  # Meters above sea level
             domain.set_quantity('friction', 0.03)  # Manning's friction coefficient
             domain.set_quantity('stage', domain.get_quantity('elevation'))  # Initial: dry
+            domain.set_quantity('xmomentum', 0.0)
+            domain.set_quantity('ymomentum', 0.0)
             
-            # Set boundary conditions (reflective walls)
-            Br = anuga.Reflective_boundary(domain)
-            domain.set_boundary({'exterior': Br})
+            final_time = settings.ANUGA_FINAL_TIME
+            warm_start = False
+            if settings.ANUGA_WARM_START:
+                hour = forecast_hour(hour)
+                previous_hour = previous_hour or hour - timedelta(hours=1)
+                previous = checkpoint_store.get(key, previous_hour)
+                if previous is not None and previous.shape == (3, mesh.centroid_x.size):
+                    self._restore_state(domain, previous)
+                    final_time = (hour - previous_hour).total_seconds()
+                    warm_start = True
             
-            # Set rainfall (precipitation input)
-            max_precip_mm_per_hour = precipitation.max()
-            rainfall_rate_ms = max_precip_mm_per_hour / (1000.0 * 3600.0)  # Convert to m/s
+            # Spatially varying rainfall: one rate (m/s) per triangle
+            if mesh.rainfall is None:
+                mesh.rainfall = anuga.Rate_operator(domain, rate=rainfall, label='rainfall')
+            else:
+                mesh.rainfall.set_rate(rainfall)
             
-            def rainfall_function(t):
-                """Constant rainfall rate."""
-                return rainfall_rate_ms
-            
-            domain.set_rainfall_function(rainfall_function)
+            def on_yield(elapsed: float, depth: np.ndarray) -> None:
+                if cancel is not None and cancel.is_set():
+                    raise SimulationCancelled(f"Simulation cancelled after {elapsed:.0f}s simulated")
+                if snapshots is None:
+                    return
+                grid = points_to_grid(
+                    np.maximum(depth, 0.0), mesh.centroid_x, mesh.centroid_y, precipitation.shape, extent
+                )
+                peak = grid.max()
+                if peak > 0:
+                    snapshots.put((elapsed, (grid / peak * 255).astype(np.uint8)))
             
-            # Run simulation (1 hour)
-            final_time = 3600.0  # seconds
-            for t in domain.evolve(yieldstep=600.0, finaltime=final_time):
-                domain.print_timestep()
+            run = evolve_until_steady(
+                domain,
+                final_time=final_time,
+                min_yieldstep=settings.ANUGA_MIN_YIELDSTEP,
+                max_yieldstep=settings.ANUGA_MAX_YIELDSTEP,
+                tolerance=settings.ANUGA_STEADY_TOLERANCE,
+                on_yield=on_yield if snapshots is not None or cancel is not None else None
+            )
             
             # Extract water depth results
             stage = domain.get_quantity('stage').centroid_values
             elevation = domain.get_quantity('elevation').centroid_values
             depth = np.maximum(stage - elevation, 0.0)  # Water depth (non-negative)
+            mesh.runs += 1
             
-            # Interpolate back to original grid
-            centroid_coords = domain.get_centroid_coordinates()
-            
-            output_grid = griddata(
-                (centroid_coords[:, 0], centroid_coords[:, 1]),
-                depth,
-                (X.flatten(), Y.flatten()),
-                method='linear',
-                fill_value=0.0
-            )
-            
-            # Resample to original resolution
-            from scipy.ndimage import zoom
-            output_array = output_grid.reshape(n_points_y, n_points_x)
-            
-            if output_array.shape != precipitation.shape:
-                zoom_factors = (precipitation.shape[0] / output_array.shape[0],
-                               precipitation.shape[1] / output_array.shape[1])
-                output_array = zoom(output_array, zoom_factors, order=1)
-            
-            # Normalize to 0-1 range (flood risk)
-            if output_array.max() > 0:
-                output_array = output_array / output_array.max()
-            
-            logger.info(f"ANUGA simulation complete. Max water depth: {depth.max():.3f}m")
-            
-            return output_array
-            
-        finally:
-            # Cleanup temporary files
-            import shutil
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+            if settings.ANUGA_WARM_START:
+                checkpoint_store.put(key, hour, np.stack([
+                    stage,
+                    domain.get_quantity('xmomentum').centroid_values,
+                    domain.get_quantity('ymomentum').centroid_values,
+                ]))
+        
+        # Interpolate back to original grid (weights are cached per mesh)
+        output_array = points_to_grid(
+            depth,
+            mesh.centroid_x,
+            mesh.centroid_y,
+            precipitation.shape,
+            extent
+        )
+        
+        # Normalize to 0-1 range (flood risk)
+        if normalize and output_array.max() > 0:
+            output_array = output_array / output_array.max()
+        
+        steady = f" (steady flow, {run['extrapolated_time']:.0f}s extrapolated)" if run['converged'] else ""
+        logger.info(
+            f"ANUGA simulation complete ({'cached' if cached else 'new'} mesh, run {mesh.runs}): "
+            f"{run['simulated_time']:.0f}s simulated {'from checkpoint ' if warm_start else ''}in {run['steps']} steps"
+            f"{steady}. Max water depth: {depth.max():.3f}m"
+        )
+        
+        return output_array, dict(run, mesh_cache='hit' if cached else 'miss', warm_start=warm_start)
+    
+    @staticmethod
+    def _restore_state(domain, state: np.ndarray) -> None:
+        """Set stage and momentum centroid values from a checkpointed (3, N) state."""
+        elevation = domain.get_quantity('elevation').centroid_values
+        # Terrain may have been refined since; water never sits below the ground
+        stage = np.maximum(state[0].astype(np.float64), elevation)
+        domain.set_quantity('stage', stage, location='centroids')
+        domain.set_quantity('xmomentum', state[1].astype(np.float64), location='centroids')
+        domain.set_quantity('ymomentum', state[2].astype(np.float64), location='centroids')
     
     def _simple_flood_estimation(
         self,
@@ -0,0 +1,323 @@
+"""
+Cross-worker shared-memory cache of warped terrain chips.
+
+Terrain is static, so every uvicorn worker would otherwise re-read and
+re-warp the same chips. This cache lives in one memory-mapped arena file
+(put it on a RAM-backed filesystem such as /dev/shm) shared by all workers:
+
+    [header][slot table][slot 0 data][slot 1 data]...
+
+Each slot holds one float32 chip. The slot table records the key digest,
+shape, LRU clock and the pins every process holds on each slot, and is
+guarded by an fcntl file lock (plus a thread lock within a process). Readers
+get read-only, zero-copy NumPy views into the arena; a slot stays pinned, and
+so is never evicted, until every view of it has been garbage collected. Pins
+are recorded per owning PID, so those of a worker that died without releasing
+them are reclaimed however recent they are, and those of a live worker never
+are, however old.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+    SHARED_CACHE_AVAILABLE = True
+except ImportError:
+    SHARED_CACHE_AVAILABLE = False
+    logger.warning("fcntl not available on this platform. Shared terrain chip cache disabled.")
+
+_MAGIC = b"FLCHIP02"
+MAX_PIN_OWNERS = 32  # Processes that can hold pins on one slot at the same time
+_HEADER = np.dtype([
+    ("magic", "S8"),
+    ("n_slots", "<u4"),
+    ("slot_bytes", "<u8"),
+    ("clock", "<u8"),
+])
+_SLOT = np.dtype([
+    ("key", "S16"),
+    ("height", "<u4"),
+    ("width", "<u4"),
+    ("last_used", "<u8"),
+    ("owners", "<i4", (MAX_PIN_OWNERS,)),  # PID of each pin owner (0 = unused entry)
+    ("pins", "<i4", (MAX_PIN_OWNERS,)),  # Pins held by each owner
+    ("valid", "u1"),
+])
+_ALIGN = mmap.PAGESIZE
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _process_alive(pid: int) -> bool:
+    """True unless no process with this PID exists any more."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, but belongs to another user
+    return True
+
+
+def chip_key(*parts) -> bytes:
+    """Digest identifying a chip (e.g. terrain source, snapped bbox and output shape)."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).digest()
+
+
+class SharedChipCache:
+    """LRU cache of float32 chips in a memory-mapped arena shared across processes."""
+
+    def __init__(self, path: str, budget_bytes: int, slot_bytes: int):
+        """
+        Open (or create) the arena.
+
+        Args:
+            path: Arena file, ideally on tmpfs (e.g. /dev/shm/floodlert_chips)
+            budget_bytes: Total bytes available for chip data
+            slot_bytes: Maximum size of one chip; larger chips are not cached
+        """
+        self.path = path
+        self.slot_bytes = _aligned(slot_bytes)
+        self.n_slots = max(1, budget_bytes // self.slot_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._table_offset = _aligned(_HEADER.itemsize)
+        self._data_offset = _aligned(self._table_offset + self.n_slots * _SLOT.itemsize)
+        size = self._data_offset + self.n_slots * self.slot_bytes
+
+        self._thread_lock = threading.Lock()
+        # Views are unpinned from garbage-collection callbacks, which may run while
+        # the lock is held, so they only queue the slot; it is unpinned under the lock later
+        self._pending_unpins = deque()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            header = self._read_header()
+            if (
+                os.fstat(self._fd).st_size != size
+                or header["magic"] != _MAGIC
+                or header["n_slots"] != self.n_slots
+                or header["slot_bytes"] != self.slot_bytes
+            ):
+                self._initialize(size)
+
+        self._mmap = mmap.mmap(self._fd, size)
+        self._header = np.ndarray((), dtype=_HEADER, buffer=self._mmap)
+        self._table = np.ndarray((self.n_slots,), dtype=_SLOT, buffer=self._mmap, offset=self._table_offset)
+        logger.info(f"Shared terrain chip cache at {path}: {self.n_slots} slots of {self.slot_bytes // 1024} KiB")
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._apply_pending_unpins()
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _apply_pending_unpins(self) -> None:
+        if not hasattr(self, "_table"):
+            return
+        pid = os.getpid()
+        while self._pending_unpins:
+            slot = self._pending_unpins.popleft()
+            pins = self._table["pins"][slot]
+            entry = np.flatnonzero((self._table["owners"][slot] == pid) & (pins > 0))
+            if entry.size:
+                pins[entry[0]] -= 1
+
+    def _read_header(self) -> np.ndarray:
+        raw = os.pread(self._fd, _HEADER.itemsize, 0)
+        if len(raw) < _HEADER.itemsize:
+            return np.zeros((), dtype=_HEADER)
+        return np.frombuffer(raw, dtype=_HEADER)[0]
+
+    def _initialize(self, size: int) -> None:
+        """(Re)create an empty arena; caller holds the lock."""
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, size)
+        header = np.zeros((), dtype=_HEADER)
+        header["magic"] = _MAGIC
+        header["n_slots"] = self.n_slots
+        header["slot_bytes"] = self.slot_bytes
+        os.pwrite(self._fd, header.tobytes(), 0)
+        logger.info(f"Initialized shared terrain chip cache at {self.path}")
+
+    def _tick(self) -> int:
+        self._header["clock"] += np.uint64(1)
+        return int(self._header["clock"])
+
+    def _find(self, key: bytes) -> Optional[int]:
+        matches = np.flatnonzero((self._table["valid"] == 1) & (self._table["key"] == key))
+        return int(matches[0]) if matches.size else None
+
+    def _slot_array(self, slot: int, shape: Tuple[int, int]) -> np.ndarray:
+        return np.ndarray(
+            shape,
+            dtype=np.float32,
+            buffer=self._mmap,
+            offset=self._data_offset + slot * self.slot_bytes
+        )
+
+    def _reclaim_pins(self, slot: int) -> None:
+        """Drop the pins of owners that exited without releasing them; caller holds the lock."""
+        owners = self._table["owners"][slot]
+        pins = self._table["pins"][slot]
+        for entry in np.flatnonzero(pins > 0):
+            if not _process_alive(int(owners[entry])):
+                logger.warning(f"Reclaiming {pins[entry]} chip cache pin(s) of exited process {owners[entry]}")
+                pins[entry] = 0
+                owners[entry] = 0
+
+    def _pin(self, slot: int) -> bool:
+        """
+        Pin a slot for this process and mark it most recently used; caller holds the lock.
+
+        Returns:
+            False if MAX_PIN_OWNERS other live processes hold pins on the slot
+        """
+        pid = os.getpid()
+        owners = self._table["owners"][slot]
+        pins = self._table["pins"][slot]
+        entry = np.flatnonzero(owners == pid)
+        if not entry.size:
+            entry = np.flatnonzero(pins <= 0)
+            if not entry.size:
+                self._reclaim_pins(slot)
+                entry = np.flatnonzero(pins <= 0)
+                if not entry.size:
+                    return False
+            owners[entry[0]] = pid
+        pins[entry[0]] += 1
+        self._table["last_used"][slot] = self._tick()
+        return True
+
+    def _view(self, slot: int) -> np.ndarray:
+        """Read-only view of a pinned slot that unpins it when garbage collected."""
+        shape = (int(self._table["height"][slot]), int(self._table["width"][slot]))
+        view = self._slot_array(slot, shape)
+        view.flags.writeable = False
+        weakref.finalize(view, self._pending_unpins.append, slot)
+        return view
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        Look up a chip.
+
+        Returns:
+            Read-only zero-copy view of the cached chip, or None on a miss
+        """
+        with self._locked():
+            slot = self._find(key)
+            if slot is None or not self._pin(slot):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self._view(slot)
+
+    def put(self, key: bytes, chip: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Store a chip, evicting the least recently used unpinned slot if needed.
+
+        Returns:
+            Read-only view of the cached copy, or None if the chip was not cached
+            (too large, or every slot is pinned by live processes)
+        """
+        chip = np.ascontiguousarray(chip, dtype=np.float32)
+        if chip.ndim != 2 or chip.nbytes > self.slot_bytes:
+            return None
+
+        with self._locked():
+            slot = self._find(key)
+            if slot is None:
+                table = self._table
+                free = (table["valid"] == 0) | (table["pins"] <= 0).all(axis=1)
+                if not free.any():
+                    # Every slot is pinned: release the pins of workers that died holding them
+                    for pinned in range(self.n_slots):
+                        self._reclaim_pins(pinned)
+                    free = (table["pins"] <= 0).all(axis=1)
+                if not free.any():
+                    return None
+                # Empty slots first (scored 0), then least recently used
+                candidates = np.flatnonzero(free)
+                scores = table["last_used"][candidates] * table["valid"][candidates]
+                slot = int(candidates[np.argmin(scores)])
+                if table["valid"][slot]:
+                    self.evictions += 1
+
+                self._slot_array(slot, chip.shape)[...] = chip
+                table["key"][slot] = key
+                table["height"][slot], table["width"][slot] = chip.shape
+                table["owners"][slot] = 0
+                table["pins"][slot] = 0
+                table["valid"][slot] = 1
+
+            if not self._pin(slot):
+                return None
+        return self._view(slot)
+
+    def stats(self) -> dict:
+        """Return slot usage and this worker's hit/miss counters."""
+        return {
+            "slots": self.n_slots,
+            "used_slots": int(self._table["valid"].sum()),
+            "pinned_slots": int((self._table["pins"] > 0).any(axis=1).sum()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        """Unmap the arena (the file is left for other workers)."""
+        with self._locked():
+            pass  # Flush pending unpins
+        del self._header, self._table
+        try:
+            self._mmap.close()
+        except BufferError:
+            logger.warning("Chip cache views still in use at close; leaving arena mapped")
+        os.close(self._fd)
+
+
+def create_chip_cache(path: str, budget_mb: int, chip_shape: Tuple[int, int]) -> Optional[SharedChipCache]:
+    """Create the shared chip cache, or return None where it is not supported."""
+    if not SHARED_CACHE_AVAILABLE:
+        return None
+    return SharedChipCache(path, budget_mb * 1024 * 1024, chip_shape[0] * chip_shape[1] * 4)
+
+
+# Global cache instance (created at startup when TERRAIN_CHIP_CACHE_PATH is set)
+chip_cache: Optional[SharedChipCache] = None
+
+
+def _chip_cache_lookups():
+    if chip_cache is None:
+        return []
+    return [(("hit",), chip_cache.hits), (("miss",), chip_cache.misses)]
+
+
+registry.callback(
+    "floodlert_terrain_chip_cache_lookups_total",
+    "Shared terrain chip cache lookups in this worker by result.",
+    "counter",
+    ["result"],
+    _chip_cache_lookups
+)
@@ -0,0 +1,127 @@
+"""
+Circuit breaker for upstream providers.
+
+Tracks the outcome of recent requests in a sliding time window. Once enough
+requests have been seen and the error rate exceeds the threshold, the breaker
+opens and callers skip the provider entirely. After a cooldown one trial
+request is let through (half-open); its outcome closes or re-opens the breaker.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding time window."""
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float,
+        min_requests: int,
+        window_s: float,
+        cooldown_s: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize a closed breaker.
+
+        Args:
+            name: Provider name used in log messages
+            error_rate: Error fraction (0-1) at or above which the breaker opens
+            min_requests: Requests in the window needed before it may open
+            window_s: Length of the sliding window in seconds
+            cooldown_s: Time the breaker stays open before a trial request
+            clock: Monotonic clock in seconds
+        """
+        self.name = name
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window_s = window_s
+        self.cooldown_s = cooldown_s
+        self.clock = clock
+
+        self.state = CLOSED
+        self.opened = 0  # Times the breaker has opened
+        self.rejected = 0  # Requests skipped while open
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_s:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent to the provider now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self._opened_at >= self.cooldown_s:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of a request that allow() let through."""
+        with self._lock:
+            now = self.clock()
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+                if success:
+                    logger.info(f"{self.name} circuit breaker closed after successful trial request")
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, success))
+            self._prune(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (
+                self.state == CLOSED
+                and len(self._outcomes) >= self.min_requests
+                and failures / len(self._outcomes) >= self.error_rate
+            ):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = now
+        logger.warning(f"{self.name} circuit breaker opened; skipping provider for {self.cooldown_s:.0f}s")
+
+    def reset(self) -> None:
+        """Close the breaker and forget recent outcomes."""
+        with self._lock:
+            self.state = CLOSED
+            self._outcomes.clear()
+            self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        """Return breaker state, recent error rate and counters."""
+        with self._lock:
+            self._prune(self.clock())
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "recent_requests": total,
+                "recent_error_rate": failures / total if total else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,286 @@
+"""
+Execution layer for CPU-bound prediction stages.
+
+Stages that release the GIL (GDAL reads/warps, NumPy, torch) run on a thread
+pool; ANUGA simulations, which hold the GIL for long stretches, run on a
+process pool. Either way the event loop stays free to serve other requests
+(including /health) while a stage is running.
+
+Simulation workers are long-lived single-process pools rather than one shared
+pool, so a job can be routed to a particular worker: jobs for the same bbox
+carry the same affinity key and land on the worker that already has the mesh
+for that bbox cached (see anuga_simulator.MeshCache).
+
+Jobs can report progress while they run (e.g. simulation snapshots for the
+streaming endpoint) through a progress_queue(), and be asked to stop early
+through a cancel_event(); both work across the process boundary.
+
+For every stage the time spent waiting for a free worker (queue wait) and the
+time spent running are recorded, so pool sizing problems show up directly.
+"""
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STAGE_QUEUE_WAIT = registry.histogram(
+    "floodlert_stage_queue_wait_seconds",
+    "Time a pipeline stage waited for a free worker.",
+    ["stage"]
+)
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[float, Any]:
+    """Run fn in a worker and report when it started (monotonic clock, shared across processes)."""
+    started = time.monotonic()
+    return started, fn(*args)
+
+
+class StageExecutor:
+    """Thread and process pools with per-stage queue-wait accounting."""
+
+    def __init__(
+        self,
+        thread_workers: int,
+        process_workers: int,
+        process_initializer: Optional[Callable[[], None]] = None
+    ):
+        """
+        Initialize the pools.
+
+        Args:
+            thread_workers: Threads for GIL-releasing stages
+            process_workers: Processes for simulation stages (0 runs them on threads)
+            process_initializer: Called once in every new worker process (e.g. to import ANUGA)
+        """
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.process_initializer = process_initializer
+        self._thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="stage")
+        self._process_pools: List[Optional[ProcessPoolExecutor]] = [None] * max(process_workers, 0)
+        self._process_pending: List[int] = [0] * max(process_workers, 0)
+        self._manager = None  # Serves progress queues to worker processes (see start())
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get_process_pool(self, index: int) -> ProcessPoolExecutor:
+        pool = self._process_pools[index]
+        if pool is None:
+            # Spawned (not forked) workers do not inherit torch/GDAL thread state
+            pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.process_initializer
+            )
+            self._process_pools[index] = pool
+        return pool
+
+    def _pick_worker(self, affinity: Optional[Hashable]) -> int:
+        """
+        Choose a worker process: the affinity key's home worker unless it is busy
+        while another is idle (a cold mesh beats queueing behind a simulation),
+        otherwise the least loaded one.
+        """
+        with self._lock:
+            pending = self._process_pending
+            index = min(range(len(pending)), key=pending.__getitem__)
+            if affinity is not None:
+                home = hash(affinity) % len(pending)
+                if pending[home] == 0 or pending[index] > 0:
+                    index = home
+            pending[index] += 1
+            return index
+
+    def _record(self, stage: str, queue_wait: float, run_time: float) -> None:
+        STAGE_QUEUE_WAIT.observe(queue_wait, stage=stage)
+        with self._lock:
+            stats = self._stats.setdefault(stage, {
+                "calls": 0,
+                "queue_wait_total_s": 0.0,
+                "queue_wait_max_s": 0.0,
+                "run_total_s": 0.0,
+            })
+            stats["calls"] += 1
+            stats["queue_wait_total_s"] += queue_wait
+            stats["queue_wait_max_s"] = max(stats["queue_wait_max_s"], queue_wait)
+            stats["run_total_s"] += run_time
+
+    async def _await_job(self, future: Future, cancel=None) -> Any:
+        """
+        Await a job's concurrent future.
+
+        If the caller is cancelled while the job is running, the job cannot be
+        interrupted: cancel (if given) is set so the job can stop at its next
+        check, and the caller only finishes cancelling once the job has ended.
+        """
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.done():  # Running; a queued job has been dropped
+                if cancel is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, cancel.set)
+                await asyncio.wait([asyncio.wrap_future(future)])
+            raise
+
+    async def _run(self, pool, stage: str, fn: Callable, *args, cancel=None) -> Any:
+        submitted = time.monotonic()
+        started, result = await self._await_job(pool.submit(_timed_call, fn, *args), cancel)
+        finished = time.monotonic()
+        self._record(stage, max(0.0, started - submitted), finished - started)
+        return result
+
+    async def run_in_thread(self, stage: str, fn: Callable, *args, cancel=None) -> Any:
+        """Run fn(*args) on the thread pool (see run_in_process for cancel)."""
+        return await self._run(self._thread_pool, stage, fn, *args, cancel=cancel)
+
+    async def run_in_process(
+        self,
+        stage: str,
+        fn: Callable,
+        *args,
+        affinity: Optional[Hashable] = None,
+        cancel=None
+    ) -> Any:
+        """
+        Run fn(*args) in a worker process (fn and args must be picklable).
+
+        Falls back to the thread pool when no process workers are configured.
+        A worker broken by a crash is replaced before the error is raised.
+
+        A cancelled caller does not stop a job that is already running. Jobs
+        that can stop early take a cancel_event() among their args and check
+        it; pass the same event as cancel and it is set when the caller is
+        cancelled. Either way the caller finishes cancelling only once the job
+        has ended, so whoever waits for the caller never overlaps the job.
+
+        Args:
+            stage: Stage name for queue-wait accounting
+            fn: Function to run
+            affinity: Jobs with equal keys prefer the same worker (to reuse its caches)
+            cancel: Event from cancel_event() set if the caller is cancelled
+        """
+        if self.process_workers <= 0:
+            return await self.run_in_thread(stage, fn, *args, cancel=cancel)
+        index = self._pick_worker(affinity)
+        submitted = time.monotonic()
+        try:
+            try:
+                future = self._get_process_pool(index).submit(_timed_call, fn, *args)
+            except BaseException:
+                self._release(index)
+                raise
+            # The worker counts as busy until the job itself ends, even if its caller is cancelled
+            future.add_done_callback(lambda _: self._release(index))
+            started, result = await self._await_job(future, cancel)
+        except BrokenProcessPool:
+            logger.error(f"Worker process {index} broken during stage '{stage}', recreating it")
+            self._process_pools[index] = None
+            raise
+        self._record(stage, max(0.0, started - submitted), time.monotonic() - started)
+        return result
+
+    def _release(self, index: int) -> None:
+        with self._lock:
+            self._process_pending[index] -= 1
+
+    def start(self) -> None:
+        """
+        Start the manager process serving progress queues (blocks until it is up).
+
+        Called at application startup so no request pays for spawning it;
+        otherwise the first progress_queue() call starts it.
+        """
+        if self.process_workers <= 0:
+            return
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+
+    def progress_queue(self):
+        """
+        Return a queue that a job can put progress updates on while it runs.
+
+        A multiprocessing manager queue (picklable, so it can be passed to
+        run_in_process) when process workers are configured, otherwise a plain
+        thread-safe queue. Creating and reading a manager queue are blocking
+        IPC round-trips, so async callers do both on the thread pool.
+        """
+        if self.process_workers <= 0:
+            return queue.Queue()
+        self.start()
+        return self._manager.Queue()
+
+    def cancel_event(self):
+        """
+        Return an event a job can poll to stop early (see run_in_process).
+
+        A multiprocessing manager event when process workers are configured,
+        otherwise a threading.Event. Like progress_queue(), creating and
+        setting a manager event are blocking IPC round-trips.
+        """
+        if self.process_workers <= 0:
+            return threading.Event()
+        self.start()
+        return self._manager.Event()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return per-stage call counts, queue-wait and run times."""
+        with self._lock:
+            return {
+                stage: dict(
+                    values,
+                    queue_wait_mean_s=values["queue_wait_total_s"] / values["calls"],
+                    run_mean_s=values["run_total_s"] / values["calls"],
+                )
+                for stage, values in self._stats.items()
+            }
+
+    def shutdown(self) -> None:
+        """Stop the thread pool and all worker processes."""
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        for index, pool in enumerate(self._process_pools):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pools[index] = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+def create_stage_executor(initializer: Optional[Callable[[], None]] = None) -> StageExecutor:
+    """
+    Create the executor with pool sizes from settings.
+
+    Args:
+        initializer: Called once in every new worker process (e.g. anuga_simulator.warm_worker)
+    """
+    return StageExecutor(
+        thread_workers=settings.EXECUTOR_THREAD_WORKERS,
+        process_workers=settings.EXECUTOR_PROCESS_WORKERS,
+        process_initializer=initializer
+    )
+
+
+def get_stage_executor() -> StageExecutor:
+    """
+    Return the shared executor, creating it lazily if startup has not run
+    (e.g. when the pipeline is driven from a script).
+    """
+    global stage_executor
+    if stage_executor is None:
+        stage_executor = create_stage_executor()
+    return stage_executor
+
+
+# Global executor instance (created at startup, shut down at shutdown)
+stage_executor: Optional[StageExecutor] = None
@@ -0,0 +1,191 @@
+"""
+Memory-mapped precipitation cubes ingested from local GFS GRIB2/NetCDF files.
+
+The cube is written offline by app.tools.ingest_forecast. Each forecast cycle
+lives in its own directory holding one .npy file of float32 precipitation
+rates (mm/hour) indexed lat x lon x forecast hour, stored in square spatial
+chunks as (chunks_y, chunks_x, chunk, chunk, hours) so a bbox only touches
+the few chunks covering it and each chunk's hour series is contiguous on disk.
+Rows run north to south, columns west to east.
+
+    <cube dir>/CURRENT            name of the active cycle directory
+    <cube dir>/<cycle>/cube.json  grid, hours and chunking metadata
+    <cube dir>/<cycle>/cube.npy   chunked cube
+
+A new cycle is written next to the active one and then published by
+atomically replacing CURRENT, so readers switch between two complete cycles.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+METADATA_FILE = "cube.json"
+DATA_FILE = "cube.npy"
+DEFAULT_CHUNK_SIZE = 64
+
+
+class ForecastCube:
+    """One ingested forecast cycle."""
+
+    def __init__(self, path: str):
+        """
+        Open a cycle directory (the cube is memory-mapped, not read).
+
+        Args:
+            path: Directory containing cube.json and cube.npy
+        """
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+        self.cycle = datetime.fromisoformat(self.metadata["cycle"])
+        self.hours = np.asarray(self.metadata["hours"], dtype=np.float64)
+        self.west = float(self.metadata["west"])  # Centre of column 0
+        self.north = float(self.metadata["north"])  # Centre of row 0
+        self.resolution = float(self.metadata["resolution"])
+        self.height = int(self.metadata["height"])
+        self.width = int(self.metadata["width"])
+        self.chunk = int(self.metadata["chunk_size"])
+        self.data = np.load(os.path.join(path, DATA_FILE), mmap_mode="r")
+
+    def hour_window(self, now: datetime, window_hours: float) -> Tuple[int, int]:
+        """
+        Indices of the forecast hours falling in [now, now + window_hours].
+
+        Raises:
+            ValueError if the cube has no forecast hours left for that window
+        """
+        elapsed = (now - self.cycle).total_seconds() / 3600
+        start = int(np.searchsorted(self.hours, elapsed, side="left"))
+        stop = int(np.searchsorted(self.hours, elapsed + window_hours, side="right"))
+        if start >= len(self.hours):
+            raise ValueError(f"Forecast cycle {self.cycle.isoformat()} has no hours after +{elapsed:.1f}h")
+        return start, max(stop, start + 1)
+
+    def valid_time(self, hour: int) -> datetime:
+        """Time a forecast hour index is valid for (its precipitation rate covers the interval ending then)."""
+        return self.cycle + timedelta(hours=float(self.hours[hour]))
+
+    def precipitation_hours(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        hour_start: int,
+        hour_stop: int
+    ) -> Tuple[np.ndarray, Tuple[float, float, float, float]]:
+        """
+        Precipitation rates for a range of forecast hours around a bbox.
+
+        One grid cell of padding is included on every side so the result can
+        be bilinearly interpolated anywhere inside the bbox.
+
+        Returns:
+            Tuple of ((hours, rows, cols) north-up array in mm/hour, extent of its cell centres)
+
+        Raises:
+            ValueError if the bbox lies outside the cube
+        """
+        res = self.resolution
+        r0 = max(0, math.floor((self.north - max_lat) / res) - 1)
+        r1 = min(self.height - 1, math.ceil((self.north - min_lat) / res) + 1)
+        c0 = max(0, math.floor((min_lon - self.west) / res) - 1)
+        c1 = min(self.width - 1, math.ceil((max_lon - self.west) / res) + 1)
+        if r0 > r1 or c0 > c1:
+            raise ValueError("Bounding box is outside the forecast cube")
+
+        size = self.chunk
+        out = np.empty((hour_stop - hour_start, r1 - r0 + 1, c1 - c0 + 1), dtype=np.float32)
+        for cy in range(r0 // size, r1 // size + 1):
+            for cx in range(c0 // size, c1 // size + 1):
+                rows = slice(max(r0, cy * size), min(r1 + 1, (cy + 1) * size))
+                cols = slice(max(c0, cx * size), min(c1 + 1, (cx + 1) * size))
+                block = self.data[
+                    cy, cx,
+                    rows.start - cy * size:rows.stop - cy * size,
+                    cols.start - cx * size:cols.stop - cx * size,
+                    hour_start:hour_stop
+                ]
+                out[:, rows.start - r0:rows.stop - r0, cols.start - c0:cols.stop - c0] = np.moveaxis(block, -1, 0)
+
+        extent = (
+            self.west + c0 * res,
+            self.north - r1 * res,
+            self.west + c1 * res,
+            self.north - r0 * res,
+        )
+        return out, extent
+
+    def max_precipitation(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        hour_start: int,
+        hour_stop: int
+    ) -> Tuple[np.ndarray, Tuple[float, float, float, float]]:
+        """
+        Maximum precipitation rate over a range of forecast hours around a bbox.
+
+        Returns:
+            Tuple of (north-up array in mm/hour, extent of its cell centres), padded
+            as in precipitation_hours
+
+        Raises:
+            ValueError if the bbox lies outside the cube
+        """
+        values, extent = self.precipitation_hours(min_lon, min_lat, max_lon, max_lat, hour_start, hour_stop)
+        return values.max(axis=0), extent
+
+
+class ForecastCubeStore:
+    """Follows the CURRENT pointer of a cube directory and reopens on cycle swaps."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._current: Optional[ForecastCube] = None
+        self._current_name: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> ForecastCube:
+        """
+        Return the active cycle.
+
+        Raises:
+            FileNotFoundError if no cycle has been ingested yet
+        """
+        with open(os.path.join(self.path, CURRENT_FILE)) as f:
+            name = f.read().strip()
+        if name != self._current_name:
+            with self._lock:
+                if name != self._current_name:
+                    # The previous cube stays mapped for readers still holding it
+                    self._current = ForecastCube(os.path.join(self.path, name))
+                    self._current_name = name
+                    logger.info(f"Using forecast cycle {self._current.cycle.isoformat()} from {self.path}")
+        return self._current
+
+
+# Opened stores, keyed by directory
+_stores: Dict[str, ForecastCubeStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_cube_store(path: str) -> ForecastCubeStore:
+    """Return the (shared) store for a cube directory."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ForecastCubeStore(path)
+            _stores[path] = store
+        return store
@@ -0,0 +1,293 @@
+"""
+Cached interpolation weights for regular grids.
+
+The prediction pipeline only ever resamples regular grids (weather lattice,
+terrain chip) onto other regular grids or onto a fixed set of mesh points, so
+there is no need to triangulate the inputs on every call like
+scipy.interpolate.griddata does. Instead, bilinear weights are built once per
+(source shape, destination shape, extent) as sparse matrices and reused.
+
+Conventions:
+    - Arrays are north-up image order: row 0 is max_y, the last row is min_y.
+    - Extents are (min_x, min_y, max_x, max_y) and refer to the outermost
+      sample centres (i.e. np.linspace(min, max, n) along each axis).
+    - Points outside the source extent are clamped to the nearest edge.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+from scipy import ndimage, sparse
+from scipy.spatial import Delaunay
+
+Extent = Tuple[float, float, float, float]
+
+# Cache keys round coordinates so float noise does not defeat reuse
+_KEY_DECIMALS = 9
+_POINT_WEIGHTS_CACHE_SIZE = 32
+
+
+def _positions(coords: np.ndarray, start: float, stop: float, n: int) -> np.ndarray:
+    """Map coordinates to fractional indices along a linspace(start, stop, n) axis."""
+    if n == 1 or stop == start:
+        return np.zeros_like(coords, dtype=np.float64)
+    pos = (coords - start) / (stop - start) * (n - 1)
+    return np.clip(pos, 0.0, n - 1)
+
+
+def _linear_index_weights(pos: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Split fractional indices into lower neighbour index and upper weight."""
+    i0 = np.minimum(np.floor(pos).astype(np.int64), max(n - 2, 0))
+    t = pos - i0
+    return i0, t
+
+
+@lru_cache(maxsize=256)
+def axis_weights(
+    src_start: float,
+    src_stop: float,
+    src_n: int,
+    dst_start: float,
+    dst_stop: float,
+    dst_n: int
+) -> sparse.csr_matrix:
+    """
+    Linear interpolation weights between two regularly spaced 1D axes.
+
+    Returns:
+        Sparse (dst_n, src_n) matrix with at most two non-zeros per row
+    """
+    dst = np.linspace(dst_start, dst_stop, dst_n)
+    i0, t = _linear_index_weights(_positions(dst, src_start, src_stop, src_n), src_n)
+    rows = np.arange(dst_n)
+
+    if src_n == 1:
+        return sparse.csr_matrix(np.ones((dst_n, 1)))
+
+    data = np.concatenate([1.0 - t, t])
+    cols = np.concatenate([i0, i0 + 1])
+    return sparse.csr_matrix((data, (np.concatenate([rows, rows]), cols)), shape=(dst_n, src_n))
+
+
+def _round_extent(extent: Extent) -> Extent:
+    return tuple(round(float(v), _KEY_DECIMALS) for v in extent)
+
+
+def regrid(
+    values: np.ndarray,
+    src_extent: Extent,
+    dst_shape: Tuple[int, int],
+    dst_extent: Extent
+) -> np.ndarray:
+    """
+    Bilinearly resample a regular grid onto another regular grid.
+
+    The interpolation is separable, so it is computed as Wy @ values @ Wx.T with
+    cached sparse row/column weight matrices.
+
+    Args:
+        values: 2D source array (north-up)
+        src_extent: (min_x, min_y, max_x, max_y) of the source samples
+        dst_shape: (height, width) of the output
+        dst_extent: (min_x, min_y, max_x, max_y) of the output samples
+
+    Returns:
+        2D array of shape dst_shape
+    """
+    src_h, src_w = values.shape
+    dst_h, dst_w = dst_shape
+    s_min_x, s_min_y, s_max_x, s_max_y = _round_extent(src_extent)
+    d_min_x, d_min_y, d_max_x, d_max_y = _round_extent(dst_extent)
+
+    # Rows run north to south, columns west to east
+    wy = axis_weights(s_max_y, s_min_y, src_h, d_max_y, d_min_y, dst_h)
+    wx = axis_weights(s_min_x, s_max_x, src_w, d_min_x, d_max_x, dst_w)
+
+    rows = wy @ np.asarray(values, dtype=np.float64)  # (dst_h, src_w)
+    return np.asarray((wx @ rows.T).T)
+
+
+def fill_missing(values: np.ndarray) -> np.ndarray:
+    """
+    Replace NaN cells of a grid with the value of the nearest valid cell.
+
+    Raises:
+        ValueError if no cell is valid
+    """
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+    if missing.all():
+        raise ValueError("No valid cells to fill from")
+    indices = ndimage.distance_transform_edt(missing, return_distances=False, return_indices=True)
+    return values[tuple(indices)]
+
+
+def _points_key(*arrays: np.ndarray) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        digest.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    return digest.digest()
+
+
+class _WeightCache:
+    """Small LRU of sparse weight matrices for point sets."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, sparse.csr_matrix]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            weights = self._entries.get(key)
+            if weights is not None:
+                self._entries.move_to_end(key)
+            return weights
+
+    def put(self, key: tuple, weights: sparse.csr_matrix) -> None:
+        with self._lock:
+            self._entries[key] = weights
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_grid_to_points_cache = _WeightCache(_POINT_WEIGHTS_CACHE_SIZE)
+_points_to_grid_cache = _WeightCache(_POINT_WEIGHTS_CACHE_SIZE)
+
+
+def grid_to_points_weights(
+    src_shape: Tuple[int, int],
+    src_extent: Extent,
+    x: np.ndarray,
+    y: np.ndarray
+) -> sparse.csr_matrix:
+    """
+    Bilinear weights from a regular grid to arbitrary points (e.g. mesh centroids).
+
+    Returns:
+        Sparse (n_points, H * W) matrix to multiply with the raveled source grid
+    """
+    key = (tuple(src_shape), _round_extent(src_extent), _points_key(x, y))
+    weights = _grid_to_points_cache.get(key)
+    if weights is not None:
+        return weights
+
+    height, width = src_shape
+    min_x, min_y, max_x, max_y = src_extent
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+
+    col0, tx = _linear_index_weights(_positions(x, min_x, max_x, width), width)
+    row0, ty = _linear_index_weights(_positions(y, max_y, min_y, height), height)
+    col1 = np.minimum(col0 + 1, width - 1)
+    row1 = np.minimum(row0 + 1, height - 1)
+
+    n = x.size
+    rows = np.tile(np.arange(n), 4)
+    cols = np.concatenate([
+        row0 * width + col0,
+        row0 * width + col1,
+        row1 * width + col0,
+        row1 * width + col1,
+    ])
+    data = np.concatenate([
+        (1 - ty) * (1 - tx),
+        (1 - ty) * tx,
+        ty * (1 - tx),
+        ty * tx,
+    ])
+    weights = sparse.csr_matrix((data, (rows, cols)), shape=(n, height * width))
+    _grid_to_points_cache.put(key, weights)
+    return weights
+
+
+def grid_to_points(
+    values: np.ndarray,
+    src_extent: Extent,
+    x: np.ndarray,
+    y: np.ndarray
+) -> np.ndarray:
+    """
+    Bilinearly sample a regular grid at arbitrary points.
+
+    Args:
+        values: 2D source array (north-up)
+        src_extent: (min_x, min_y, max_x, max_y) of the source samples
+        x, y: Point coordinates
+
+    Returns:
+        1D array of sampled values, one per point
+    """
+    weights = grid_to_points_weights(values.shape, src_extent, x, y)
+    return weights @ np.asarray(values, dtype=np.float64).ravel()
+
+
+def points_to_grid_weights(
+    x: np.ndarray,
+    y: np.ndarray,
+    dst_shape: Tuple[int, int],
+    dst_extent: Extent
+) -> sparse.csr_matrix:
+    """
+    Linear (barycentric) weights from scattered points to a regular grid.
+
+    The points are triangulated once per point set and the result is cached,
+    so repeated sampling of the same mesh only costs a sparse product.
+    Grid cells outside the convex hull of the points get zero weight.
+
+    Returns:
+        Sparse (H * W, n_points) matrix
+    """
+    key = (tuple(dst_shape), _round_extent(dst_extent), _points_key(x, y))
+    weights = _points_to_grid_cache.get(key)
+    if weights is not None:
+        return weights
+
+    height, width = dst_shape
+    min_x, min_y, max_x, max_y = dst_extent
+    points = np.column_stack([np.ravel(x), np.ravel(y)])
+    grid_x, grid_y = np.meshgrid(
+        np.linspace(min_x, max_x, width),
+        np.linspace(max_y, min_y, height)
+    )
+    targets = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+    tri = Delaunay(points)
+    simplex = tri.find_simplex(targets)
+    inside = simplex >= 0
+    target_idx = np.nonzero(inside)[0]
+
+    # Barycentric coordinates of each target in its containing triangle
+    transforms = tri.transform[simplex[inside]]
+    delta = targets[inside] - transforms[:, 2]
+    bary = np.einsum("nij,nj->ni", transforms[:, :2], delta)
+    bary = np.column_stack([bary, 1.0 - bary.sum(axis=1)])
+    vertices = tri.simplices[simplex[inside]]
+
+    weights = sparse.csr_matrix(
+        (bary.ravel(), (np.repeat(target_idx, 3), vertices.ravel())),
+        shape=(height * width, len(points))
+    )
+    _points_to_grid_cache.put(key, weights)
+    return weights
+
+
+def points_to_grid(
+    values: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    dst_shape: Tuple[int, int],
+    dst_extent: Extent
+) -> np.ndarray:
+    """
+    Linearly interpolate scattered point values onto a regular grid.
+
+    Returns:
+        2D array of shape dst_shape (north-up), zero outside the points' hull
+    """
+    weights = points_to_grid_weights(x, y, dst_shape, dst_extent)
+    return (weights @ np.asarray(values, dtype=np.float64)).reshape(dst_shape)
@@ -0,0 +1,282 @@
+"""
+Priority queue for prediction pipeline runs, with cancellation.
+
+Every prediction runs as a job. At most max_running jobs run at once, and
+of those at most max_simulations run ANUGA in the simulation worker
+processes; the rest wait in priority order (interactive requests before
+background prefetch, then first come first served). A job waiting for a
+simulation slot does not hold back thread-only jobs (raster, heuristic)
+queued behind it. Requests for the same key join the
+job already queued or running, so concurrent requests for one bbox share a
+single computation, and an interactive request joining a queued prefetch job
+raises its priority.
+
+A job is cancelled once nobody waits for it any more: its requests have
+disconnected, or their sessions have moved on to a newer bbox (a session
+waits for one job at a time, so each pan supersedes the previous one).
+Cancelling a queued job drops it; cancelling a running job cancels its task,
+so stages that have not started yet never run. A simulation already running
+in a worker process is told to stop at its next yieldstep (see
+StageExecutor.run_in_process), and the job keeps its slot until it has, so
+a burst of pans never piles new runs up behind superseded ones.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INTERACTIVE = 0
+PREFETCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch"}
+
+DISCONNECTED = "disconnected"
+SUPERSEDED = "superseded"
+
+QUEUE_WAIT = registry.histogram(
+    "floodlert_prediction_queue_wait_seconds",
+    "Time a prediction job waited in the job queue before running.",
+    ["priority"]
+)
+
+
+class JobCancelled(Exception):
+    """Raised to a waiter whose job was cancelled or who was superseded."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Prediction job cancelled ({reason})")
+        self.reason = reason
+
+
+class _Job:
+    """One queued or running pipeline run and the requests waiting for it."""
+
+    def __init__(self, key: Hashable, fn: Callable[[], Awaitable], priority: int, submitted: float, simulation: bool):
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.submitted = submitted
+        self.simulation = simulation
+        self.waiters: Set["_Waiter"] = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+class _Waiter:
+    """One request waiting for a job."""
+
+    def __init__(self, job: _Job, session: Optional[Hashable]):
+        self.job = job
+        self.session = session
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class PredictionJobQueue:
+    """Runs coroutine jobs by priority, coalescing equal keys and cancelling abandoned jobs."""
+
+    def __init__(
+        self,
+        max_running: int,
+        max_simulations: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize an empty queue.
+
+        Args:
+            max_running: Jobs running at once
+            max_simulations: Simulation jobs running at once (default max_running)
+            clock: Monotonic clock in seconds
+        """
+        self.max_running = max(1, max_running)
+        self.max_simulations = self.max_running if max_simulations is None else max(1, min(max_simulations, self.max_running))
+        self.clock = clock
+
+        self.executed = 0  # Jobs created
+        self.coalesced = 0  # Requests that joined an existing job
+        self.cancelled: Dict[str, int] = {DISCONNECTED: 0, SUPERSEDED: 0}  # Jobs cancelled, by reason
+        self.wait_total_s = 0.0  # Queue wait summed over started jobs
+        self.started = 0
+
+        self._jobs: Dict[Hashable, _Job] = {}
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._simulations = 0
+        self._sessions: Dict[Hashable, _Waiter] = {}
+
+    async def run(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[T]],
+        priority: int = INTERACTIVE,
+        session: Optional[Hashable] = None,
+        simulation: bool = False
+    ) -> T:
+        """
+        Run fn() for key through the queue, or join the job already queued or running for key.
+
+        Args:
+            key: Hashable identity of the computation
+            fn: Zero-argument coroutine factory, only called if no job exists for key
+            priority: INTERACTIVE or PREFETCH (lower runs first)
+            session: Client session; its previous request is superseded
+            simulation: fn runs a simulation in a worker process and needs a simulation slot
+
+        Returns:
+            The (shared) result of fn()
+
+        Raises:
+            JobCancelled: This request was superseded by a newer one from its session
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            self.executed += 1
+            job = _Job(key, fn, priority, self.clock(), simulation)
+            self._jobs[key] = job
+            heapq.heappush(self._heap, (priority, next(self._sequence), key))
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalescing request onto queued or running prediction for {key}")
+            if priority < job.priority and job.task is None:
+                job.priority = priority
+                heapq.heappush(self._heap, (priority, next(self._sequence), key))
+
+        waiter = _Waiter(job, session)
+        job.waiters.add(waiter)
+        if session is not None:
+            previous = self._sessions.get(session)
+            self._sessions[session] = waiter
+            if previous is not None:
+                self._leave(previous, SUPERSEDED)
+        self._dispatch()
+
+        try:
+            return await waiter.result
+        except asyncio.CancelledError:
+            self._leave(waiter, DISCONNECTED)
+            raise
+        finally:
+            if session is not None and self._sessions.get(session) is waiter:
+                del self._sessions[session]
+
+    def _dispatch(self) -> None:
+        """Start the most urgent queued jobs while there are free slots."""
+        deferred = []
+        while self._running < self.max_running and self._heap:
+            entry = heapq.heappop(self._heap)
+            priority, _, key = entry
+            job = self._jobs.get(key)
+            if job is None or job.task is not None or job.priority != priority:
+                continue  # Cancelled, already started or re-queued at a higher priority
+            if job.simulation and self._simulations >= self.max_simulations:
+                deferred.append(entry)  # Keeps its place; thread-only jobs behind it may start
+                continue
+            self._running += 1
+            self._simulations += job.simulation
+            self.started += 1
+            wait = self.clock() - job.submitted
+            self.wait_total_s += wait
+            QUEUE_WAIT.observe(wait, priority=PRIORITY_NAMES.get(priority, str(priority)))
+            job.task = asyncio.ensure_future(job.fn())
+            job.task.add_done_callback(lambda task, job=job: self._finish(job, task))
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+    def _finish(self, job: _Job, task: asyncio.Task) -> None:
+        self._running -= 1
+        self._simulations -= job.simulation
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        error = JobCancelled(DISCONNECTED) if task.cancelled() else task.exception()
+        for waiter in job.waiters:
+            if waiter.result.done():
+                continue
+            if error is not None:
+                waiter.result.set_exception(error)
+            else:
+                waiter.result.set_result(task.result())
+        self._dispatch()
+
+    def _leave(self, waiter: _Waiter, reason: str) -> None:
+        """Stop waiting for a job; the job is cancelled when it has no waiters left."""
+        job = waiter.job
+        if waiter not in job.waiters:
+            return
+        job.waiters.discard(waiter)
+        if not waiter.result.done():
+            waiter.result.set_exception(JobCancelled(reason))
+            waiter.result.exception()  # Retrieved: the waiter may already be gone
+        if job.waiters or (job.task is not None and job.task.done()):
+            return
+
+        self.cancelled[reason] += 1
+        logger.info(f"Cancelling prediction job for {job.key} ({reason})")
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        if job.task is not None:
+            job.task.cancel()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.task is None)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def stats(self) -> dict:
+        """Return queue depth, running jobs, mean queue wait and job counters."""
+        return {
+            "queue_depth": self.queue_depth,
+            "running": self._running,
+            "max_running": self.max_running,
+            "simulations_running": self._simulations,
+            "max_simulations": self.max_simulations,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "cancelled": dict(self.cancelled),
+            "queue_wait_mean_s": self.wait_total_s / self.started if self.started else 0.0,
+        }
+
+
+def create_prediction_queue() -> PredictionJobQueue:
+    """Create the queue with its concurrency from settings."""
+    max_simulations = settings.PREDICTION_MAX_SIMULATIONS or max(1, settings.EXECUTOR_PROCESS_WORKERS)
+    return PredictionJobQueue(
+        max_running=settings.PREDICTION_MAX_RUNNING or max_simulations + settings.EXECUTOR_THREAD_WORKERS,
+        max_simulations=max_simulations
+    )
+
+
+# Global queue every prediction pipeline run goes through
+prediction_queue = create_prediction_queue()
+
+registry.callback(
+    "floodlert_prediction_queue_depth",
+    "Prediction jobs waiting for a free slot.",
+    "gauge",
+    [],
+    lambda: [((), prediction_queue.queue_depth)]
+)
+registry.callback(
+    "floodlert_prediction_jobs_running",
+    "Prediction jobs running.",
+    "gauge",
+    [],
+    lambda: [((), prediction_queue.running)]
+)
+registry.callback(
+    "floodlert_prediction_jobs_cancelled_total",
+    "Prediction jobs cancelled by reason.",
+    "counter",
+    ["reason"],
+    lambda: [((reason,), count) for reason, count in prediction_queue.cancelled.items()]
+)
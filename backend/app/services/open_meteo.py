@@ -0,0 +1,289 @@
+"""
+Open-Meteo forecast client.
+
+All upstream traffic goes through one process-wide keep-alive connection pool,
+and each bounding box is requested with a single multi-location call
+(comma-separated latitude/longitude lists) instead of one call per point.
+
+WEATHER_API_PROVIDER=record additionally archives every response and
+WEATHER_API_PROVIDER=replay answers requests from that archive (see
+app.services.weather_archive); batching and chunk fallback behave the same.
+
+Latency is bounded: a fetch gives up at WEATHER_FETCH_DEADLINE, a request that
+has not answered after WEATHER_HEDGE_DELAY is duplicated (first answer wins),
+and a circuit breaker skips the upstream while its recent error rate is high.
+Points that were not delivered come back as None for the caller to fill.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Sequence
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services import weather_archive
+from app.services.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Global HTTP client (created at startup, closed at shutdown)
+http_client: Optional[httpx.AsyncClient] = None
+
+# Shared by all requests in this worker
+breaker = CircuitBreaker(
+    "Open-Meteo",
+    error_rate=settings.WEATHER_BREAKER_ERROR_RATE,
+    min_requests=settings.WEATHER_BREAKER_MIN_REQUESTS,
+    window_s=settings.WEATHER_BREAKER_WINDOW,
+    cooldown_s=settings.WEATHER_BREAKER_COOLDOWN
+)
+
+HEDGED_REQUESTS = registry.counter(
+    "floodlert_weather_hedged_requests_total",
+    "Duplicate weather requests sent because the first had not answered in time."
+)
+DEADLINE_MISSES = registry.counter(
+    "floodlert_weather_deadline_exceeded_total",
+    "Weather fetches cut off by the per-request deadline."
+)
+registry.callback(
+    "floodlert_weather_breaker_open",
+    "1 while the weather provider circuit breaker is open or half-open.",
+    "gauge",
+    [],
+    lambda: [((), 0.0 if breaker.state == "closed" else 1.0)]
+)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the shared keep-alive HTTP client used for weather requests."""
+    limits = httpx.Limits(
+        max_connections=settings.WEATHER_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.WEATHER_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=settings.WEATHER_HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(timeout=settings.WEATHER_HTTP_TIMEOUT, limits=limits)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client, creating it lazily if startup has not run
+    (e.g. when the pipeline is driven from a script).
+    """
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = create_http_client()
+    return http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and release its pooled connections."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def _parse_hourly_precipitation(data: dict) -> Optional[List[float]]:
+    """
+    Extract the hourly precipitation series from one Open-Meteo location object.
+
+    Returns:
+        List of hourly values in mm (None entries replaced with 0.0),
+        or None if the object carries no usable precipitation data.
+    """
+    hourly = data.get("hourly")
+    if hourly is None:
+        logger.warning(f"Open-Meteo response missing 'hourly' key. Keys: {list(data.keys())}")
+        return None
+    if "precipitation" not in hourly:
+        logger.warning(f"Open-Meteo response missing 'precipitation' in hourly data. Available: {list(hourly.keys())}")
+        return None
+
+    precip_hourly = hourly["precipitation"]
+    if not precip_hourly:
+        logger.warning("Empty precipitation array in Open-Meteo response")
+        return None
+    return [float(p) if p is not None else 0.0 for p in precip_hourly]
+
+
+async def _fetch_batch(
+    client: httpx.AsyncClient,
+    lats: Sequence[float],
+    lons: Sequence[float]
+) -> List[Optional[List[float]]]:
+    """
+    Fetch hourly precipitation for several points with one request, recording
+    or replaying it when WEATHER_API_PROVIDER asks for that.
+
+    The outcome is reported to the circuit breaker (cancelled requests are not).
+    """
+    provider = settings.WEATHER_API_PROVIDER
+    try:
+        if provider == "replay":
+            series = await weather_archive.replay_batch(lats, lons)
+        else:
+            series = await _fetch_upstream(client, lats, lons)
+            if provider == "record":
+                weather_archive.record_batch(lats, lons, series)
+    except (httpx.HTTPError, ValueError):
+        breaker.record(False)
+        raise
+    breaker.record(True)
+    return series
+
+
+async def _hedged_batch(
+    client: httpx.AsyncClient,
+    lats: Sequence[float],
+    lons: Sequence[float]
+) -> List[Optional[List[float]]]:
+    """
+    Fetch a batch, sending a duplicate request if the first is still pending
+    after WEATHER_HEDGE_DELAY. The first successful answer wins.
+    """
+    tasks = [asyncio.ensure_future(_fetch_batch(client, lats, lons))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=settings.WEATHER_HEDGE_DELAY)
+        if not done:
+            HEDGED_REQUESTS.inc()
+            tasks.append(asyncio.ensure_future(_fetch_batch(client, lats, lons)))
+
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _fetch_upstream(
+    client: httpx.AsyncClient,
+    lats: Sequence[float],
+    lons: Sequence[float]
+) -> List[Optional[List[float]]]:
+    """
+    Fetch hourly precipitation for several points with one multi-location request.
+
+    Raises:
+        httpx.HTTPError or ValueError if the request fails or the response
+        does not contain one entry per requested point.
+    """
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for lat in lats),
+        "longitude": ",".join(f"{lon:.4f}" for lon in lons),
+        "hourly": "precipitation",  # Get hourly precipitation
+        "forecast_days": 1,  # Get next 24 hours
+        "timezone": "UTC",
+    }
+    response = await client.get(settings.OPEN_METEO_URL, params=params)
+    response.raise_for_status()
+    data = response.json()
+
+    # A single coordinate returns one object, several coordinates return a list
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != len(lats):
+        raise ValueError(
+            f"Open-Meteo returned {len(locations)} locations for {len(lats)} requested points"
+        )
+
+    series = []
+    for location in locations:
+        try:
+            series.append(_parse_hourly_precipitation(location))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Error parsing weather data for point: {e}")
+            series.append(None)
+    return series
+
+
+async def fetch_hourly_precipitation(
+    lats: Sequence[float],
+    lons: Sequence[float],
+    client: Optional[httpx.AsyncClient] = None,
+    deadline: Optional[float] = None
+) -> List[Optional[List[float]]]:
+    """
+    Fetch hourly precipitation series for a set of points.
+
+    All points are first requested as a single (hedged) batch. If that request
+    fails (e.g. the URL is too long or the upstream rejects it), the points are
+    split into chunks of WEATHER_BATCH_CHUNK_SIZE and fetched concurrently; a
+    failed chunk only loses its own points. Whatever has not arrived by the
+    deadline is given up on, and nothing is requested while the circuit
+    breaker is open.
+
+    Args:
+        lats, lons: Point coordinates (same length)
+        client: HTTP client to use (defaults to the shared pooled client)
+        deadline: Seconds allowed for the whole fetch (default WEATHER_FETCH_DEADLINE)
+
+    Returns:
+        One entry per point: the hourly series in mm, or None if unavailable
+    """
+    if len(lats) != len(lons):
+        raise ValueError(f"Got {len(lats)} latitudes but {len(lons)} longitudes")
+    if len(lats) == 0:
+        return []
+
+    if not breaker.allow():
+        logger.warning(f"Open-Meteo circuit breaker is open, skipping request for {len(lats)} points")
+        return [None] * len(lats)
+
+    client = client or get_http_client()
+    loop = asyncio.get_running_loop()
+    deadline = settings.WEATHER_FETCH_DEADLINE if deadline is None else deadline
+    give_up_at = loop.time() + deadline
+
+    try:
+        return await asyncio.wait_for(_hedged_batch(client, lats, lons), timeout=deadline)
+    except asyncio.TimeoutError:
+        DEADLINE_MISSES.inc()
+        breaker.record(False)
+        logger.warning(f"Open-Meteo batch request for {len(lats)} points exceeded the {deadline:.1f}s deadline")
+        return [None] * len(lats)
+    except (httpx.HTTPError, ValueError) as e:
+        chunk_size = settings.WEATHER_BATCH_CHUNK_SIZE
+        if len(lats) <= chunk_size:
+            logger.warning(f"Open-Meteo batch request for {len(lats)} points failed: {e}")
+            return [None] * len(lats)
+        logger.warning(
+            f"Open-Meteo batch request for {len(lats)} points failed ({e}), "
+            f"retrying in chunks of {chunk_size}"
+        )
+
+    remaining = give_up_at - loop.time()
+    if remaining <= 0:
+        return [None] * len(lats)
+
+    chunks = [
+        (lats[i:i + chunk_size], lons[i:i + chunk_size])
+        for i in range(0, len(lats), chunk_size)
+    ]
+    tasks = [
+        asyncio.ensure_future(_hedged_batch(client, chunk_lats, chunk_lons))
+        for chunk_lats, chunk_lons in chunks
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=remaining)
+    if pending:
+        DEADLINE_MISSES.inc()
+        logger.warning(f"{len(pending)}/{len(chunks)} Open-Meteo chunks exceeded the {deadline:.1f}s deadline")
+        for task in pending:
+            task.cancel()
+
+    series: List[Optional[List[float]]] = []
+    for (chunk_lats, _), task in zip(chunks, tasks):
+        if task in pending or task.exception() is not None:
+            if task not in pending:
+                logger.warning(f"Open-Meteo chunk of {len(chunk_lats)} points failed: {task.exception()}")
+            series.extend([None] * len(chunk_lats))
+        else:
+            series.extend(task.result())
+    return series
@@ -0,0 +1,111 @@
+"""
+Cache of finished predictions for the current forecast cycle.
+
+Keys are (normalized bbox, forecast cycle), so an entry is never served once
+a newer cycle has been published; stale entries simply age out of the LRU.
+Entries remember whether they were computed by the prefetch scheduler, so the
+share of live requests answered by prefetching can be reported.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPrediction(NamedTuple):
+    """One finished prediction."""
+    png_bytes: bytes
+    headers: Dict[str, str]
+    prefetched: bool  # Computed by the prefetch scheduler rather than a live request
+
+
+class PredictionCache:
+    """Byte-bounded LRU cache of encoded predictions."""
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Total PNG bytes kept before evicting the least recently used entry
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.prefetch_hits = 0  # Hits on entries computed by the prefetch scheduler
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Hashable, CachedPrediction]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Optional[CachedPrediction]:
+        """Look up a prediction, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if entry.prefetched:
+                self.prefetch_hits += 1
+            return entry
+
+    def put(self, key: Hashable, png_bytes: bytes, headers: Dict[str, str], prefetched: bool = False) -> None:
+        """Store a prediction, evicting least recently used entries beyond the byte budget."""
+        if len(png_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.png_bytes)
+            self._entries[key] = CachedPrediction(png_bytes, dict(headers), prefetched)
+            self._bytes += len(png_bytes)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.png_bytes)
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.prefetch_hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "prefetch_hits": self.prefetch_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Global cache instance
+prediction_cache = PredictionCache(max_bytes=settings.PREDICTION_CACHE_MB * 1024 * 1024)
+
+registry.callback(
+    "floodlert_prediction_cache_lookups_total",
+    "Prediction cache lookups by result (prefetch_hit counts hits on prefetched entries, also counted as hit).",
+    "counter",
+    ["result"],
+    lambda: [
+        (("hit",), prediction_cache.hits),
+        (("prefetch_hit",), prediction_cache.prefetch_hits),
+        (("miss",), prediction_cache.misses),
+    ]
+)
@@ -0,0 +1,231 @@
+"""
+Background prefetching of predictions for frequently requested regions.
+
+Every live request bumps an exponentially decayed counter for its normalized
+bbox ("tile"). When a new forecast cycle is published, the top-N tiles are
+queued and recomputed in the background, so the first users of the new cycle
+find their prediction already in the prediction cache.
+
+Prefetching never competes with live traffic: jobs run one at a time, wait
+while any live prediction is being computed, and after each job the
+scheduler idles long enough to keep its share of wall time under
+PREFETCH_CPU_BUDGET.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.weather_cache import current_forecast_cycle
+
+logger = logging.getLogger(__name__)
+
+Tile = Tuple[float, float, float, float]  # Normalized (min_lon, min_lat, max_lon, max_lat)
+
+
+class PrefetchScheduler:
+    """Tracks hot tiles and precomputes them when a new forecast cycle arrives."""
+
+    def __init__(
+        self,
+        top_n: int,
+        half_life_s: float,
+        cpu_budget: float,
+        check_interval_s: float,
+        max_tracked: int,
+        cycle_fn: Callable[[], datetime] = current_forecast_cycle,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the scheduler (call start() to run it).
+
+        Args:
+            top_n: Tiles prefetched per forecast cycle
+            half_life_s: Half-life of the per-tile request counts
+            cpu_budget: Maximum fraction of wall time spent on prefetch jobs (0-1]
+            check_interval_s: How often to check for a new forecast cycle
+            max_tracked: Tiles tracked before the coldest are forgotten
+            cycle_fn: Returns the current forecast cycle
+            clock: Monotonic clock in seconds
+        """
+        self.top_n = top_n
+        self.half_life_s = half_life_s
+        self.cpu_budget = min(max(cpu_budget, 0.01), 1.0)
+        self.check_interval_s = check_interval_s
+        self.max_tracked = max_tracked
+        self.cycle_fn = cycle_fn
+        self.clock = clock
+
+        self.live_requests = 0  # Live requests seen
+        self.completed = 0  # Prefetch jobs finished
+        self.failed = 0  # Prefetch jobs that raised
+        self.busy_s = 0.0  # Wall time spent in prefetch jobs
+
+        self._counts: Dict[Tile, Tuple[float, float]] = {}  # tile -> (count, updated at)
+        self._queue: Deque[Tuple[Tile, datetime]] = deque()
+        self._live_in_flight = 0
+        self._last_cycle: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _decayed(self, tile: Tile, now: float) -> float:
+        count, updated = self._counts.get(tile, (0.0, now))
+        return count * math.pow(0.5, (now - updated) / self.half_life_s)
+
+    def record(self, tile: Tile) -> None:
+        """Count one live request for a tile."""
+        now = self.clock()
+        self.live_requests += 1
+        self._counts[tile] = (self._decayed(tile, now) + 1.0, now)
+        if len(self._counts) > self.max_tracked:
+            # Forget the coldest quarter rather than pruning on every request
+            ranked = sorted(self._counts, key=lambda t: self._decayed(t, now))
+            for cold in ranked[:max(1, len(ranked) // 4)]:
+                del self._counts[cold]
+
+    @contextmanager
+    def live_request(self, tile: Tile):
+        """Record a live request and hold prefetching back while it runs."""
+        self.record(tile)
+        self._live_in_flight += 1
+        try:
+            yield
+        finally:
+            self._live_in_flight -= 1
+
+    def hot_tiles(self, n: Optional[int] = None) -> List[Tuple[Tile, float]]:
+        """Return the n most requested tiles with their decayed counts, hottest first."""
+        now = self.clock()
+        ranked = sorted(((tile, self._decayed(tile, now)) for tile in self._counts), key=lambda item: -item[1])
+        return ranked[:self.top_n if n is None else n]
+
+    def schedule(self, cycle: datetime, skip: Callable[[Hashable], bool] = lambda key: False) -> int:
+        """
+        Queue the top-N tiles for a forecast cycle, replacing jobs for older cycles.
+
+        Args:
+            cycle: Forecast cycle to compute
+            skip: Returns True for (tile, cycle) keys that need no prefetch (e.g. already cached)
+
+        Returns:
+            Number of jobs queued
+        """
+        self._queue.clear()
+        for tile, _ in self.hot_tiles():
+            if not skip((tile, cycle)):
+                self._queue.append((tile, cycle))
+        if self._queue:
+            logger.info(f"Prefetching {len(self._queue)} hot tiles for forecast cycle {cycle.isoformat()}")
+        return len(self._queue)
+
+    async def run_pending(self, compute: Callable[[Tile, datetime], Awaitable[None]]) -> None:
+        """Work through the queue under the CPU budget, yielding to live traffic."""
+        while self._queue:
+            while self._live_in_flight > 0:
+                await asyncio.sleep(0.1)
+            tile, cycle = self._queue.popleft()
+            started = self.clock()
+            try:
+                await compute(tile, cycle)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Prefetch of {tile} failed: {e}")
+            elapsed = self.clock() - started
+            self.busy_s += elapsed
+            # Idle so that busy / (busy + idle) stays within the budget
+            await asyncio.sleep(elapsed * (1.0 - self.cpu_budget) / self.cpu_budget)
+
+    async def _loop(
+        self,
+        compute: Callable[[Tile, datetime], Awaitable[None]],
+        skip: Callable[[Hashable], bool]
+    ) -> None:
+        self._last_cycle = self.cycle_fn()
+        while True:
+            cycle = self.cycle_fn()
+            if cycle != self._last_cycle:
+                self._last_cycle = cycle
+                self.schedule(cycle, skip)
+            await self.run_pending(compute)
+            await asyncio.sleep(self.check_interval_s)
+
+    def start(
+        self,
+        compute: Callable[[Tile, datetime], Awaitable[None]],
+        skip: Callable[[Hashable], bool] = lambda key: False
+    ) -> None:
+        """
+        Start the background task on the running event loop.
+
+        Args:
+            compute: Coroutine computing and caching the prediction for (tile, cycle)
+            skip: Returns True for (tile, cycle) keys that need no prefetch
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop(compute, skip))
+
+    async def stop(self) -> None:
+        """Cancel the background task and drop queued jobs."""
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        """Return queue depth, job counters and the hottest tiles."""
+        return {
+            "queue_depth": self.queue_depth,
+            "tracked_tiles": len(self._counts),
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_s": self.busy_s,
+            "live_requests": self.live_requests,
+            "last_cycle": self._last_cycle.isoformat() if self._last_cycle else None,
+            "hot_tiles": [
+                {"bbox": list(tile), "score": round(score, 2)} for tile, score in self.hot_tiles(5)
+            ],
+        }
+
+
+def create_prefetch_scheduler() -> PrefetchScheduler:
+    """Create the scheduler with settings from the environment."""
+    return PrefetchScheduler(
+        top_n=settings.PREFETCH_TOP_N,
+        half_life_s=settings.PREFETCH_HALF_LIFE_HOURS * 3600,
+        cpu_budget=settings.PREFETCH_CPU_BUDGET,
+        check_interval_s=settings.PREFETCH_CHECK_INTERVAL,
+        max_tracked=settings.PREFETCH_MAX_TRACKED
+    )
+
+
+# Global scheduler (live requests are tracked even when prefetching is disabled)
+prefetch_scheduler = create_prefetch_scheduler()
+
+registry.callback(
+    "floodlert_prefetch_queue_depth",
+    "Prefetch jobs waiting to run.",
+    "gauge",
+    [],
+    lambda: [((), prefetch_scheduler.queue_depth)]
+)
+registry.callback(
+    "floodlert_prefetch_jobs_total",
+    "Prefetch jobs by result.",
+    "counter",
+    ["result"],
+    lambda: [(("completed",), prefetch_scheduler.completed), (("failed",), prefetch_scheduler.failed)]
+)
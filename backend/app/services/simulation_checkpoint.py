@@ -0,0 +1,99 @@
+"""
+Checkpoints of ANUGA end states for warm-starting the next forecast hour.
+
+A simulation for forecast hour H of a bbox can start from the state the run
+for the previous forecast hour ended in, instead of from a dry domain, and
+then only needs to simulate the interval between the two hours (see
+AnugaSimulator.simulate_forecast_hours). Checkpoints hold the centroid stage,
+xmomentum and ymomentum of a mesh as one float32 (3, N) array in a .npy file
+named after the mesh key and the hour, so any simulation worker can pick up
+a state written by another. Files are written atomically and pruned once
+they are older than the configured age.
+"""
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Hashable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = ".npy"
+
+
+def forecast_hour(now: Optional[datetime] = None) -> datetime:
+    """The (UTC) forecast hour containing now."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class CheckpointStore:
+    """Directory of float32 simulation states keyed by (mesh key, forecast hour)."""
+
+    def __init__(self, path: str, max_age_s: float):
+        """
+        Initialize the store (the directory is created on the first write).
+
+        Args:
+            path: Checkpoint directory
+            max_age_s: Checkpoints older than this are deleted when a new one is written
+        """
+        self.path = path
+        self.max_age_s = max_age_s
+
+    def _filename(self, key: Hashable, hour: datetime) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.path, f"{digest}_{forecast_hour(hour):%Y%m%dT%H}{CHECKPOINT_SUFFIX}")
+
+    def get(self, key: Hashable, hour: datetime) -> Optional[np.ndarray]:
+        """Return the (3, N) state saved for a mesh and forecast hour, or None."""
+        try:
+            return np.load(self._filename(key, hour))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: Hashable, hour: datetime, state: np.ndarray) -> None:
+        """
+        Save the end state of a run.
+
+        Args:
+            key: Mesh key (see anuga_simulator.mesh_key)
+            hour: Forecast hour the run simulated
+            state: (3, N) stage, xmomentum and ymomentum centroid values
+        """
+        os.makedirs(self.path, exist_ok=True)
+        filename = self._filename(key, hour)
+        staging = f"{filename}.{os.getpid()}.tmp"
+        with open(staging, "wb") as f:
+            np.save(f, np.asarray(state, dtype=np.float32))
+        os.replace(staging, filename)
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete expired checkpoints (and staging files left by crashed workers)."""
+        cutoff = time.time() - self.max_age_s
+        removed = 0
+        try:
+            entries = list(os.scandir(self.path))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Pruned concurrently by another worker
+        return removed
+
+
+# Store shared by all workers through the filesystem
+checkpoint_store = CheckpointStore(
+    settings.ANUGA_CHECKPOINT_PATH,
+    max_age_s=settings.ANUGA_CHECKPOINT_MAX_AGE_HOURS * 3600
+)
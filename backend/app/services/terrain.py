@@ -0,0 +1,323 @@
+"""
+Terrain elevation loading.
+
+Only the part of the DEM covering the requested bounding box is read, at the
+overview level closest to the output resolution, before it is reprojected
+onto the weather grid. Dataset handles are kept open per thread and reused
+across requests.
+"""
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio import transform as rasterio_transform
+from rasterio.crs import CRS
+from rasterio.env import set_gdal_config
+from rasterio.warp import reproject, transform_bounds, Resampling
+from rasterio.windows import Window, from_bounds
+
+import app.services.chip_cache
+from app.core.config import settings
+from app.services.chip_cache import chip_key
+from app.services.terrain_pyramid import ConditionedChip, get_pyramid
+
+logger = logging.getLogger(__name__)
+
+WGS84 = CRS.from_epsg(4326)
+
+# Extra source pixels read around the bbox so bilinear resampling has neighbours at the edges
+RESAMPLING_MARGIN_PIXELS = 2
+
+
+class TerrainDatasetPool:
+    """
+    Long-lived rasterio dataset handles, opened lazily and reused across requests.
+
+    GDAL dataset handles are not thread-safe, so each thread gets its own
+    handles. Each thread keeps at most max_handles_per_thread open datasets
+    (least recently used are closed first), and a handle is reopened if the
+    file on disk has changed.
+    """
+
+    def __init__(self, max_handles_per_thread: int = 4):
+        """
+        Initialize the pool.
+
+        Args:
+            max_handles_per_thread: Open datasets kept per thread
+        """
+        self.max_handles_per_thread = max_handles_per_thread
+        self.opened = 0
+        self.reused = 0
+        self._local = threading.local()
+        self._all_handles: List[rasterio.DatasetReader] = []
+        self._lock = threading.Lock()
+
+    def _handles(self) -> "OrderedDict[str, Tuple[float, rasterio.DatasetReader]]":
+        handles = getattr(self._local, "handles", None)
+        if handles is None:
+            handles = OrderedDict()
+            self._local.handles = handles
+        return handles
+
+    def get(self, path: str) -> rasterio.DatasetReader:
+        """Return this thread's open dataset for path, opening it if needed."""
+        handles = self._handles()
+        mtime = os.path.getmtime(path)
+
+        entry = handles.get(path)
+        if entry is not None:
+            cached_mtime, dataset = entry
+            if cached_mtime == mtime and not dataset.closed:
+                handles.move_to_end(path)
+                with self._lock:
+                    self.reused += 1
+                return dataset
+            self._close(handles.pop(path)[1])
+
+        dataset = rasterio.open(path)
+        handles[path] = (mtime, dataset)
+        with self._lock:
+            self._all_handles.append(dataset)
+            self.opened += 1
+
+        while len(handles) > self.max_handles_per_thread:
+            _, (_, evicted) = handles.popitem(last=False)
+            self._close(evicted)
+        return dataset
+
+    def _close(self, dataset: rasterio.DatasetReader) -> None:
+        with self._lock:
+            if dataset in self._all_handles:
+                self._all_handles.remove(dataset)
+        dataset.close()
+
+    def close_all(self) -> None:
+        """Close every handle in every thread (call at shutdown)."""
+        with self._lock:
+            handles, self._all_handles = self._all_handles, []
+        for dataset in handles:
+            dataset.close()
+        logger.info(f"Closed {len(handles)} terrain dataset handles")
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool counters."""
+        with self._lock:
+            return {
+                "open_handles": len(self._all_handles),
+                "opened": self.opened,
+                "reused": self.reused,
+            }
+
+
+def configure_gdal_cache(cache_mb: int) -> None:
+    """
+    Set the size of GDAL's raster block cache.
+
+    GDAL sizes its block cache when the first dataset is read, so call this
+    at startup before any terrain is loaded. A cache large enough for the hot
+    terrain blocks keeps them in memory between pans.
+    """
+    set_gdal_config("GDAL_CACHEMAX", int(cache_mb))
+    logger.info(f"GDAL block cache set to {cache_mb} MB")
+
+
+class TerrainReadPlan(NamedTuple):
+    """Which part of a terrain raster to read, and at what decimation."""
+    window: Window  # Full-resolution source window
+    out_shape: Tuple[int, int]  # (height, width) actually read
+    overview_factor: int  # 1 = full resolution, otherwise the overview decimation factor
+
+
+def plan_terrain_read(
+    terrain_file: rasterio.DatasetReader,
+    dst_shape: Tuple[int, int],
+    dst_transform: rasterio.Affine,
+    dst_crs: CRS
+) -> Optional[TerrainReadPlan]:
+    """
+    Work out the source window and overview level needed for a destination grid.
+
+    Args:
+        terrain_file: Open terrain dataset
+        dst_shape: (height, width) of the destination grid
+        dst_transform: Affine transform of the destination grid
+        dst_crs: CRS of the destination grid
+
+    Returns:
+        TerrainReadPlan, or None if the destination does not overlap the raster
+    """
+    dst_height, dst_width = dst_shape
+    west, south, east, north = rasterio_transform.array_bounds(dst_height, dst_width, dst_transform)
+    if dst_crs != terrain_file.crs:
+        west, south, east, north = transform_bounds(
+            dst_crs, terrain_file.crs, west, south, east, north, densify_pts=21
+        )
+
+    # Pick the coarsest overview that is still at least as fine as the output
+    src_res = abs(terrain_file.res[0])
+    target_res = (east - west) / dst_width
+    factor = 1
+    for overview in terrain_file.overviews(1):
+        if overview * src_res <= target_res and overview > factor:
+            factor = overview
+
+    # Source window around the bbox, padded for resampling and snapped to the overview grid
+    window = from_bounds(west, south, east, north, transform=terrain_file.transform)
+    margin = RESAMPLING_MARGIN_PIXELS * factor
+    col_off = math.floor((window.col_off - margin) / factor) * factor
+    row_off = math.floor((window.row_off - margin) / factor) * factor
+    col_end = math.ceil((window.col_off + window.width + margin) / factor) * factor
+    row_end = math.ceil((window.row_off + window.height + margin) / factor) * factor
+
+    col_off, row_off = max(col_off, 0), max(row_off, 0)
+    col_end, row_end = min(col_end, terrain_file.width), min(row_end, terrain_file.height)
+    if col_end <= col_off or row_end <= row_off:
+        return None
+
+    window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+    out_shape = (
+        max(1, math.ceil(window.height / factor)),
+        max(1, math.ceil(window.width / factor)),
+    )
+    return TerrainReadPlan(window=window, out_shape=out_shape, overview_factor=factor)
+
+
+def read_terrain(
+    terrain_file: rasterio.DatasetReader,
+    dst_shape: Tuple[int, int],
+    dst_transform: rasterio.Affine,
+    dst_crs: CRS
+) -> np.ndarray:
+    """
+    Read and reproject the part of an open terrain dataset covering a destination grid.
+
+    Returns:
+        2D float32 array of terrain elevation with shape dst_shape
+    """
+    terrain_warped = np.zeros(dst_shape, dtype=np.float32)
+
+    plan = plan_terrain_read(terrain_file, dst_shape, dst_transform, dst_crs)
+    if plan is None:
+        logger.warning("Bounding box does not overlap the terrain raster")
+        return terrain_warped
+
+    # Reading at a decimated out_shape lets GDAL serve pixels from the matching overview
+    terrain_data = terrain_file.read(
+        1,
+        window=plan.window,
+        out_shape=plan.out_shape,
+        resampling=Resampling.nearest
+    )
+    src_transform = terrain_file.window_transform(plan.window) * rasterio.Affine.scale(
+        plan.window.width / plan.out_shape[1],
+        plan.window.height / plan.out_shape[0]
+    )
+
+    # Reproject terrain to match weather data
+    reproject(
+        source=terrain_data,
+        destination=terrain_warped,
+        src_transform=src_transform,
+        src_crs=terrain_file.crs,
+        src_nodata=terrain_file.nodata,
+        dst_transform=dst_transform,
+        dst_crs=dst_crs,
+        resampling=Resampling.bilinear
+    )
+
+    return terrain_warped
+
+
+def load_terrain_chip(
+    terrain_path: str,
+    weather_shape: Tuple[int, int],
+    weather_transform: rasterio.Affine,
+    weather_crs: CRS
+) -> np.ndarray:
+    """
+    Load terrain elevation data for the specific region using Rasterio.
+
+    Args:
+        terrain_path: Path to terrain_data.tif
+        weather_shape: (height, width) of weather data
+        weather_transform: Affine transform of weather data
+        weather_crs: CRS of weather data
+
+    Returns:
+        2D numpy array of terrain elevation [H, W] (read-only when served
+        from the shared chip cache)
+    """
+    # Pre-warped tiles, when a pyramid has been built for this terrain
+    pyramid = None
+    if settings.TERRAIN_PYRAMID_PATH and weather_crs == WGS84:
+        pyramid = get_pyramid(settings.TERRAIN_PYRAMID_PATH)
+
+    if pyramid is None and not os.path.exists(terrain_path):
+        logger.warning(f"Terrain file not found. Using synthetic data.")
+        return np.random.rand(weather_shape[0], weather_shape[1]) * 1000
+
+    # Chips already warped by any worker are served from shared memory
+    cache = app.services.chip_cache.chip_cache
+    key = None
+    if cache is not None:
+        source = ("pyramid", settings.TERRAIN_PYRAMID_PATH) if pyramid is not None else (
+            "raster", os.path.abspath(terrain_path), os.path.getmtime(terrain_path)
+        )
+        bounds = tuple(round(v, 6) for v in rasterio_transform.array_bounds(*weather_shape, weather_transform))
+        key = chip_key(source, bounds, tuple(weather_shape), str(weather_crs))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if pyramid is not None:
+        terrain = pyramid.read_chip(weather_shape, weather_transform)
+    else:
+        terrain_file = terrain_pool.get(terrain_path)
+        terrain = read_terrain(terrain_file, weather_shape, weather_transform, weather_crs)
+
+    if key is not None:
+        cache.put(key, terrain)
+    return terrain
+
+
+def load_conditioned_chip(
+    weather_shape: Tuple[int, int],
+    weather_transform: rasterio.Affine,
+    weather_crs: CRS
+) -> Optional[ConditionedChip]:
+    """
+    Load terrain with its offline hydrologic conditioning for a region.
+
+    Args:
+        weather_shape: (height, width) of weather data
+        weather_transform: Affine transform of weather data
+        weather_crs: CRS of weather data
+
+    Returns:
+        ConditionedChip at the native resolution of the pyramid, or None if
+        no conditioned pyramid covers this request
+    """
+    if not settings.TERRAIN_PYRAMID_PATH or weather_crs != WGS84:
+        return None
+    pyramid = get_pyramid(settings.TERRAIN_PYRAMID_PATH)
+    if pyramid is None:
+        return None
+    return pyramid.read_conditioned(weather_shape, weather_transform)
+
+
+def conditioning_available() -> bool:
+    """True if TERRAIN_PYRAMID_PATH holds a pyramid with at least one conditioned level."""
+    if not settings.TERRAIN_PYRAMID_PATH:
+        return False
+    pyramid = get_pyramid(settings.TERRAIN_PYRAMID_PATH)
+    return pyramid is not None and any(pyramid.has_conditioning(zoom) for zoom in pyramid.zooms)
+
+
+# Global dataset handle pool
+terrain_pool = TerrainDatasetPool(max_handles_per_thread=settings.TERRAIN_HANDLES_PER_THREAD)
@@ -0,0 +1,317 @@
+"""
+Pre-warped terrain tile pyramid.
+
+The pyramid is built offline by app.tools.build_terrain_pyramid. Each zoom
+level is stored as one memory-mappable .npy file of fixed-size float32 tiles
+already reprojected to EPSG:4326 (the CRS of the weather grid), laid out
+tile-major as (tiles_y, tiles_x, tile_size, tile_size) so each tile is
+contiguous on disk. At request time a chip is assembled from the few tiles
+covering the bbox and bilinearly resampled, with no GDAL warp on the request
+path.
+
+Tiling scheme: at zoom z a tile spans 180 / 2**z degrees on both axes; tile
+column 0 starts at 180°W and tile row 0 starts at 90°N.
+
+Levels may also carry hydrologic conditioning layers written offline by
+app.tools.condition_terrain, in the same tile layout: the depression-filled
+DEM (float32), D8 flow directions (int8) and flow accumulation (float32).
+Directions cannot be resampled, so conditioned chips are cut from a level at
+its native resolution instead (read_conditioned).
+"""
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio import transform as rasterio_transform
+
+from app.services.interpolation import regrid
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "pyramid.json"
+DEFAULT_TILE_SIZE = 256
+
+# Conditioning layers and the value used outside the stored tiles
+CONDITIONING_LAYERS = {"filled": 0.0, "direction": -1, "accumulation": 0.0}
+
+
+def tile_degrees(zoom: int) -> float:
+    """Width and height of one tile in degrees at a zoom level."""
+    return 180.0 / (2 ** zoom)
+
+
+def pixel_degrees(zoom: int, tile_size: int = DEFAULT_TILE_SIZE) -> float:
+    """Pixel size in degrees at a zoom level."""
+    return tile_degrees(zoom) / tile_size
+
+
+def tile_range(
+    zoom: int,
+    west: float,
+    south: float,
+    east: float,
+    north: float
+) -> Tuple[int, int, int, int]:
+    """
+    Tiles covering a lon/lat bbox at a zoom level.
+
+    Returns:
+        (x0, y0, x1, y1) tile indices, inclusive of x0/y0 and exclusive of x1/y1
+    """
+    deg = tile_degrees(zoom)
+    eps = 1e-9  # Edges that land exactly on a tile boundary do not pull in the next tile
+    x0 = math.floor((west + 180.0) / deg + eps)
+    x1 = math.ceil((east + 180.0) / deg - eps)
+    y0 = math.floor((90.0 - north) / deg + eps)
+    y1 = math.ceil((90.0 - south) / deg - eps)
+    return x0, y0, max(x1, x0 + 1), max(y1, y0 + 1)
+
+
+def tile_transform(zoom: int, x: int, y: int, tile_size: int = DEFAULT_TILE_SIZE) -> rasterio.Affine:
+    """Affine transform of one tile."""
+    deg = tile_degrees(zoom)
+    west = -180.0 + x * deg
+    north = 90.0 - y * deg
+    return rasterio_transform.from_bounds(west, north - deg, west + deg, north, tile_size, tile_size)
+
+
+class PyramidLevel(NamedTuple):
+    """One zoom level of the pyramid."""
+    zoom: int
+    x0: int  # First stored tile column
+    y0: int  # First stored tile row
+    tiles: np.ndarray  # Memory-mapped (tiles_y, tiles_x, tile_size, tile_size) float32
+
+
+class ConditionedChip(NamedTuple):
+    """Terrain and its conditioning layers cut from one pyramid level at native resolution."""
+    terrain: np.ndarray  # Elevation (float32)
+    filled: np.ndarray  # Depression-filled elevation (float32)
+    direction: np.ndarray  # D8 flow directions (int8, -1 = drains out of the level)
+    accumulation: np.ndarray  # Upstream cells per cell over the whole level (float32)
+    extent: Tuple[float, float, float, float]  # Pixel-centre extent, excluding the halo
+    halo: int  # Extra cells on every side (neighbours of the edge cells)
+
+
+class TerrainPyramid:
+    """Reads terrain chips from a tile pyramid built by build_terrain_pyramid."""
+
+    def __init__(self, path: str):
+        """
+        Open a pyramid directory (tiles are memory-mapped lazily per level).
+
+        Args:
+            path: Directory containing pyramid.json and the level files
+        """
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+        self.tile_size = int(self.metadata["tile_size"])
+        self.zooms = sorted(int(z) for z in self.metadata["levels"])
+        self._levels: Dict[int, PyramidLevel] = {}
+        self._layers: Dict[Tuple[int, str], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def level(self, zoom: int) -> PyramidLevel:
+        """Return a zoom level, memory-mapping its tile file on first use."""
+        level = self._levels.get(zoom)
+        if level is None:
+            with self._lock:
+                level = self._levels.get(zoom)
+                if level is None:
+                    info = self.metadata["levels"][str(zoom)]
+                    tiles = np.load(os.path.join(self.path, info["file"]), mmap_mode="r")
+                    level = PyramidLevel(zoom, int(info["x0"]), int(info["y0"]), tiles)
+                    self._levels[zoom] = level
+        return level
+
+    def layer(self, zoom: int, name: str) -> Optional[np.ndarray]:
+        """Return a conditioning layer of a zoom level (memory-mapped), or None if not built."""
+        key = (zoom, name)
+        tiles = self._layers.get(key)
+        if tiles is None:
+            filename = self.metadata["levels"][str(zoom)].get("layers", {}).get(name)
+            if filename is None:
+                return None
+            with self._lock:
+                tiles = self._layers.get(key)
+                if tiles is None:
+                    tiles = np.load(os.path.join(self.path, filename), mmap_mode="r")
+                    self._layers[key] = tiles
+        return tiles
+
+    def has_conditioning(self, zoom: int) -> bool:
+        """True if every conditioning layer has been built for a zoom level."""
+        layers = self.metadata["levels"][str(zoom)].get("layers", {})
+        return all(name in layers for name in CONDITIONING_LAYERS)
+
+    def choose_zoom(self, target_pixel_degrees: float) -> int:
+        """Coarsest stored zoom whose pixels are at least as fine as the target."""
+        for zoom in self.zooms:
+            if pixel_degrees(zoom, self.tile_size) <= target_pixel_degrees:
+                return zoom
+        return self.zooms[-1]
+
+    def mosaic(
+        self,
+        zoom: int,
+        west: float,
+        south: float,
+        east: float,
+        north: float,
+        layer: Optional[str] = None
+    ) -> Tuple[np.ndarray, Tuple[float, float, float, float]]:
+        """
+        Assemble the tiles covering a bbox into one array.
+
+        Tiles outside the stored range are filled with zeros (-1 for directions).
+
+        Args:
+            zoom: Zoom level
+            west, south, east, north: Bbox in degrees
+            layer: Conditioning layer to read instead of elevation
+
+        Returns:
+            Tuple of (mosaic array, extent of its pixel centres)
+        """
+        level = self.level(zoom)
+        tiles = level.tiles if layer is None else self.layer(zoom, layer)
+        size = self.tile_size
+        x0, y0, x1, y1 = tile_range(zoom, west, south, east, north)
+        n_ty, n_tx = tiles.shape[:2]
+
+        fill = 0.0 if layer is None else CONDITIONING_LAYERS[layer]
+        mosaic = np.full(((y1 - y0) * size, (x1 - x0) * size), fill, dtype=tiles.dtype)
+        for ty in range(max(y0, level.y0), min(y1, level.y0 + n_ty)):
+            for tx in range(max(x0, level.x0), min(x1, level.x0 + n_tx)):
+                row = (ty - y0) * size
+                col = (tx - x0) * size
+                mosaic[row:row + size, col:col + size] = tiles[ty - level.y0, tx - level.x0]
+
+        deg = tile_degrees(zoom)
+        half_pixel = pixel_degrees(zoom, size) / 2
+        extent = (
+            -180.0 + x0 * deg + half_pixel,
+            90.0 - y1 * deg + half_pixel,
+            -180.0 + x1 * deg - half_pixel,
+            90.0 - y0 * deg - half_pixel,
+        )
+        return mosaic, extent
+
+    def read_chip(
+        self,
+        dst_shape: Tuple[int, int],
+        dst_transform: rasterio.Affine
+    ) -> np.ndarray:
+        """
+        Read terrain for an EPSG:4326 destination grid.
+
+        Args:
+            dst_shape: (height, width) of the destination grid
+            dst_transform: Affine transform of the destination grid (EPSG:4326)
+
+        Returns:
+            2D float32 array of terrain elevation with shape dst_shape
+        """
+        height, width = dst_shape
+        west, south, east, north = rasterio_transform.array_bounds(height, width, dst_transform)
+        zoom = self.choose_zoom((east - west) / width)
+
+        # One extra pixel around the bbox keeps bilinear samples inside the mosaic
+        pad = pixel_degrees(zoom, self.tile_size)
+        mosaic, mosaic_extent = self.mosaic(zoom, west - pad, south - pad, east + pad, north + pad)
+
+        # Destination pixel centres
+        res_x = (east - west) / width
+        res_y = (north - south) / height
+        dst_extent = (
+            west + res_x / 2,
+            south + res_y / 2,
+            east - res_x / 2,
+            north - res_y / 2,
+        )
+        return regrid(mosaic, mosaic_extent, dst_shape, dst_extent).astype(np.float32)
+
+    def read_conditioned(
+        self,
+        dst_shape: Tuple[int, int],
+        dst_transform: rasterio.Affine,
+        halo: int = 1
+    ) -> Optional[ConditionedChip]:
+        """
+        Cut terrain and conditioning layers covering an EPSG:4326 grid from one level.
+
+        The level is the conditioned one whose pixel size is closest to the
+        destination's; the chip keeps that level's pixels, so its shape
+        generally differs from dst_shape (by at most a factor of about 1.4
+        per axis when neighbouring levels are conditioned).
+
+        Args:
+            dst_shape: (height, width) of the destination grid
+            dst_transform: Affine transform of the destination grid (EPSG:4326)
+            halo: Extra cells kept around the bbox
+
+        Returns:
+            ConditionedChip, or None if the level has not been conditioned
+        """
+        height, width = dst_shape
+        west, south, east, north = rasterio_transform.array_bounds(height, width, dst_transform)
+        conditioned = [zoom for zoom in self.zooms if self.has_conditioning(zoom)]
+        if not conditioned:
+            return None
+        target = (east - west) / width
+        zoom = min(conditioned, key=lambda z: abs(math.log(pixel_degrees(z, self.tile_size) / target)))
+
+        pixel = pixel_degrees(zoom, self.tile_size)
+        pad = (halo + 1) * pixel
+        layers = {}
+        for name in (None,) + tuple(CONDITIONING_LAYERS):
+            layers[name], mosaic_extent = self.mosaic(zoom, west - pad, south - pad, east + pad, north + pad, name)
+
+        # Level pixels whose centres fall inside the bbox, plus the halo
+        first_x, _, _, last_y = mosaic_extent
+        col0 = math.ceil((west - first_x) / pixel - 1e-9)
+        col1 = max(math.floor((east - first_x) / pixel + 1e-9) + 1, col0 + 2)
+        row0 = math.ceil((last_y - north) / pixel - 1e-9)
+        row1 = max(math.floor((last_y - south) / pixel + 1e-9) + 1, row0 + 2)
+        window = np.s_[row0 - halo:row1 + halo, col0 - halo:col1 + halo]
+
+        return ConditionedChip(
+            terrain=layers[None][window],
+            filled=layers["filled"][window],
+            direction=layers["direction"][window],
+            accumulation=layers["accumulation"][window],
+            extent=(
+                first_x + col0 * pixel,
+                last_y - (row1 - 1) * pixel,
+                first_x + (col1 - 1) * pixel,
+                last_y - row0 * pixel,
+            ),
+            halo=halo
+        )
+
+
+# Opened pyramids, keyed by directory
+_pyramids: Dict[str, TerrainPyramid] = {}
+_pyramids_lock = threading.Lock()
+
+
+def get_pyramid(path: str) -> Optional[TerrainPyramid]:
+    """Return the (shared) pyramid at path, or None if no pyramid has been built there."""
+    pyramid = _pyramids.get(path)
+    if pyramid is not None:
+        return pyramid
+    if not os.path.exists(os.path.join(path, METADATA_FILE)):
+        return None
+    with _pyramids_lock:
+        pyramid = _pyramids.get(path)
+        if pyramid is None:
+            pyramid = TerrainPyramid(path)
+            _pyramids[path] = pyramid
+            logger.info(f"Using terrain pyramid at {path} (zoom {pyramid.zooms[0]}-{pyramid.zooms[-1]})")
+    return pyramid
@@ -0,0 +1,207 @@
+"""
+On-disk archive of Open-Meteo responses for record/replay.
+
+With WEATHER_API_PROVIDER=record every series returned by Open-Meteo is also
+stored in an SQLite archive keyed by forecast cycle and point coordinates.
+With WEATHER_API_PROVIDER=replay upstream requests are answered from that
+archive instead, with optional injected latency and failures, so load tests
+and benchmarks reproduce real weather traffic without network access.
+
+Coordinates are stored in units of 1e-4 degrees (the precision requests are
+sent with) and each series as raw float32 bytes, about 100 bytes per point
+per forecast cycle.
+"""
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.services.weather_cache import current_forecast_cycle
+
+logger = logging.getLogger(__name__)
+
+COORDINATE_SCALE = 10000  # Stored coordinates are in 1e-4 degrees
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    cycle TEXT NOT NULL,
+    lat INTEGER NOT NULL,
+    lon INTEGER NOT NULL,
+    precipitation BLOB NOT NULL,
+    PRIMARY KEY (lat, lon, cycle)
+) WITHOUT ROWID
+"""
+
+
+def _coordinate(value: float) -> int:
+    return int(round(value * COORDINATE_SCALE))
+
+
+class WeatherArchive:
+    """Hourly precipitation series indexed by (coordinates, forecast cycle)."""
+
+    def __init__(self, path: str):
+        """
+        Open (or create) an archive.
+
+        Args:
+            path: SQLite file; several workers may record into the same file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def record(
+        self,
+        cycle: datetime,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        series: Sequence[Optional[List[float]]]
+    ) -> int:
+        """
+        Store the series fetched for a forecast cycle (None entries are skipped).
+
+        Returns:
+            Number of series stored
+        """
+        rows = [
+            (cycle.isoformat(), _coordinate(lat), _coordinate(lon), np.asarray(values, dtype=np.float32).tobytes())
+            for lat, lon, values in zip(lats, lons, series)
+            if values is not None
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def lookup(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        cycle: Optional[datetime] = None
+    ) -> List[Optional[List[float]]]:
+        """
+        Return the archived series for each point.
+
+        Args:
+            lats, lons: Point coordinates
+            cycle: Replay the newest recording at or before this cycle
+                   (default: the newest recording of each point)
+
+        Returns:
+            One entry per point: the hourly series, or None if never recorded
+        """
+        bound = cycle.isoformat() if cycle is not None else "9999"
+        results = []
+        with self._lock:
+            for lat, lon in zip(lats, lons):
+                row = self._conn.execute(
+                    "SELECT precipitation FROM series WHERE lat = ? AND lon = ? AND cycle <= ? "
+                    "ORDER BY cycle DESC LIMIT 1",
+                    (_coordinate(lat), _coordinate(lon), bound)
+                ).fetchone()
+                results.append(np.frombuffer(row[0], dtype=np.float32).tolist() if row else None)
+        return results
+
+    def stats(self) -> dict:
+        """Return the number of archived series and forecast cycles."""
+        with self._lock:
+            n_series, n_cycles = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT cycle) FROM series"
+            ).fetchone()
+        return {"series": n_series, "cycles": n_cycles}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Global archive (opened on first use at WEATHER_ARCHIVE_PATH)
+_archive: Optional[WeatherArchive] = None
+_archive_lock = threading.Lock()
+_rng: Optional[random.Random] = None
+
+
+def get_archive() -> WeatherArchive:
+    """Return the archive at WEATHER_ARCHIVE_PATH, opening it on first use."""
+    global _archive
+    with _archive_lock:
+        if _archive is None or _archive.path != settings.WEATHER_ARCHIVE_PATH:
+            if _archive is not None:
+                _archive.close()
+            _archive = WeatherArchive(settings.WEATHER_ARCHIVE_PATH)
+            logger.info(f"Using weather archive at {_archive.path}")
+        return _archive
+
+
+def close_archive() -> None:
+    """Close the archive if it was opened."""
+    global _archive
+    with _archive_lock:
+        if _archive is not None:
+            _archive.close()
+            _archive = None
+
+
+def record_batch(
+    lats: Sequence[float],
+    lons: Sequence[float],
+    series: Sequence[Optional[List[float]]]
+) -> None:
+    """Archive one upstream response under the current forecast cycle."""
+    try:
+        get_archive().record(current_forecast_cycle(), lats, lons, series)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record weather response: {e}")
+
+
+def _replay_rng() -> random.Random:
+    global _rng
+    if _rng is None:
+        _rng = random.Random(settings.WEATHER_REPLAY_SEED)
+    return _rng
+
+
+async def replay_batch(lats: Sequence[float], lons: Sequence[float]) -> List[Optional[List[float]]]:
+    """
+    Answer one upstream request from the archive.
+
+    Sleeps for the configured latency and fails with the configured error
+    rate, like a real request would, before looking the points up.
+
+    Raises:
+        httpx.HTTPError for injected failures
+    """
+    rng = _replay_rng()
+    latency_ms = settings.WEATHER_REPLAY_LATENCY_MS + rng.uniform(
+        -settings.WEATHER_REPLAY_LATENCY_JITTER_MS, settings.WEATHER_REPLAY_LATENCY_JITTER_MS
+    )
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms / 1000)
+    if rng.random() < settings.WEATHER_REPLAY_ERROR_RATE:
+        raise httpx.HTTPError(f"Injected replay failure for {len(lats)} points")
+
+    cycle = None
+    if settings.WEATHER_REPLAY_CYCLE:
+        cycle = datetime.fromisoformat(settings.WEATHER_REPLAY_CYCLE)
+        if cycle.tzinfo is None:
+            cycle = cycle.replace(tzinfo=timezone.utc)
+    series = get_archive().lookup(lats, lons, cycle)
+    missing = sum(values is None for values in series)
+    if missing:
+        logger.warning(f"Weather archive has no recording for {missing}/{len(series)} replayed points")
+    return series
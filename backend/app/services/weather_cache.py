@@ -0,0 +1,247 @@
+"""
+Forecast-cycle-aware cache of hourly precipitation series.
+
+Weather is sampled on a fixed global lattice (multiples of WEATHER_LATTICE_STEP
+degrees) instead of a bbox-dependent linspace, so neighbouring and overlapping
+bounding boxes share sample points. Each lattice point's hourly series is kept
+in a bounded LRU cache until the next forecast cycle is published.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LatticeKey = Tuple[int, int]  # (lat index, lon index) in units of WEATHER_LATTICE_STEP
+
+
+def current_forecast_cycle(now: Optional[datetime] = None) -> datetime:
+    """
+    Return the start time (UTC) of the newest forecast cycle that has been published.
+
+    Cycles start every WEATHER_FORECAST_CYCLE_HOURS hours (00/06/12/18 UTC for GFS)
+    and become available WEATHER_FORECAST_PUBLISH_DELAY_HOURS hours later.
+    """
+    now = now or datetime.now(timezone.utc)
+    available = now - timedelta(hours=settings.WEATHER_FORECAST_PUBLISH_DELAY_HOURS)
+    cycle_hours = settings.WEATHER_FORECAST_CYCLE_HOURS
+    return available.replace(
+        hour=(available.hour // cycle_hours) * cycle_hours,
+        minute=0,
+        second=0,
+        microsecond=0
+    )
+
+
+def lattice_for_bbox(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Snap a bounding box to the global sampling lattice.
+
+    The lattice step starts at WEATHER_LATTICE_STEP and doubles until at most
+    WEATHER_LATTICE_MAX_POINTS_PER_SIDE points cover each axis, so coarse
+    lattices are subsets of finer ones and large views still reuse cached points.
+    The returned points enclose the bbox, so interpolation never extrapolates.
+
+    Returns:
+        Tuple of (lat_indices, lon_indices): ascending integer lattice indices
+        in units of WEATHER_LATTICE_STEP
+    """
+    base_step = settings.WEATHER_LATTICE_STEP
+    max_points = max(2, settings.WEATHER_LATTICE_MAX_POINTS_PER_SIDE)
+
+    stride = 1
+    while True:
+        step = base_step * stride
+        lat_lo, lat_hi = math.floor(min_lat / step), math.ceil(max_lat / step)
+        lon_lo, lon_hi = math.floor(min_lon / step), math.ceil(max_lon / step)
+        if max(lat_hi - lat_lo, lon_hi - lon_lo) + 1 <= max_points:
+            break
+        stride *= 2
+
+    # Always keep at least two points per axis
+    lat_hi = max(lat_hi, lat_lo + 1)
+    lon_hi = max(lon_hi, lon_lo + 1)
+
+    lat_indices = np.arange(lat_lo, lat_hi + 1) * stride
+    lon_indices = np.arange(lon_lo, lon_hi + 1) * stride
+    return lat_indices, lon_indices
+
+
+class WeatherCache:
+    """
+    Bounded LRU cache of hourly precipitation series keyed on lattice points.
+
+    Entries are tagged with the forecast cycle they were fetched in and are
+    treated as misses once a newer cycle has been published. Stale entries
+    stay until replaced or evicted, as a last resort for points the upstream
+    fails to deliver (see get_stale_many).
+    """
+
+    def __init__(self, max_points: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_points: Maximum number of lattice points kept before evicting
+                the least recently used entry
+        """
+        self.max_points = max_points
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[LatticeKey, Tuple[datetime, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(
+        self,
+        keys: List[LatticeKey],
+        cycle: Optional[datetime] = None
+    ) -> Dict[LatticeKey, List[float]]:
+        """
+        Look up several lattice points.
+
+        Returns:
+            Dict of the keys found for the current forecast cycle; absent keys are misses
+        """
+        cycle = cycle or current_forecast_cycle()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == cycle:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def get_stale_many(self, keys: List[LatticeKey]) -> Dict[LatticeKey, List[float]]:
+        """
+        Look up several lattice points regardless of forecast cycle.
+
+        Used to fill points the upstream could not deliver in time; does not
+        count as hits or misses.
+
+        Returns:
+            Dict of the keys found in any cycle
+        """
+        with self._lock:
+            return {key: self._entries[key][1] for key in keys if key in self._entries}
+
+    def put_many(
+        self,
+        series_by_key: Dict[LatticeKey, List[float]],
+        cycle: Optional[datetime] = None
+    ) -> None:
+        """Store hourly series for several lattice points under the current forecast cycle."""
+        cycle = cycle or current_forecast_cycle()
+        with self._lock:
+            for key, series in series_by_key.items():
+                self._entries[key] = (cycle, list(series))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_points:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_points,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Persist entries to a JSON file so a restarted worker starts warm.
+
+        The file is written to a temporary name and renamed into place.
+        """
+        with self._lock:
+            entries = [
+                [lat_idx, lon_idx, cycle.isoformat(), series]
+                for (lat_idx, lon_idx), (cycle, series) in self._entries.items()
+            ]
+        payload = {"lattice_step": settings.WEATHER_LATTICE_STEP, "entries": entries}
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(entries)} weather cache entries to {path}")
+
+    def load(self, path: str) -> int:
+        """
+        Load entries persisted by save(), skipping those from older forecast cycles.
+
+        Returns:
+            Number of entries loaded
+        """
+        if not os.path.exists(path):
+            return 0
+
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read weather cache file {path}: {e}")
+            return 0
+
+        if payload.get("lattice_step") != settings.WEATHER_LATTICE_STEP:
+            logger.info(f"Ignoring weather cache file {path}: lattice step changed")
+            return 0
+
+        cycle = current_forecast_cycle()
+        loaded = 0
+        with self._lock:
+            for lat_idx, lon_idx, entry_cycle, series in payload.get("entries", []):
+                if datetime.fromisoformat(entry_cycle) != cycle:
+                    continue
+                self._entries[(lat_idx, lon_idx)] = (cycle, series)
+                loaded += 1
+            while len(self._entries) > self.max_points:
+                self._entries.popitem(last=False)
+
+        logger.info(f"Loaded {loaded} weather cache entries from {path}")
+        return loaded
+
+
+# Global cache instance shared by all requests in this worker
+weather_cache = WeatherCache(max_points=settings.WEATHER_CACHE_MAX_POINTS)
+
+registry.callback(
+    "floodlert_weather_cache_lookups_total",
+    "Weather cache point lookups by result.",
+    "counter",
+    ["result"],
+    lambda: [(("hit",), weather_cache.hits), (("miss",), weather_cache.misses)]
+)
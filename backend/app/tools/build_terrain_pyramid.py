@@ -0,0 +1,136 @@
+"""
+Build a pre-warped terrain tile pyramid from a DEM.
+
+Every tile is reprojected to EPSG:4326 once, offline, so load_terrain_chip
+only has to stitch and resample tiles at request time.
+
+Usage (from backend/):
+    python -m app.tools.build_terrain_pyramid data/terrain_data.tif data/terrain_pyramid
+    python -m app.tools.build_terrain_pyramid dem.tif out/ --min-zoom 4 --max-zoom 11
+"""
+import argparse
+import json
+import logging
+import math
+import os
+from typing import Optional
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.warp import transform_bounds
+
+from app.services.terrain import read_terrain
+from app.services.terrain_pyramid import (
+    DEFAULT_TILE_SIZE,
+    METADATA_FILE,
+    pixel_degrees,
+    tile_range,
+    tile_transform,
+)
+
+logger = logging.getLogger(__name__)
+
+WGS84 = CRS.from_epsg(4326)
+
+
+def default_zoom_range(source: rasterio.DatasetReader, tile_size: int):
+    """
+    Zoom levels from "whole DEM in a couple of tiles" down to source resolution.
+
+    The finest level is the last one whose pixels are not finer than the source.
+    """
+    west, south, east, north = transform_bounds(source.crs, WGS84, *source.bounds, densify_pts=21)
+    source_degrees = (east - west) / source.width
+
+    max_zoom = 0
+    while pixel_degrees(max_zoom + 1, tile_size) >= source_degrees:
+        max_zoom += 1
+    min_zoom = max(0, min(max_zoom, math.floor(math.log2(180.0 / max(east - west, north - south)))))
+    return min_zoom, max_zoom
+
+
+def build_terrain_pyramid(
+    source_path: str,
+    output_dir: str,
+    min_zoom: Optional[int] = None,
+    max_zoom: Optional[int] = None,
+    tile_size: int = DEFAULT_TILE_SIZE
+) -> dict:
+    """
+    Build the pyramid.
+
+    Args:
+        source_path: DEM GeoTIFF (any CRS)
+        output_dir: Directory to write pyramid.json and one z{zoom}.npy per level
+        min_zoom, max_zoom: Zoom range (defaults derived from the DEM)
+        tile_size: Tile width/height in pixels
+
+    Returns:
+        The pyramid metadata written to pyramid.json
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    with rasterio.open(source_path) as source:
+        default_min, default_max = default_zoom_range(source, tile_size)
+        min_zoom = default_min if min_zoom is None else min_zoom
+        max_zoom = default_max if max_zoom is None else max_zoom
+        bounds = transform_bounds(source.crs, WGS84, *source.bounds, densify_pts=21)
+
+        levels = {}
+        for zoom in range(min_zoom, max_zoom + 1):
+            x0, y0, x1, y1 = tile_range(zoom, *bounds)
+            filename = f"z{zoom}.npy"
+            tiles = np.lib.format.open_memmap(
+                os.path.join(output_dir, filename + ".tmp"),
+                mode="w+",
+                dtype=np.float32,
+                shape=(y1 - y0, x1 - x0, tile_size, tile_size)
+            )
+            for ty in range(y0, y1):
+                for tx in range(x0, x1):
+                    tiles[ty - y0, tx - x0] = read_terrain(
+                        source,
+                        (tile_size, tile_size),
+                        tile_transform(zoom, tx, ty, tile_size),
+                        WGS84
+                    )
+            tiles.flush()
+            del tiles
+            os.replace(os.path.join(output_dir, filename + ".tmp"), os.path.join(output_dir, filename))
+
+            levels[str(zoom)] = {"file": filename, "x0": x0, "y0": y0, "nx": x1 - x0, "ny": y1 - y0}
+            logger.info(f"Zoom {zoom}: {(x1 - x0) * (y1 - y0)} tiles")
+
+    metadata = {
+        "source": os.path.abspath(source_path),
+        "crs": "EPSG:4326",
+        "tile_size": tile_size,
+        "dtype": "float32",
+        "levels": levels,
+    }
+    # Written last, so readers never see a half-built pyramid
+    with open(os.path.join(output_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a pre-warped EPSG:4326 terrain tile pyramid from a DEM."
+    )
+    parser.add_argument("source", help="Input DEM (GeoTIFF, any CRS)")
+    parser.add_argument("output", help="Output pyramid directory")
+    parser.add_argument("--min-zoom", type=int, default=None, help="Coarsest zoom level")
+    parser.add_argument("--max-zoom", type=int, default=None, help="Finest zoom level")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="Tile size in pixels")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    metadata = build_terrain_pyramid(args.source, args.output, args.min_zoom, args.max_zoom, args.tile_size)
+    zooms = sorted(int(z) for z in metadata["levels"])
+    logger.info(f"Built terrain pyramid with zoom levels {zooms[0]}-{zooms[-1]} in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Precompute hydrologic conditioning for a terrain tile pyramid.
+
+Depression filling and flow routing depend only on terrain, so they are done
+once per pyramid level, offline, with a heap-based priority-flood. Each level
+is conditioned as a whole, so drainage is continuous across tile edges, and
+the results are stored next to its elevation tiles in the same tile-major
+layout:
+
+    z{zoom}_filled.npy        depression-filled DEM (float32)
+    z{zoom}_direction.npy     D8 flow directions (int8, -1 = drains off the level)
+    z{zoom}_accumulation.npy  upstream cell counts (float32)
+
+The flood loop runs in Python (roughly a few seconds per million cells), so
+very large levels are best conditioned selectively with --zoom.
+
+Usage (from backend/):
+    python -m app.tools.condition_terrain data/terrain_pyramid
+    python -m app.tools.condition_terrain data/terrain_pyramid --zoom 10 11
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.raster_flood import cell_size_m, flow_accumulation, priority_flood, receivers_from_directions
+from app.services.terrain_pyramid import METADATA_FILE, TerrainPyramid, pixel_degrees, tile_degrees
+
+logger = logging.getLogger(__name__)
+
+
+def _untile(tiles: np.ndarray) -> np.ndarray:
+    """(tiles_y, tiles_x, size, size) tiles to one 2D raster."""
+    n_ty, n_tx, size, _ = tiles.shape
+    return np.asarray(tiles).transpose(0, 2, 1, 3).reshape(n_ty * size, n_tx * size)
+
+
+def _write_tiled(path: str, raster: np.ndarray, tile_size: int) -> None:
+    """Write a 2D raster in tile-major layout, replacing path atomically."""
+    height, width = raster.shape
+    tiles = raster.reshape(height // tile_size, tile_size, width // tile_size, tile_size).transpose(0, 2, 1, 3)
+    staging = path + ".tmp"
+    out = np.lib.format.open_memmap(staging, mode="w+", dtype=raster.dtype, shape=tiles.shape)
+    out[...] = tiles
+    out.flush()
+    del out
+    os.replace(staging, path)
+
+
+def condition_level(pyramid: TerrainPyramid, zoom: int) -> Dict[str, str]:
+    """
+    Condition one zoom level and write its layer files.
+
+    Returns:
+        Layer name -> file name, as recorded in pyramid.json
+    """
+    level = pyramid.level(zoom)
+    size = pyramid.tile_size
+    elevation = _untile(level.tiles).astype(np.float64)
+    height, width = elevation.shape
+
+    # Pixel-centre extent of the level
+    deg = tile_degrees(zoom)
+    half_pixel = pixel_degrees(zoom, size) / 2
+    west = -180.0 + level.x0 * deg + half_pixel
+    north = 90.0 - level.y0 * deg - half_pixel
+    extent = (west, north - (height - 1) * 2 * half_pixel, west + (width - 1) * 2 * half_pixel, north)
+    cell_x, cell_y = cell_size_m((height, width), extent)
+
+    started = time.perf_counter()
+    filled, direction = priority_flood(elevation, cell_x, cell_y)
+    accumulation = flow_accumulation(receivers_from_directions(direction), np.ones(height * width))
+    logger.info(f"Zoom {zoom}: conditioned {height}x{width} cells in {time.perf_counter() - started:.1f}s")
+
+    layers = {}
+    for name, raster in (
+        ("filled", filled),
+        ("direction", direction.astype(np.int8)),
+        ("accumulation", accumulation.astype(np.float32).reshape(height, width)),
+    ):
+        filename = f"z{zoom}_{name}.npy"
+        _write_tiled(os.path.join(pyramid.path, filename), raster, size)
+        layers[name] = filename
+    return layers
+
+
+def condition_terrain(pyramid_dir: str, zooms: Optional[List[int]] = None) -> dict:
+    """
+    Condition pyramid levels and record the layers in pyramid.json.
+
+    Args:
+        pyramid_dir: Pyramid built by app.tools.build_terrain_pyramid
+        zooms: Levels to condition (default: all)
+
+    Returns:
+        The updated pyramid metadata
+    """
+    pyramid = TerrainPyramid(pyramid_dir)
+    metadata = pyramid.metadata
+    for zoom in zooms if zooms is not None else pyramid.zooms:
+        if str(zoom) not in metadata["levels"]:
+            raise ValueError(f"Pyramid {pyramid_dir} has no zoom level {zoom}")
+        metadata["levels"][str(zoom)]["layers"] = condition_level(pyramid, zoom)
+
+    # Layer files are complete before the metadata points at them
+    path = os.path.join(pyramid_dir, METADATA_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute filled DEM, flow directions and flow accumulation for a terrain pyramid."
+    )
+    parser.add_argument("pyramid", help="Pyramid directory (TERRAIN_PYRAMID_PATH)")
+    parser.add_argument("--zoom", type=int, nargs="+", default=None, help="Zoom levels to condition (default: all)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    metadata = condition_terrain(args.pyramid, args.zoom)
+    conditioned = sorted(int(z) for z, level in metadata["levels"].items() if "layers" in level)
+    logger.info(f"Conditioned zoom levels {conditioned} in {args.pyramid}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Ingest a downloaded GFS forecast (GRIB2 or NetCDF) into a precipitation cube.
+
+Reads the precipitation field with xarray (cfgrib for GRIB2), converts it to
+mm/hour on a north-up, -180..180 longitude grid, writes it as a chunked
+lat x lon x forecast hour cube and then atomically makes it the active cycle
+for WEATHER_API_PROVIDER=local_cube. GFS publishes one GRIB2 file per forecast
+hour, so several files may be given and are concatenated along the forecast
+hour axis.
+
+Usage (from backend/):
+    python -m app.tools.ingest_forecast gfs.t00z.pgrb2.0p25.f0* --output data/forecast_cube
+    python -m app.tools.ingest_forecast forecast.nc --output data/forecast_cube --variable precip
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+import numpy as np
+import xarray as xr
+
+from app.services.forecast_cube import CURRENT_FILE, DATA_FILE, DEFAULT_CHUNK_SIZE, METADATA_FILE
+
+logger = logging.getLogger(__name__)
+
+# Tried in order when no variable is given
+PRECIPITATION_VARIABLES = ("tp", "prate", "APCP_surface", "PRATE_surface", "precipitation", "precip", "pr")
+LAT_NAMES = ("latitude", "lat")
+LON_NAMES = ("longitude", "lon")
+TIME_NAMES = ("step", "valid_time", "time", "forecast_hour")
+GRIB_SUFFIXES = (".grib", ".grib2", ".grb", ".grb2")
+
+# Cycles kept on disk besides the active one (readers may still be mapping them)
+KEEP_PREVIOUS_CYCLES = 1
+
+
+def _find(names: Sequence[str], available) -> Optional[str]:
+    return next((name for name in names if name in available), None)
+
+
+def open_forecast(path: str, variable: Optional[str] = None) -> xr.DataArray:
+    """Open the precipitation variable of one GRIB2 or NetCDF file."""
+    if path.lower().endswith(GRIB_SUFFIXES) or ".pgrb2" in os.path.basename(path):
+        # GFS GRIB2 files mix many level types; only open the precipitation messages
+        filters = {"shortName": variable} if variable else {"stepType": "accum", "shortName": "tp"}
+        dataset = xr.open_dataset(path, engine="cfgrib", backend_kwargs={"filter_by_keys": filters, "indexpath": ""})
+    else:
+        dataset = xr.open_dataset(path)
+
+    name = variable or _find(PRECIPITATION_VARIABLES, dataset.data_vars)
+    if name is None or name not in dataset.data_vars:
+        raise ValueError(f"No precipitation variable in {path}; available: {list(dataset.data_vars)}")
+    return dataset[name]
+
+
+def _forecast_hours(field: xr.DataArray, time_dim: str, cycle: datetime) -> np.ndarray:
+    values = field[time_dim].values
+    if np.issubdtype(values.dtype, np.timedelta64):
+        return values / np.timedelta64(1, "h")
+    if np.issubdtype(values.dtype, np.datetime64):
+        cycle64 = np.datetime64(cycle.astimezone(timezone.utc).replace(tzinfo=None))
+        return (values - cycle64) / np.timedelta64(1, "h")
+    return values.astype(np.float64)
+
+
+def _cycle_of(field: xr.DataArray, time_dim: str) -> datetime:
+    """Forecast reference time: the scalar 'time' coordinate (cfgrib), else the first valid time."""
+    if "time" in field.coords and field["time"].ndim == 0:
+        value = field["time"].values
+    else:
+        value = field[time_dim].values[0]
+    return datetime.fromisoformat(str(np.datetime_as_string(value, unit="s"))).replace(tzinfo=timezone.utc)
+
+
+def to_hourly_rate(field: np.ndarray, hours: np.ndarray, units: str, accumulated: bool) -> np.ndarray:
+    """
+    Convert a precipitation field (..., hours) to mm/hour.
+
+    Rates (per second) are scaled directly. Amounts are converted to mm and
+    divided by the length of the interval ending at each forecast hour; with
+    accumulated=True they are first differenced from running totals.
+    """
+    units = (units or "").replace(" ", "")
+    if "s-1" in units or "s**-1" in units or "/s" in units:
+        return field * 3600.0  # kg m-2 s-1 == mm/s
+
+    if units == "m":
+        field = field * 1000.0
+    if accumulated:
+        field = np.diff(field, axis=-1, prepend=0.0)
+    intervals = np.diff(hours, prepend=0.0)
+    intervals[intervals <= 0] = 1.0
+    return field / intervals
+
+
+def write_cycle(
+    output_dir: str,
+    cycle: datetime,
+    precipitation: np.ndarray,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    hours: np.ndarray,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    source: Sequence[str] = ()
+) -> str:
+    """
+    Write one cycle and make it the active one.
+
+    Args:
+        output_dir: Cube directory
+        cycle: Forecast reference time (UTC)
+        precipitation: (lat, lon, hour) mm/hour on a regular grid
+        lats, lons: Cell-centre coordinates (any order, lons in -180..360)
+        hours: Forecast hour of each slice
+        chunk_size: Spatial chunk width/height in cells
+        source: Input files, recorded in the metadata
+
+    Returns:
+        Name of the cycle directory
+    """
+    # North-up rows, -180..180 columns, ascending hours
+    lons = np.where(lons > 180.0, lons - 360.0, lons)
+    row_order = np.argsort(-lats)
+    col_order = np.argsort(lons)
+    hour_order = np.argsort(hours)
+    precipitation = precipitation[row_order][:, col_order][:, :, hour_order]
+    lats, lons, hours = lats[row_order], lons[col_order], hours[hour_order]
+    if len(lats) < 2 or len(lons) < 2:
+        raise ValueError("Forecast grid needs at least two rows and columns")
+    resolution = float(lons[1] - lons[0])
+    if not np.allclose(np.diff(lons), resolution) or not np.allclose(-np.diff(lats), resolution):
+        raise ValueError("Forecast grid must be regular with equal lat/lon spacing")
+
+    height, width, n_hours = precipitation.shape
+    chunks_y = -(-height // chunk_size)
+    chunks_x = -(-width // chunk_size)
+
+    name = cycle.strftime("%Y%m%dT%H%MZ")
+    cycle_dir = os.path.join(output_dir, name)
+    staging_dir = cycle_dir + ".tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    cube = np.lib.format.open_memmap(
+        os.path.join(staging_dir, DATA_FILE),
+        mode="w+",
+        dtype=np.float32,
+        shape=(chunks_y, chunks_x, chunk_size, chunk_size, n_hours)
+    )
+    for cy in range(chunks_y):
+        for cx in range(chunks_x):
+            block = precipitation[cy * chunk_size:(cy + 1) * chunk_size, cx * chunk_size:(cx + 1) * chunk_size]
+            cube[cy, cx, :block.shape[0], :block.shape[1]] = np.nan_to_num(block, nan=0.0)
+    cube.flush()
+    del cube
+
+    metadata = {
+        "cycle": cycle.isoformat(),
+        "hours": [float(h) for h in hours],
+        "west": float(lons[0]),
+        "north": float(lats[0]),
+        "resolution": resolution,
+        "height": height,
+        "width": width,
+        "chunk_size": chunk_size,
+        "units": "mm/hour",
+        "dtype": "float32",
+        "source": [os.path.abspath(path) for path in source],
+    }
+    with open(os.path.join(staging_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    shutil.rmtree(cycle_dir, ignore_errors=True)
+    os.replace(staging_dir, cycle_dir)
+
+    # Publish: readers see either the old or the new cycle, never a partial one
+    pointer = os.path.join(output_dir, CURRENT_FILE)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    _prune_cycles(output_dir, name)
+    return name
+
+
+def _cycle_time(cycle_dir: str) -> datetime:
+    """Forecast reference time of an ingested cycle (naive times are UTC)."""
+    with open(os.path.join(cycle_dir, METADATA_FILE)) as f:
+        cycle = datetime.fromisoformat(json.load(f)["cycle"])
+    return cycle if cycle.tzinfo else cycle.replace(tzinfo=timezone.utc)
+
+
+def _prune_cycles(output_dir: str, active: str) -> None:
+    """Delete inactive cycles but the KEEP_PREVIOUS_CYCLES with the latest reference times."""
+    cycles = sorted(
+        (
+            entry for entry in os.listdir(output_dir)
+            if entry != active and os.path.isfile(os.path.join(output_dir, entry, METADATA_FILE))
+        ),
+        key=lambda entry: _cycle_time(os.path.join(output_dir, entry))
+    )
+    for stale in cycles[:max(0, len(cycles) - KEEP_PREVIOUS_CYCLES)]:
+        shutil.rmtree(os.path.join(output_dir, stale), ignore_errors=True)
+
+
+def ingest_forecast(
+    source_paths: List[str],
+    output_dir: str,
+    variable: Optional[str] = None,
+    cycle: Optional[datetime] = None,
+    accumulated: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> str:
+    """
+    Ingest forecast files into the cube directory and activate the new cycle.
+
+    Args:
+        source_paths: GRIB2/NetCDF files (e.g. one per forecast hour)
+        output_dir: Cube directory (WEATHER_CUBE_PATH)
+        variable: Precipitation variable name (auto-detected by default)
+        cycle: Forecast reference time (read from the files by default)
+        accumulated: Values are running totals since the start of the forecast
+        chunk_size: Spatial chunk width/height in cells
+
+    Returns:
+        Name of the activated cycle directory
+    """
+    fields = [open_forecast(path, variable) for path in source_paths]
+    first = fields[0]
+    lat_dim = _find(LAT_NAMES, first.dims)
+    lon_dim = _find(LON_NAMES, first.dims)
+    if lat_dim is None or lon_dim is None:
+        raise ValueError(f"Could not find latitude/longitude dimensions in {first.dims}")
+
+    time_dim = _find(TIME_NAMES, first.dims)
+    if time_dim is None:
+        # One GRIB2 file per forecast hour: the step is a scalar coordinate
+        time_dim = _find(TIME_NAMES[:2], first.coords)
+        fields = [field.expand_dims(time_dim) for field in fields]
+    field = xr.concat(fields, dim=time_dim) if len(fields) > 1 else fields[0]
+    field = field.transpose(lat_dim, lon_dim, time_dim)
+
+    cycle = cycle or _cycle_of(field, time_dim)
+    hours = _forecast_hours(field, time_dim, cycle)
+    order = np.argsort(hours)
+    values = to_hourly_rate(
+        field.values.astype(np.float64)[:, :, order],
+        hours[order],
+        field.attrs.get("units", ""),
+        accumulated
+    )
+
+    name = write_cycle(
+        output_dir,
+        cycle,
+        values.astype(np.float32),
+        field[lat_dim].values.astype(np.float64),
+        field[lon_dim].values.astype(np.float64),
+        hours[order],
+        chunk_size,
+        source_paths
+    )
+    logger.info(
+        f"Ingested forecast cycle {cycle.isoformat()} ({len(hours)} hours, "
+        f"{values.shape[0]}x{values.shape[1]} cells) into {output_dir}/{name}"
+    )
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ingest a GFS GRIB2/NetCDF forecast into the local precipitation cube."
+    )
+    parser.add_argument("sources", nargs="+", help="GRIB2 or NetCDF files (e.g. one per forecast hour)")
+    parser.add_argument("--output", default="data/forecast_cube", help="Cube directory (WEATHER_CUBE_PATH)")
+    parser.add_argument("--variable", default=None, help="Precipitation variable (auto-detected by default)")
+    parser.add_argument("--cycle", default=None, help="Forecast reference time, ISO format (read from files by default)")
+    parser.add_argument("--accumulated", action="store_true", help="Values are running totals since forecast start")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Spatial chunk size in cells")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    cycle = None
+    if args.cycle:
+        cycle = datetime.fromisoformat(args.cycle)
+        cycle = cycle if cycle.tzinfo else cycle.replace(tzinfo=timezone.utc)
+    ingest_forecast(args.sources, args.output, args.variable, cycle, args.accumulated, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Compare the flood estimation methods for speed and agreement.
+
+Runs every available method on synthetic scenes (terrain with closed basins,
+a regional slope and small-scale noise, under a moving storm cell):
+
+    heuristic          AnugaSimulator._simple_flood_estimation
+    raster             RasterFloodSimulator (fill, flow routing, ponding)
+    raster_conditioned RasterFloodSimulator.simulate_conditioned on terrain
+                       conditioned offline (untimed), as served from a
+                       conditioned pyramid; timings include both regrids
+    anuga              AnugaSimulator._run_anuga_simulation (only if ANUGA is installed)
+
+For each output size it reports latency percentiles per method, and for each
+pair of methods the Pearson correlation of their flood risk grids and the
+overlap (intersection over union) of their top-10% risk areas.
+
+Usage (from backend/):
+    python -m benchmarks.flood_methods [--sizes 256 512] [--repeat 10] [--scenes 3] [--chip-scale 1.2]
+"""
+import argparse
+import itertools
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from scipy import ndimage
+
+from app.services.anuga_simulator import ANUGA_AVAILABLE, AnugaSimulator
+from app.services.interpolation import regrid
+from app.services.raster_flood import (
+    RasterFloodSimulator, cell_size_m, flow_accumulation, priority_flood, receivers_from_directions
+)
+from app.services.terrain_pyramid import ConditionedChip
+from benchmarks.pipeline import BBOX, measure
+
+DEFAULT_SIZES = [256, 512]
+TOP_FRACTION = 0.1  # Share of cells counted as "flooded" when comparing methods
+CHIP_HALO = 1  # Same halo as TerrainPyramid.read_conditioned
+
+
+def synthetic_scene(size: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Terrain (meters) and precipitation (mm/hour) grids for one scene.
+    """
+    rng = np.random.default_rng(seed)
+    axis = np.linspace(0.0, 6 * np.pi, size)
+    basins = (np.sin(axis + rng.uniform(0, np.pi))[None, :] * np.cos(axis + rng.uniform(0, np.pi))[:, None] + 1.0) * 40.0
+    noise = ndimage.gaussian_filter(rng.normal(size=(size, size)), size / 128) * 20.0
+    slope = np.linspace(0.0, 60.0, size)[None, :]
+    terrain = basins + noise + slope
+
+    rows, cols = np.mgrid[0:size, 0:size] / size
+    centre_row, centre_col = rng.uniform(0.2, 0.8, 2)
+    storm = np.exp(-((rows - centre_row) ** 2 + (cols - centre_col) ** 2) / 0.08)
+    precipitation = 5.0 + 45.0 * storm
+    return terrain, precipitation
+
+
+def conditioned_chip(terrain: np.ndarray, scale: float = 1.0) -> ConditionedChip:
+    """
+    Condition a scene's terrain offline, as a pyramid level would store it.
+
+    Args:
+        terrain: Scene terrain over BBOX
+        scale: Chip pixels per request pixel along each axis; the pyramid
+            level closest to the request resolution is up to about 1.4 times
+            finer or coarser than the request grid
+
+    Returns:
+        ConditionedChip over BBOX with a CHIP_HALO halo
+    """
+    height, width = terrain.shape
+    shape = (max(round(height * scale), 2), max(round(width * scale), 2))
+    chip_terrain = regrid(terrain, BBOX, shape, BBOX) if shape != terrain.shape else terrain
+    chip_terrain = np.pad(chip_terrain, CHIP_HALO, mode="edge")
+    cell_x, cell_y = cell_size_m(shape, BBOX)
+    filled, direction = priority_flood(chip_terrain, cell_x, cell_y)
+    accumulation = flow_accumulation(receivers_from_directions(direction), np.ones(direction.size))
+    return ConditionedChip(
+        terrain=chip_terrain.astype(np.float32),
+        filled=filled,
+        direction=direction,
+        accumulation=accumulation.reshape(direction.shape).astype(np.float32),
+        extent=BBOX,
+        halo=CHIP_HALO
+    )
+
+
+def agreement(a: np.ndarray, b: np.ndarray, top_fraction: float = TOP_FRACTION) -> Dict[str, float]:
+    """Pearson correlation and top-fraction IoU of two risk grids."""
+    a = a.ravel()
+    b = b.ravel()
+    if a.std() == 0 or b.std() == 0:
+        correlation = 0.0
+    else:
+        correlation = float(np.corrcoef(a, b)[0, 1])
+    top_a = a >= np.quantile(a, 1.0 - top_fraction)
+    top_b = b >= np.quantile(b, 1.0 - top_fraction)
+    union = np.count_nonzero(top_a | top_b)
+    iou = np.count_nonzero(top_a & top_b) / union if union else 1.0
+    return {"correlation": correlation, "top_iou": float(iou)}
+
+
+def methods(chip_scale: float = 1.0) -> Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]]:
+    """
+    Available methods as fn(precipitation, terrain) -> flood risk.
+
+    Args:
+        chip_scale: Resolution of the conditioned chips relative to the request
+            grid (see conditioned_chip)
+    """
+    anuga = AnugaSimulator()
+    raster = RasterFloodSimulator()
+    # Offline conditioning per scene terrain, computed on first use (the warm-up run when timed)
+    chips: Dict[int, Tuple[np.ndarray, ConditionedChip]] = {}
+
+    def raster_conditioned(precipitation: np.ndarray, terrain: np.ndarray) -> np.ndarray:
+        if id(terrain) not in chips:
+            chips[id(terrain)] = (terrain, conditioned_chip(terrain, chip_scale))  # Keeps the id in use
+        return raster.simulate_conditioned(precipitation, chips[id(terrain)][1], *BBOX)[0]
+
+    available = {
+        "heuristic": anuga._simple_flood_estimation,
+        "raster": lambda precipitation, terrain: raster.simulate_flood_with_metadata(
+            precipitation, terrain, *BBOX
+        )[0],
+        "raster_conditioned": raster_conditioned,
+    }
+    if ANUGA_AVAILABLE:
+        available["anuga"] = lambda precipitation, terrain: anuga._run_anuga_simulation(
+            precipitation, terrain, *BBOX
+        )[0]
+    return available
+
+
+def run_comparison(
+    sizes: List[int],
+    repeat: int,
+    scenes: int,
+    chip_scale: float = 1.0
+) -> Dict[str, Dict[str, float]]:
+    """Time every method and compare their outputs; results keyed by case name."""
+    results: Dict[str, Dict[str, float]] = {}
+    available = methods(chip_scale)
+    if "anuga" not in available:
+        print("ANUGA not installed: comparing heuristic and raster methods only")
+
+    for size in sizes:
+        prefix = f"{size}x{size}/"
+        terrain, precipitation = synthetic_scene(size, seed=0)
+        for name, fn in available.items():
+            result = measure(lambda fn=fn: fn(precipitation, terrain), repeat)
+            results[prefix + name] = result
+            print(f"{prefix + name:<40} p50 {result['p50_ms']:9.1f} ms  p90 {result['p90_ms']:9.1f} ms")
+
+        scores: Dict[Tuple[str, str], List[Dict[str, float]]] = {}
+        for seed in range(scenes):
+            terrain, precipitation = synthetic_scene(size, seed)
+            outputs = {name: fn(precipitation, terrain) for name, fn in available.items()}
+            for first, second in itertools.combinations(outputs, 2):
+                scores.setdefault((first, second), []).append(agreement(outputs[first], outputs[second]))
+        for (first, second), values in scores.items():
+            name = f"{prefix}{first}~{second}"
+            results[name] = {
+                "correlation": float(np.mean([v["correlation"] for v in values])),
+                "top_iou": float(np.mean([v["top_iou"] for v in values])),
+            }
+            print(
+                f"{name:<40} correlation {results[name]['correlation']:6.3f}  "
+                f"top-{TOP_FRACTION:.0%} IoU {results[name]['top_iou']:6.3f}"
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Grid widths/heights in pixels")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per method")
+    parser.add_argument("--scenes", type=int, default=3, help="Scenes averaged for the agreement scores")
+    parser.add_argument(
+        "--chip-scale", type=float, default=1.0, help="Conditioned chip pixels per request pixel along each axis"
+    )
+    args = parser.parse_args()
+    run_comparison(args.sizes, args.repeat, args.scenes, args.chip_scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Benchmark the prediction pipeline stage by stage and end to end.
+
+Runs every stage against local fixtures only: weather is fetched from a
+replaying Open-Meteo stand-in (benchmarks/stand_in.py) and terrain is read from
+generated GeoTIFFs. For each output size the following cases are measured:
+
+    weather_fetch         fetch_weather_data with an empty weather cache
+    weather_fetch_cached  fetch_weather_data served from the weather cache
+    terrain_chip[dem=N]   load_terrain_chip from an N x N GeoTIFF
+    simple_estimation     AnugaSimulator._simple_flood_estimation
+    raster_flood          RasterFloodSimulator (PREDICTION_METHOD=raster)
+    unet_predict          FloodModelService.predict (untrained weights)
+    array_to_png          array_to_png
+    end_to_end            generate_prediction with an empty weather cache
+
+Each case reports latency percentiles over --repeat runs, the peak RSS reached
+while it ran, and the peak of Python-tracked allocations (NumPy buffers are
+tracked; torch's own allocator is not) from one extra traced run.
+
+Results can be saved as a baseline and later runs compared against it; the run
+exits with status 1 when a case regresses beyond the tolerance.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline [--sizes 256 512 1024 2048] [--repeat 10]
+    python -m benchmarks.pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline --baseline benchmarks/baseline.json [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from rasterio import transform as rasterio_transform
+from rasterio.crs import CRS
+
+from app.api.v1.endpoints.predict import array_to_png, fetch_weather_data, generate_prediction
+from app.core.config import settings
+from app.services import executor, open_meteo
+from app.services.anuga_simulator import AnugaSimulator, warm_worker
+from app.services.flood_model import FloodModelService
+from app.services.raster_flood import RasterFloodSimulator
+from app.services.terrain import load_terrain_chip, terrain_pool
+from app.services.weather_cache import weather_cache
+from benchmarks.stand_in import StandInOpenMeteo
+from benchmarks.terrain_read import generate_dem
+
+BBOX = (120.9, 14.4, 121.2, 14.8)  # Metro Manila
+DEFAULT_SIZES = [256, 512, 1024, 2048]
+DEFAULT_DEM_SIZES = [2048, 8192]
+
+# Differences below this are treated as noise when comparing against a baseline
+MIN_LATENCY_DELTA_MS = 2.0
+MIN_ALLOC_DELTA_MB = 1.0
+
+# Settings pointed at the fixtures while the benchmarks run
+OVERRIDDEN_SETTINGS = (
+    "OPEN_METEO_URL", "TERRAIN_PYRAMID_PATH", "TERRAIN_DATA_PATH", "PREDICTION_IMAGE_WIDTH", "PREDICTION_IMAGE_HEIGHT"
+)
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter for this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size in MiB (since the last reset where supported)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Time fn over repeat runs (after one warm-up run) and measure its memory use.
+
+    Args:
+        fn: Case body
+        repeat: Number of timed runs
+        setup: Called before every run, outside the timed region
+
+    Returns:
+        Dict of latency percentiles (ms), peak RSS (MiB) and allocation peak (MiB)
+    """
+    if setup:
+        setup()
+    fn()  # Warm-up (imports, caches, connection pool)
+
+    _reset_peak_rss()
+    latencies = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    peak_rss = _peak_rss_mb()
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, alloc_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies = np.asarray(latencies)
+    return {
+        "runs": repeat,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "peak_rss_mb": peak_rss,
+        "alloc_peak_mb": alloc_peak / (1024 * 1024),
+    }
+
+
+def run_benchmarks(sizes: List[int], dem_sizes: List[int], repeat: int, workdir: str) -> Dict[str, Dict[str, float]]:
+    """Run every case for every output size and return results keyed by case name."""
+    results: Dict[str, Dict[str, float]] = {}
+    loop = asyncio.new_event_loop()
+    run = loop.run_until_complete
+
+    dem_paths = {}
+    for dem_size in dem_sizes:
+        path = os.path.join(workdir, f"dem_{dem_size}.tif")
+        print(f"Generating {dem_size}x{dem_size} DEM...")
+        generate_dem(path, dem_size)
+        dem_paths[dem_size] = path
+
+    simulator = AnugaSimulator()
+    raster = RasterFloodSimulator()
+    model_service = FloodModelService(model_path=os.path.join(workdir, "missing.pth"))
+    model_service.load_model()  # No checkpoint: untrained weights, same cost
+
+    def record(name: str, fn: Callable[[], object], setup: Optional[Callable[[], None]] = None) -> None:
+        result = measure(fn, repeat, setup)
+        results[name] = result
+        print(
+            f"{name:<36} p50 {result['p50_ms']:9.1f} ms  p90 {result['p90_ms']:9.1f} ms  "
+            f"p99 {result['p99_ms']:9.1f} ms  rss {result['peak_rss_mb']:8.1f} MiB  "
+            f"alloc {result['alloc_peak_mb']:8.1f} MiB"
+        )
+
+    # Restored afterwards, so callers in the same process keep their configuration
+    saved_settings = {name: getattr(settings, name) for name in OVERRIDDEN_SETTINGS}
+    with StandInOpenMeteo() as stand_in:
+        try:
+            settings.OPEN_METEO_URL = stand_in.url
+            settings.TERRAIN_PYRAMID_PATH = None
+            settings.TERRAIN_DATA_PATH = dem_paths[max(dem_sizes)]
+            # As at server startup, so end_to_end runs on workers that have imported ANUGA
+            executor.stage_executor = executor.create_stage_executor(initializer=warm_worker)
+            for size in sizes:
+                settings.PREDICTION_IMAGE_WIDTH = size
+                settings.PREDICTION_IMAGE_HEIGHT = size
+                prefix = f"{size}x{size}/"
+
+                record(prefix + "weather_fetch", lambda: run(fetch_weather_data(*BBOX)), weather_cache.clear)
+                record(prefix + "weather_fetch_cached", lambda: run(fetch_weather_data(*BBOX)))
+                precipitation, metadata = run(fetch_weather_data(*BBOX))
+
+                transform = rasterio_transform.from_bounds(*BBOX, size, size)
+                crs = CRS.from_epsg(4326)
+                for dem_size, path in dem_paths.items():
+                    record(
+                        prefix + f"terrain_chip[dem={dem_size}]",
+                        lambda path=path: load_terrain_chip(path, (size, size), transform, crs)
+                    )
+                terrain = load_terrain_chip(settings.TERRAIN_DATA_PATH, (size, size), transform, crs)
+
+                record(prefix + "simple_estimation", lambda: simulator._simple_flood_estimation(precipitation, terrain))
+                record(
+                    prefix + "raster_flood",
+                    lambda: raster.simulate_flood_with_metadata(precipitation, terrain, *BBOX)
+                )
+                record(prefix + "unet_predict", lambda: model_service.predict(precipitation, terrain))
+                flood = simulator._simple_flood_estimation(precipitation, terrain)
+                record(prefix + "array_to_png", lambda: array_to_png(flood))
+                record(prefix + "end_to_end", lambda: run(generate_prediction(*BBOX)), weather_cache.clear)
+        finally:
+            for name, value in saved_settings.items():
+                setattr(settings, name, value)
+            run(open_meteo.close_http_client())
+            if executor.stage_executor is not None:
+                executor.stage_executor.shutdown()
+                executor.stage_executor = None
+            terrain_pool.close_all()
+            loop.close()
+        print(f"Stand-in served {stand_in.requests} upstream requests")
+    return results
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float
+) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    A case regresses when its p50 latency or allocation peak grows by more
+    than the tolerance (a fraction, e.g. 0.25) and by more than the noise floor.
+
+    Returns:
+        Human-readable descriptions of the regressions (empty if none)
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for metric, floor in (("p50_ms", MIN_LATENCY_DELTA_MS), ("alloc_peak_mb", MIN_ALLOC_DELTA_MB)):
+            before, after = base[metric], current[metric]
+            if after > before * (1 + tolerance) and after - before > floor:
+                regressions.append(f"{name}: {metric} {before:.1f} -> {after:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Output widths/heights in pixels")
+    parser.add_argument("--dem-sizes", type=int, nargs="+", default=DEFAULT_DEM_SIZES, help="Generated DEM widths/heights")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per case")
+    parser.add_argument("--save-baseline", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown (default 0.25)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_benchmarks(args.sizes, args.dem_sizes, args.repeat, tmp)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "environment": {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cpus": os.cpu_count(),
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
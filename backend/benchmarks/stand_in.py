@@ -0,0 +1,79 @@
+"""
+Local Open-Meteo stand-in that replays recorded hourly precipitation.
+
+Serves the comma-separated multi-location /v1/forecast endpoint from a fixture
+file, so weather fetches can be benchmarked without network access and with
+identical responses on every run.
+"""
+import json
+import os
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "open_meteo_hourly.json")
+
+
+def load_fixture(path: str = FIXTURE_PATH) -> List[List[float]]:
+    """Load the recorded hourly precipitation series."""
+    with open(path) as f:
+        return json.load(f)["hourly_precipitation"]
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers forecast requests from the recorded series, one series per location."""
+
+    series: List[List[float]] = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        lats = query["latitude"][0].split(",")
+        lons = query["longitude"][0].split(",")
+        self.server.requests += 1
+
+        locations = []
+        for lat, lon in zip(lats, lons):
+            # Stable choice of series per coordinate, independent of batch layout
+            index = zlib.crc32(f"{lat},{lon}".encode()) % len(self.series)
+            locations.append({
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "hourly": {"precipitation": self.series[index]},
+            })
+        body = json.dumps(locations if len(locations) > 1 else locations[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInOpenMeteo:
+    """Runs the replay server on a background thread (use as a context manager)."""
+
+    def __init__(self, fixture_path: str = FIXTURE_PATH):
+        handler = type("Handler", (ReplayHandler,), {"series": load_fixture(fixture_path)})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.requests = 0
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1/forecast"
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    def __enter__(self) -> "StandInOpenMeteo":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,122 @@
+"""
+Benchmark terrain chip loading: full-band read vs windowed, overview-aware read.
+
+Generates a large tiled GeoTIFF (with overviews) and loads 512x512 chips for a
+zoomed-in and a zoomed-out bbox with both strategies, reporting bytes read and
+latency.
+
+Usage (from backend/):
+    python -m benchmarks.terrain_read [--size 8192] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import rasterio
+from rasterio import transform as rasterio_transform
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.warp import reproject
+
+from app.services.terrain import load_terrain_chip, plan_terrain_read
+
+CHIP_SHAPE = (512, 512)
+RASTER_BOUNDS = (116.0, 4.0, 127.0, 21.0)  # Philippines
+
+
+def generate_dem(path: str, size: int) -> None:
+    """Write a size x size tiled float32 DEM with overviews."""
+    west, south, east, north = RASTER_BOUNDS
+    profile = {
+        "driver": "GTiff",
+        "width": size,
+        "height": size,
+        "count": 1,
+        "dtype": "float32",
+        "crs": CRS.from_epsg(4326),
+        "transform": rasterio_transform.from_bounds(west, south, east, north, size, size),
+        "tiled": True,
+        "blockxsize": 256,
+        "blockysize": 256,
+        "nodata": -9999.0,
+    }
+    rows_per_block = 1024
+    with rasterio.open(path, "w", **profile) as dst:
+        x = np.linspace(0, 8 * np.pi, size, dtype=np.float32)
+        for row in range(0, size, rows_per_block):
+            n = min(rows_per_block, size - row)
+            y = np.linspace(row, row + n, n, endpoint=False, dtype=np.float32)[:, None] / size * 8 * np.pi
+            block = (np.sin(x)[None, :] * np.cos(y) + 1.0) * 1000.0
+            dst.write(block.astype(np.float32), 1, window=rasterio.windows.Window(0, row, size, n))
+        dst.build_overviews([2, 4, 8, 16, 32], Resampling.average)
+
+
+def load_terrain_chip_full_read(terrain_path, weather_shape, weather_transform, weather_crs):
+    """Previous implementation: read the whole band, then reproject."""
+    with rasterio.open(terrain_path) as terrain_file:
+        terrain_data = terrain_file.read(1)
+        terrain_warped = np.zeros(weather_shape, dtype=np.float32)
+        reproject(
+            source=terrain_data,
+            destination=terrain_warped,
+            src_transform=terrain_file.transform,
+            src_crs=terrain_file.crs,
+            dst_transform=weather_transform,
+            dst_crs=weather_crs,
+            resampling=Resampling.bilinear
+        )
+        return terrain_warped, terrain_data.nbytes
+
+
+def load_terrain_chip_windowed(terrain_path, weather_shape, weather_transform, weather_crs):
+    """Current implementation, plus the number of bytes it decodes."""
+    with rasterio.open(terrain_path) as terrain_file:
+        plan = plan_terrain_read(terrain_file, weather_shape, weather_transform, weather_crs)
+        itemsize = np.dtype(terrain_file.dtypes[0]).itemsize
+    nbytes = plan.out_shape[0] * plan.out_shape[1] * itemsize if plan else 0
+    return load_terrain_chip(terrain_path, weather_shape, weather_transform, weather_crs), nbytes
+
+
+def run_case(name, path, bbox, repeat):
+    transform = rasterio_transform.from_bounds(*bbox, CHIP_SHAPE[1], CHIP_SHAPE[0])
+    crs = CRS.from_epsg(4326)
+    results = {}
+    for label, loader in (("full", load_terrain_chip_full_read), ("windowed", load_terrain_chip_windowed)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chip, nbytes = loader(path, CHIP_SHAPE, transform, crs)
+            timings.append(time.perf_counter() - start)
+        results[label] = (chip, nbytes, statistics.median(timings))
+
+    full_chip, full_bytes, full_time = results["full"]
+    win_chip, win_bytes, win_time = results["windowed"]
+    max_diff = float(np.abs(full_chip - win_chip).max())
+    print(
+        f"{name:<10} full: {full_bytes / 1e6:9.1f} MB {full_time * 1000:8.1f} ms | "
+        f"windowed: {win_bytes / 1e6:9.2f} MB {win_time * 1000:8.1f} ms | "
+        f"speedup {full_time / win_time:6.1f}x | max |diff| {max_diff:.1f} m"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=8192, help="DEM width/height in pixels")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case (median reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dem.tif")
+        print(f"Generating {args.size}x{args.size} DEM...")
+        generate_dem(path, args.size)
+
+        run_case("zoomed-in", path, (120.9, 14.4, 121.2, 14.8), args.repeat)
+        run_case("city", path, (120.5, 14.0, 121.5, 15.0), args.repeat)
+        run_case("zoomed-out", path, (117.0, 6.0, 126.0, 19.0), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
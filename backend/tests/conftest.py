@@ -0,0 +1,73 @@
+"""
+Shared test fixtures.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.core.config import settings
+from app.services import open_meteo
+from app.services.prediction_cache import prediction_cache
+from app.services.weather_cache import weather_cache
+
+
+class StandInOpenMeteo(BaseHTTPRequestHandler):
+    """Minimal Open-Meteo forecast endpoint supporting comma-separated coordinates."""
+
+    max_points = None  # Reject batches larger than this with 414 when set
+    delays = []  # Seconds to stall each successive request before answering
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        lats = query["latitude"][0].split(",")
+        lons = query["longitude"][0].split(",")
+        type(self).requests.append(len(lats))
+        if self.delays:
+            time.sleep(type(self).delays.pop(0))
+
+        if self.max_points is not None and len(lats) > self.max_points:
+            self.send_response(414)
+            self.end_headers()
+            return
+
+        locations = [
+            {
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "hourly": {"precipitation": [0.0, 2.5, None, 12.0]},
+            }
+            for lat, lon in zip(lats, lons)
+        ]
+        body = json.dumps(locations if len(locations) > 1 else locations[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server(monkeypatch):
+    StandInOpenMeteo.requests = []
+    StandInOpenMeteo.max_points = None
+    StandInOpenMeteo.delays = []
+    open_meteo.breaker.reset()
+    weather_cache.clear()
+    prediction_cache.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInOpenMeteo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        settings, "OPEN_METEO_URL", f"http://127.0.0.1:{server.server_port}/v1/forecast"
+    )
+    yield StandInOpenMeteo
+    server.shutdown()
+    server.server_close()
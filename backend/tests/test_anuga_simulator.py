@@ -0,0 +1,186 @@
+"""
+Tests for the ANUGA simulator's worker-side caches (ANUGA itself is not needed).
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.anuga_simulator import (
+    AnugaSimulator, MeshCache, SimulationMesh, evolve_until_steady, mesh_key, next_yieldstep, sample_mesh_inputs
+)
+
+
+def _mesh():
+    return SimulationMesh(domain=object(), vertex_x=None, vertex_y=None, centroid_x=None, centroid_y=None)
+
+
+def test_mesh_cache_reuses_and_evicts_least_recently_used():
+    cache = MeshCache(max_meshes=2)
+    built = []
+
+    def build():
+        built.append(_mesh())
+        return built[-1]
+
+    first, cached = cache.get_or_build("a", build)
+    assert not cached
+    again, cached = cache.get_or_build("a", build)
+    assert cached and again is first
+
+    cache.get_or_build("b", build)
+    cache.get_or_build("a", build)  # "b" is now least recently used
+    cache.get_or_build("c", build)
+    _, cached = cache.get_or_build("b", build)
+
+    assert not cached
+    assert len(built) == 4
+    assert cache.stats() == {"meshes": 2, "hits": 2, "misses": 4}
+
+
+def test_mesh_key_ignores_float_noise_but_not_resolution():
+    assert mesh_key(120.0, 14.0, 121.0, 15.0, 0.001) == mesh_key(120.0 + 1e-12, 14.0, 121.0, 15.0 - 1e-12, 0.001)
+    assert mesh_key(120.0, 14.0, 121.0, 15.0, 0.001) != mesh_key(120.0, 14.0, 121.0, 15.0, 0.0005)
+
+
+def test_sample_mesh_inputs_gives_vertex_elevation_and_centroid_rainfall():
+    # Two triangles splitting the unit square
+    vertex_x = np.array([0.0, 1.0, 1.0, 0.0, 1.0, 0.0])
+    vertex_y = np.array([0.0, 0.0, 1.0, 0.0, 1.0, 1.0])
+    centroid_x = vertex_x.reshape(-1, 3).mean(axis=1)
+    centroid_y = vertex_y.reshape(-1, 3).mean(axis=1)
+    mesh = SimulationMesh(object(), vertex_x, vertex_y, centroid_x, centroid_y)
+
+    # Elevation rises west to east, rain falls only on the northern half
+    terrain = np.tile(np.linspace(0.0, 100.0, 11), (11, 1))
+    precipitation = np.zeros((11, 11))
+    precipitation[:6] = 36.0
+
+    elevation, rainfall = sample_mesh_inputs(mesh, terrain, precipitation, (0.0, 0.0, 1.0, 1.0))
+
+    np.testing.assert_allclose(elevation, 100.0 * vertex_x.reshape(-1, 3))
+    assert rainfall.shape == (2,)
+    assert rainfall[1] > rainfall[0]  # The second triangle's centroid lies further north
+    assert rainfall.max() <= 36.0 / 3.6e6
+
+
+class _Quantity:
+    def __init__(self, values):
+        self.centroid_values = values
+
+
+class _StandInDomain:
+    """Stand-in domain whose centroid depths follow depth_at(time) (one 10 s timestep per call)."""
+
+    def __init__(self, depth_at):
+        self.depth_at = depth_at
+        self.time = 0.0
+        self.number_of_steps = 0
+        self.stage = _Quantity(depth_at(0.0).astype(float))
+        self.elevation = _Quantity(np.zeros_like(self.stage.centroid_values))
+
+    def get_quantity(self, name):
+        return self.stage if name == "stage" else self.elevation
+
+    def get_time(self):
+        return self.time
+
+    def set_quantity(self, name, values, location):
+        assert (name, location) == ("stage", "centroids")
+        self.stage.centroid_values[:] = values
+
+    def evolve(self, yieldstep, duration, skip_initial_step):
+        self.number_of_steps = int(round(duration / 10.0))
+        self.time += duration
+        self.stage.centroid_values[:] = self.depth_at(self.time)
+        yield self.time
+
+
+def relaxing(time_constant):
+    """Depth relaxing exponentially towards 1 m."""
+    return lambda t: np.full(4, 1.0 - np.exp(-t / time_constant))
+
+
+def test_evolve_until_steady_stops_early_once_depth_settles():
+    domain = _StandInDomain(relaxing(120.0))
+
+    run = evolve_until_steady(domain, final_time=3600.0, min_yieldstep=60.0, max_yieldstep=600.0, tolerance=0.001)
+
+    assert run["converged"]
+    assert run["simulated_time"] < 3600.0
+    assert run["simulated_time"] + run["extrapolated_time"] == 3600.0
+    assert run["steps"] == run["simulated_time"] / 10.0
+    assert run["yieldsteps"] < 3600.0 / 60.0
+    np.testing.assert_allclose(domain.stage.centroid_values, 1.0, atol=0.01)
+
+
+def test_evolve_until_steady_converges_under_steady_rain_and_extrapolates():
+    # Closed domain under constant rain: a hillslope reaches an equilibrium film,
+    # depressions keep filling at constant but different rates, so depths never settle
+    fill_rates = np.array([0.0, 0.02, 0.05, 0.2])  # meters/hour once the flow is steady
+    films = np.array([0.01, 0.0, 0.03, 0.1])
+
+    def depth_at(t):
+        return fill_rates * t / 3600.0 + films * (1.0 - np.exp(-t / 120.0))
+
+    domain = _StandInDomain(depth_at)
+
+    run = evolve_until_steady(domain, final_time=3600.0, min_yieldstep=60.0, max_yieldstep=600.0, tolerance=0.001)
+
+    assert run["converged"]
+    assert run["simulated_time"] <= 2400.0
+    np.testing.assert_allclose(domain.stage.centroid_values, depth_at(3600.0), atol=0.005)
+
+
+def test_evolve_until_steady_runs_to_final_time_without_steady_state():
+    domain = _StandInDomain(lambda t: np.full(4, (t / 3600.0) ** 2))  # Ever faster rise
+    yielded = []
+
+    run = evolve_until_steady(
+        domain, final_time=3600.0, min_yieldstep=60.0, max_yieldstep=600.0, tolerance=0.001,
+        on_yield=lambda elapsed, depth: yielded.append(elapsed)
+    )
+
+    assert len(yielded) == run["yieldsteps"]
+    assert yielded[-1] == run["simulated_time"]
+
+    assert not run["converged"]
+    assert run["simulated_time"] == 3600.0
+    assert run["extrapolated_time"] == 0.0
+
+
+def test_yieldstep_grows_while_settling_and_shrinks_when_rising():
+    assert next_yieldstep(60.0, 1.0, None, 60.0, 600.0) == 120.0
+    assert next_yieldstep(400.0, 0.5, 1.0, 60.0, 600.0) == 600.0
+    assert next_yieldstep(120.0, 2.0, 1.0, 60.0, 600.0) == 60.0
+
+
+def test_forecast_hours_are_chained_with_explicit_hours_and_their_own_rain():
+    simulator = AnugaSimulator()
+    simulator.available = True
+    hours = [datetime(2026, 10, 17, h, tzinfo=timezone.utc) for h in (6, 7, 8, 10)]
+    hourly = np.stack([np.full((4, 4), rate) for rate in (1.0, 5.0, 2.0, 0.0)])
+    calls = []
+
+    def run(precipitation, terrain, min_lon, min_lat, max_lon, max_lat, hour, normalize=True, cancel=None,
+            previous_hour=None):
+        warm = previous_hour is not None
+        calls.append((hour, previous_hour, float(precipitation.max()), normalize))
+        metadata = {
+            'mesh_cache': 'hit', 'warm_start': warm, 'simulated_time': 3600.0 if not warm else 1800.0,
+            'extrapolated_time': 0.0, 'steps': 10, 'yieldsteps': 2, 'converged': True,
+        }
+        return np.full((4, 4), precipitation.max() / 10.0), metadata
+
+    simulator._run_anuga_simulation = run
+    risk, metadata = simulator.simulate_forecast_hours(hourly, np.zeros((4, 4)), 120.9, 14.4, 121.2, 14.8, hours)
+
+    assert calls == [
+        (hours[0], None, 1.0, False),
+        (hours[1], hours[0], 5.0, False),
+        (hours[2], hours[1], 2.0, False),
+        (hours[3], hours[2], 0.0, False),
+    ]
+    np.testing.assert_allclose(risk, 1.0)  # Maximum depth over the hours, normalized
+    assert metadata['method'] == 'anuga'
+    assert metadata['forecast_hours'] == 4 and metadata['warm_starts'] == 3
+    assert metadata['simulated_time'] == 3600.0 + 3 * 1800.0
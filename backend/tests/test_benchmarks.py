@@ -0,0 +1,39 @@
+"""
+Tests for the pipeline benchmark's baseline comparison and measurement helpers.
+"""
+from app.core.config import settings
+from app.services.weather_cache import weather_cache
+from benchmarks.pipeline import OVERRIDDEN_SETTINGS, compare_to_baseline, measure, run_benchmarks
+
+
+def _result(p50_ms, alloc_peak_mb=10.0):
+    return {"p50_ms": p50_ms, "alloc_peak_mb": alloc_peak_mb}
+
+
+def test_slowdown_beyond_tolerance_is_a_regression():
+    baseline = {"512x512/end_to_end": _result(100.0)}
+    assert compare_to_baseline({"512x512/end_to_end": _result(120.0)}, baseline, 0.25) == []
+    assert len(compare_to_baseline({"512x512/end_to_end": _result(130.0)}, baseline, 0.25)) == 1
+
+
+def test_small_absolute_changes_are_noise():
+    baseline = {"256x256/weather_fetch_cached": _result(0.5, 0.5)}
+    results = {"256x256/weather_fetch_cached": _result(1.5, 1.2)}
+    assert compare_to_baseline(results, baseline, 0.25) == []
+
+
+def test_measure_reports_percentiles_and_allocations():
+    result = measure(lambda: bytearray(4 * 1024 * 1024), repeat=5)
+    assert result["runs"] == 5
+    assert result["p50_ms"] <= result["p90_ms"] <= result["p99_ms"] <= result["max_ms"]
+    assert result["alloc_peak_mb"] >= 4.0
+
+
+def test_run_leaves_the_settings_as_it_found_them(tmp_path):
+    before = {name: getattr(settings, name) for name in OVERRIDDEN_SETTINGS}
+
+    results = run_benchmarks([32], [64], repeat=1, workdir=str(tmp_path))
+    weather_cache.clear()
+
+    assert "32x32/end_to_end" in results
+    assert {name: getattr(settings, name) for name in OVERRIDDEN_SETTINGS} == before
@@ -0,0 +1,94 @@
+"""
+Tests for the cross-worker shared-memory terrain chip cache.
+"""
+import gc
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+
+from app.services.chip_cache import SHARED_CACHE_AVAILABLE, SharedChipCache, chip_key
+
+pytestmark = pytest.mark.skipif(not SHARED_CACHE_AVAILABLE, reason="requires fcntl")
+
+CHIP_BYTES = 64 * 64 * 4
+
+
+def _chip(value):
+    return np.full((64, 64), value, dtype=np.float32)
+
+
+def _put_from_other_process(path, value):
+    cache = SharedChipCache(path, 4 * CHIP_BYTES, CHIP_BYTES)
+    cache.put(chip_key("bbox", value), _chip(value))
+
+
+def _pin_until_killed(path, value, pinned):
+    cache = SharedChipCache(path, CHIP_BYTES, CHIP_BYTES)
+    view = cache.put(chip_key("bbox", value), _chip(value))
+    pinned.set()
+    while view is not None:  # Holds the pin until killed
+        time.sleep(1.0)
+
+
+def test_chip_written_by_one_worker_is_a_zero_copy_hit_in_another(tmp_path):
+    path = str(tmp_path / "chips")
+    cache = SharedChipCache(path, 4 * CHIP_BYTES, CHIP_BYTES)
+
+    process = multiprocessing.get_context("spawn").Process(target=_put_from_other_process, args=(path, 7.0))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+    view = cache.get(chip_key("bbox", 7.0))
+    assert view is not None and np.all(view == 7.0)
+    assert not view.flags.writeable
+    assert cache.get(chip_key("bbox", 8.0)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_skips_pinned_chips(tmp_path):
+    cache = SharedChipCache(str(tmp_path / "chips"), 2 * CHIP_BYTES, CHIP_BYTES)
+    pinned = cache.put(chip_key(1), _chip(1))
+    cache.put(chip_key(2), _chip(2))
+    gc.collect()
+
+    # Slot 1 is older but still referenced, so slot 2 is evicted instead
+    cache.put(chip_key(3), _chip(3))
+    assert cache.get(chip_key(2)) is None
+    assert np.all(cache.get(chip_key(1)) == 1)
+    assert np.all(pinned == 1)
+
+    del pinned
+    gc.collect()
+    cache.put(chip_key(4), _chip(4))
+    cache.put(chip_key(5), _chip(5))
+    assert cache.stats()["evictions"] >= 2
+
+
+def test_oversized_chip_is_not_cached(tmp_path):
+    cache = SharedChipCache(str(tmp_path / "chips"), 2 * CHIP_BYTES, CHIP_BYTES)
+    assert cache.put(chip_key("big"), np.zeros((256, 256), dtype=np.float32)) is None
+
+
+def test_pins_are_reclaimed_only_once_their_worker_has_died(tmp_path):
+    path = str(tmp_path / "chips")
+    cache = SharedChipCache(path, CHIP_BYTES, CHIP_BYTES)  # A single slot
+    context = multiprocessing.get_context("spawn")
+    pinned = context.Event()
+    process = context.Process(target=_pin_until_killed, args=(path, 1.0, pinned))
+    process.start()
+    try:
+        assert pinned.wait(30)
+        # However long a live worker holds its pin, the slot is not evicted
+        assert cache.put(chip_key("bbox", 2.0), _chip(2.0)) is None
+        assert np.all(cache.get(chip_key("bbox", 1.0)) == 1.0)
+    finally:
+        process.kill()
+        process.join()
+    gc.collect()
+
+    view = cache.put(chip_key("bbox", 2.0), _chip(2.0))
+    assert view is not None and np.all(view == 2.0)
+    assert cache.stats()["evictions"] == 1
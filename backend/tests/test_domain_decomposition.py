@@ -0,0 +1,126 @@
+"""
+Tests for splitting large bboxes into overlapping ANUGA subdomains.
+"""
+import asyncio
+import queue
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services.domain_decomposition import plan_subdomains, simulate_decomposed, stitch
+
+SMALL_BBOX = (120.9, 14.5, 121.1, 14.7)
+LARGE_BBOX = (119.0, 13.0, 124.0, 18.0)  # 80 x 80 cells at the default mesh resolution
+
+
+def test_small_bbox_is_one_domain():
+    subdomains = plan_subdomains((64, 64), SMALL_BBOX, max_triangles=20000, min_parts=4)
+
+    assert len(subdomains) == 1
+    assert subdomains[0].bbox == SMALL_BBOX
+    assert np.all(subdomains[0].weights == 1.0)
+
+
+def test_large_bbox_splits_into_overlapping_windows_that_blend_to_one():
+    shape = (100, 120)
+    subdomains = plan_subdomains(shape, LARGE_BBOX, max_triangles=20000, min_parts=4, overlap=0.15)
+
+    assert len(subdomains) == 4
+    coverage = np.zeros(shape, dtype=int)
+    for subdomain in subdomains:
+        coverage[subdomain.rows, subdomain.cols] += 1
+    assert coverage.min() == 1 and coverage.max() == 4  # Overlaps meet in the centre
+
+    # Weights are a partition of unity, so a constant field stitches exactly
+    ones = stitch(shape, subdomains, [np.ones(s.weights.shape) for s in subdomains])
+    np.testing.assert_allclose(ones, 1.0)
+    total = np.zeros(shape)
+    for subdomain in subdomains:
+        total[subdomain.rows, subdomain.cols] += subdomain.weights
+    np.testing.assert_allclose(total, 1.0)
+
+    # Window bboxes are the sample-centre extents of their pixels (row 0 north)
+    lons = np.linspace(LARGE_BBOX[0], LARGE_BBOX[2], shape[1])
+    lats = np.linspace(LARGE_BBOX[3], LARGE_BBOX[1], shape[0])
+    for subdomain in subdomains:
+        window_lons, window_lats = lons[subdomain.cols], lats[subdomain.rows]
+        np.testing.assert_allclose(
+            subdomain.bbox, (window_lons[0], window_lats[-1], window_lons[-1], window_lats[0])
+        )
+
+
+def test_simulate_decomposed_runs_windows_concurrently_and_stitches():
+    shape = (90, 90)
+    lon, lat = np.meshgrid(
+        np.linspace(LARGE_BBOX[0], LARGE_BBOX[2], shape[1]),
+        np.linspace(LARGE_BBOX[3], LARGE_BBOX[1], shape[0])
+    )
+    depth = 1.0 + np.sin(lon) * np.cos(lat)
+    subdomains = plan_subdomains(shape, LARGE_BBOX, max_triangles=20000, min_parts=4)
+
+    def simulate(precipitation, terrain, min_lon, min_lat, max_lon, max_lat, hour, cancel, previous_hour):
+        # Every window returns the field on its own grid
+        lons = np.linspace(min_lon, max_lon, precipitation.shape[1])
+        lats = np.linspace(max_lat, min_lat, precipitation.shape[0])
+        window_lon, window_lat = np.meshgrid(lons, lats)
+        metadata = {
+            'method': 'anuga', 'mesh_cache': 'miss', 'warm_start': False,
+            'simulated_time': 1800.0, 'extrapolated_time': 1800.0, 'steps': 10, 'yieldsteps': 3, 'converged': True,
+        }
+        return 1.0 + np.sin(window_lon) * np.cos(window_lat), metadata
+
+    in_flight, peak, affinities = [0], [0], []
+
+    async def run_subdomain(fn, *args, affinity=None):
+        affinities.append(affinity)
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return fn(*args)
+
+    risk, metadata = asyncio.run(simulate_decomposed(
+        run_subdomain, simulate, np.zeros(shape), np.zeros(shape), subdomains
+    ))
+
+    np.testing.assert_allclose(risk, depth / depth.max())
+    assert peak[0] == len(subdomains)
+    assert len(set(affinities)) == len(subdomains)
+    assert metadata['subdomains'] == len(subdomains)
+    assert metadata['method'] == 'anuga' and metadata['converged']
+
+
+def test_simulate_decomposed_chains_forecast_hours_per_subdomain():
+    shape = (90, 90)
+    subdomains = plan_subdomains(shape, LARGE_BBOX, max_triangles=20000, min_parts=4)
+    start = datetime(2026, 10, 17, 6, tzinfo=timezone.utc)
+    hours = [start + timedelta(hours=offset) for offset in range(3)]
+    hourly = np.stack([np.full(shape, rate) for rate in (1.0, 3.0, 2.0)])
+    checkpoints = set()
+
+    def simulate(precipitation, terrain, min_lon, min_lat, max_lon, max_lat, hour, cancel, previous_hour):
+        # Stands in for the checkpoint store: warm if this window checkpointed the previous hour
+        key = (min_lon, min_lat, max_lon, max_lat)
+        warm_start = (key, previous_hour) in checkpoints
+        checkpoints.add((key, hour))
+        metadata = {
+            'method': 'anuga', 'mesh_cache': 'hit', 'warm_start': warm_start,
+            'simulated_time': 3600.0, 'extrapolated_time': 0.0, 'steps': 10, 'yieldsteps': 3, 'converged': True,
+        }
+        return precipitation.copy(), metadata
+
+    async def run_subdomain(fn, *args, affinity=None):
+        return fn(*args)
+
+    snapshots = queue.Queue()
+    risk, metadata = asyncio.run(simulate_decomposed(
+        run_subdomain, simulate, hourly, np.zeros(shape), subdomains, hours=hours, snapshots=snapshots
+    ))
+
+    np.testing.assert_allclose(risk, 1.0)  # Maximum depth over the hours, normalized
+    assert len(checkpoints) == len(subdomains) * len(hours)
+    assert metadata['forecast_hours'] == 3 and metadata['warm_starts'] == 2
+    assert metadata['steps'] == 30
+    frames = [snapshots.get_nowait() for _ in range(snapshots.qsize())]
+    assert [elapsed for elapsed, _ in frames] == [3600.0, 7200.0, 10800.0]
+    assert frames[0][1].max() == 255
@@ -0,0 +1,115 @@
+"""
+Tests for the stage executor.
+"""
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from app.services.anuga_simulator import AnugaSimulator
+from app.services.executor import StageExecutor, create_stage_executor
+
+
+def test_blocking_stage_does_not_stall_event_loop():
+    executor = StageExecutor(thread_workers=1, process_workers=0)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        await executor.run_in_thread("blocking", time.sleep, 0.2)
+        tick_task.cancel()
+        return ticks
+
+    assert asyncio.run(main()) >= 10
+    executor.shutdown()
+
+
+def test_queue_wait_is_recorded_per_stage():
+    executor = StageExecutor(thread_workers=1, process_workers=0)
+
+    async def main():
+        await asyncio.gather(*[executor.run_in_thread("terrain", time.sleep, 0.05) for _ in range(3)])
+
+    asyncio.run(main())
+    stats = executor.stats()["terrain"]
+    executor.shutdown()
+
+    assert stats["calls"] == 3
+    assert stats["queue_wait_max_s"] >= 0.08
+    assert stats["run_total_s"] >= 0.15
+
+
+def test_process_stage_runs_simulator_method():
+    executor = StageExecutor(thread_workers=1, process_workers=1)
+    simulator = AnugaSimulator()
+    precipitation = np.full((32, 32), 20.0)
+    terrain = np.linspace(0, 100, 32 * 32).reshape(32, 32)
+
+    result = asyncio.run(
+        executor.run_in_process("simulation", simulator._simple_flood_estimation, precipitation, terrain)
+    )
+    executor.shutdown()
+
+    np.testing.assert_allclose(result, simulator._simple_flood_estimation(precipitation, terrain))
+    assert executor.stats()["simulation"]["calls"] == 1
+
+
+def test_affinity_routes_jobs_to_the_same_worker():
+    executor = StageExecutor(thread_workers=1, process_workers=2)
+
+    async def main():
+        first = await executor.run_in_process("simulation", os.getpid, affinity=("bbox", 1))
+        second = await executor.run_in_process("simulation", os.getpid, affinity=("bbox", 1))
+        return first, second
+
+    first, second = asyncio.run(main())
+    executor.shutdown()
+
+    assert first == second != os.getpid()
+
+
+def test_cancelled_caller_keeps_worker_busy_until_job_ends():
+    executor = StageExecutor(thread_workers=1, process_workers=1)
+
+    async def main():
+        await executor.run_in_process("simulation", os.getpid)  # Start the worker
+        task = asyncio.ensure_future(executor.run_in_process("simulation", time.sleep, 0.5))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.sleep(0)
+        busy_after_cancel = executor._process_pending[0]
+        await asyncio.sleep(0.6)
+        return busy_after_cancel, executor._process_pending[0]
+
+    busy_after_cancel, busy_after_job = asyncio.run(main())
+    executor.shutdown()
+
+    assert busy_after_cancel == 1
+    assert busy_after_job == 0
+
+
+def mark_worker_ready():
+    os.environ["FLOODLERT_TEST_WORKER_READY"] = "1"
+
+
+def worker_ready():
+    return os.environ.get("FLOODLERT_TEST_WORKER_READY")
+
+
+def test_process_workers_run_the_injected_initializer():
+    executor = create_stage_executor(initializer=mark_worker_ready)
+    try:
+        ready = asyncio.run(executor.run_in_process("simulation", worker_ready))
+    finally:
+        executor.shutdown()
+
+    assert ready == "1"
+    assert worker_ready() is None  # Only the worker processes ran it
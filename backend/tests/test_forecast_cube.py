@@ -0,0 +1,137 @@
+"""
+Tests for local forecast ingestion and the local_cube weather provider.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from app.api.v1.endpoints.predict import fetch_weather_data, read_local_cube_hours, weather_cycle
+from app.core.config import settings
+from app.services.forecast_cube import CURRENT_FILE, METADATA_FILE, ForecastCube, get_cube_store
+from app.services.weather_cache import current_forecast_cycle
+from app.tools.ingest_forecast import ingest_forecast
+
+BBOX = (120.9, 14.4, 121.2, 14.8)
+
+
+def write_netcdf(path, cycle, scale=1.0, hours=48):
+    """0.25 degree hourly precipitation amounts over Luzon, increasing eastwards and with forecast hour."""
+    lats = np.arange(10.0, 20.01, 0.25)
+    lons = np.arange(115.0, 130.01, 0.25)
+    steps = np.arange(1, hours + 1)
+    values = (
+        (lons[None, :, None] - 115.0) * scale
+        + steps[None, None, :] * 0.1
+        + np.zeros((len(lats), 1, 1))
+    )
+    times = np.datetime64(cycle.replace(tzinfo=None), "ns") + steps.astype("timedelta64[h]")
+    dataset = xr.Dataset(
+        {"tp": (("lat", "lon", "time"), values.astype(np.float32), {"units": "mm"})},
+        coords={"lat": lats, "lon": lons, "time": times},
+    )
+    dataset.to_netcdf(path)
+
+
+@pytest.fixture
+def cycle():
+    return (datetime.now(timezone.utc) - timedelta(hours=2)).replace(minute=0, second=0, microsecond=0)
+
+
+def test_chunked_reads_match_source_grid(tmp_path, cycle):
+    source = tmp_path / "forecast.nc"
+    write_netcdf(source, cycle)
+    name = ingest_forecast([str(source)], str(tmp_path / "cube"), cycle=cycle, chunk_size=8)
+
+    cube = ForecastCube(os.path.join(tmp_path / "cube", name))
+    values, (west, south, east, north) = cube.max_precipitation(*BBOX, 0, 24)
+
+    assert values.shape == (round((north - south) / 0.25) + 1, round((east - west) / 0.25) + 1)
+    expected_row = (np.linspace(west, east, values.shape[1]) - 115.0) + 24 * 0.1
+    np.testing.assert_allclose(values, np.broadcast_to(expected_row, values.shape), atol=1e-4)
+
+
+def test_local_cube_provider_slices_active_cycle(tmp_path, cycle, monkeypatch):
+    source = tmp_path / "forecast.nc"
+    write_netcdf(source, cycle)
+    ingest_forecast([str(source)], str(tmp_path / "cube"), cycle=cycle)
+    monkeypatch.setattr(settings, "WEATHER_API_PROVIDER", "local_cube")
+    monkeypatch.setattr(settings, "WEATHER_CUBE_PATH", str(tmp_path / "cube"))
+
+    precipitation, metadata = asyncio.run(fetch_weather_data(*BBOX))
+
+    assert metadata["source"].startswith("GFS Local Cube")
+    assert precipitation.shape == (settings.PREDICTION_IMAGE_HEIGHT, settings.PREDICTION_IMAGE_WIDTH)
+    # Eastward gradient of 1 mm/h per degree, sampled over the next 24 hours
+    assert precipitation[:, -1].mean() - precipitation[:, 0].mean() == pytest.approx(0.3, abs=0.02)
+    assert precipitation.max() == pytest.approx(BBOX[2] - 115.0 + 26 * 0.1, abs=0.2)
+
+
+def test_new_cycle_is_swapped_in_atomically(tmp_path, cycle):
+    cube_dir = str(tmp_path / "cube")
+    store = get_cube_store(cube_dir)
+    names = []
+    for i, scale in enumerate((1.0, 2.0, 3.0)):
+        source = tmp_path / f"forecast_{i}.nc"
+        write_netcdf(source, cycle + timedelta(hours=6 * i), scale)
+        names.append(ingest_forecast([str(source)], cube_dir, cycle=cycle + timedelta(hours=6 * i)))
+
+        current = store.current()
+        assert current.cycle == cycle + timedelta(hours=6 * i)
+        with open(os.path.join(cube_dir, CURRENT_FILE)) as f:
+            assert f.read() == names[-1]
+
+    # The active cycle and one previous cycle are kept
+    assert sorted(entry for entry in os.listdir(cube_dir) if entry != CURRENT_FILE) == names[1:]
+
+
+def test_pruning_keeps_the_latest_reference_times(tmp_path, cycle):
+    cube_dir = tmp_path / "cube"
+    # Directory names that sort the other way round from their cycles
+    for name, reference in (("a-newer", cycle), ("z-older", cycle - timedelta(hours=6))):
+        os.makedirs(cube_dir / name)
+        with open(cube_dir / name / METADATA_FILE, "w") as f:
+            json.dump({"cycle": reference.isoformat()}, f)
+    source = tmp_path / "forecast.nc"
+    write_netcdf(source, cycle + timedelta(hours=6))
+
+    name = ingest_forecast([str(source)], str(cube_dir), cycle=cycle + timedelta(hours=6))
+
+    assert sorted(entry for entry in os.listdir(cube_dir) if entry != CURRENT_FILE) == sorted(["a-newer", name])
+
+
+def test_predictions_are_keyed_on_the_active_cube_cycle(tmp_path, monkeypatch):
+    # Ingested a day late: the wall clock already points at a newer cycle
+    late = current_forecast_cycle() - timedelta(days=1)
+    source = tmp_path / "forecast.nc"
+    write_netcdf(source, late)
+    ingest_forecast([str(source)], str(tmp_path / "cube"), cycle=late)
+    monkeypatch.setattr(settings, "WEATHER_CUBE_PATH", str(tmp_path / "cube"))
+
+    assert weather_cycle() == current_forecast_cycle()  # Open-Meteo keeps the published cycle
+    monkeypatch.setattr(settings, "WEATHER_API_PROVIDER", "local_cube")
+    assert weather_cycle() == late
+
+
+def test_hourly_reads_chain_valid_hours_on_the_output_grid(tmp_path, cycle, monkeypatch):
+    source = tmp_path / "forecast.nc"
+    write_netcdf(source, cycle)
+    ingest_forecast([str(source)], str(tmp_path / "cube"), cycle=cycle, chunk_size=8)
+    monkeypatch.setattr(settings, "WEATHER_CUBE_PATH", str(tmp_path / "cube"))
+    cube = get_cube_store(str(tmp_path / "cube")).current()
+
+    hourly, extent = cube.precipitation_hours(*BBOX, 0, 24)
+    maximum, _ = cube.max_precipitation(*BBOX, 0, 24)
+    np.testing.assert_array_equal(hourly.max(axis=0), maximum)
+    np.testing.assert_allclose(hourly[1] - hourly[0], 0.1, atol=1e-4)  # Rates grow by 0.1 mm/h per forecast hour
+
+    chain = read_local_cube_hours(*BBOX, (16, 16))
+    assert chain is not None
+    rates, hours = chain
+    assert rates.shape == (len(hours), 16, 16)
+    assert all(later - earlier == timedelta(hours=1) for earlier, later in zip(hours, hours[1:]))
+    assert hours[0] > datetime.now(timezone.utc) - timedelta(hours=1)
@@ -0,0 +1,53 @@
+"""
+Tests for cached regular-grid interpolation weights.
+"""
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator, griddata
+
+from app.services.interpolation import fill_missing, grid_to_points, points_to_grid, regrid
+
+SRC_EXTENT = (120.0, 14.0, 120.4, 14.3)
+DST_EXTENT = (120.05, 14.02, 120.33, 14.27)
+
+
+def _reference(values, extent, x, y):
+    min_x, min_y, max_x, max_y = extent
+    height, width = values.shape
+    ys = np.linspace(min_y, max_y, height)
+    xs = np.linspace(min_x, max_x, width)
+    interp = RegularGridInterpolator((ys, xs), np.flipud(values))
+    return interp(np.column_stack([np.ravel(y), np.ravel(x)]))
+
+
+def test_regrid_matches_bilinear_reference():
+    values = np.random.default_rng(0).random((7, 9))
+    out = regrid(values, SRC_EXTENT, (64, 48), DST_EXTENT)
+
+    x, y = np.meshgrid(np.linspace(120.05, 120.33, 48), np.linspace(14.27, 14.02, 64))
+    expected = _reference(values, SRC_EXTENT, x, y).reshape(64, 48)
+    np.testing.assert_allclose(out, expected, atol=1e-12)
+
+
+def test_grid_to_points_matches_regrid_on_grid_points():
+    values = np.random.default_rng(1).random((5, 5))
+    x, y = np.meshgrid(np.linspace(120.05, 120.33, 16), np.linspace(14.27, 14.02, 16))
+
+    sampled = grid_to_points(values, SRC_EXTENT, x.ravel(), y.ravel()).reshape(16, 16)
+    np.testing.assert_allclose(sampled, regrid(values, SRC_EXTENT, (16, 16), DST_EXTENT), atol=1e-12)
+
+
+def test_points_to_grid_matches_griddata():
+    rng = np.random.default_rng(2)
+    points = rng.random((500, 2)) * [0.4, 0.3] + [120.0, 14.0]
+    values = np.sin(points[:, 0] * 50) + points[:, 1]
+    out = points_to_grid(values, points[:, 0], points[:, 1], (32, 32), SRC_EXTENT)
+
+    x, y = np.meshgrid(np.linspace(120.0, 120.4, 32), np.linspace(14.3, 14.0, 32))
+    expected = griddata(points, values, (x, y), method="linear", fill_value=0.0)
+    np.testing.assert_allclose(out, expected, atol=1e-9)
+
+
+def test_fill_missing_uses_nearest_valid_cell():
+    values = np.array([[1.0, np.nan, np.nan], [np.nan, np.nan, 5.0]])
+    filled = fill_missing(values)
+    np.testing.assert_array_equal(filled, [[1.0, 1.0, 5.0], [1.0, 5.0, 5.0]])
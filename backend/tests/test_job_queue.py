@@ -0,0 +1,181 @@
+"""
+Tests for the prioritized prediction job queue.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.services.executor import StageExecutor
+from app.services.job_queue import INTERACTIVE, PREFETCH, JobCancelled, PredictionJobQueue
+
+
+def test_interactive_jobs_run_before_prefetch():
+    queue = PredictionJobQueue(max_running=1)
+    order = []
+
+    def job(name, gate=None):
+        async def compute():
+            order.append(name)
+            if gate is not None:
+                await gate.wait()
+            return name
+        return compute
+
+    async def main():
+        gate = asyncio.Event()
+        blocker = asyncio.ensure_future(queue.run("blocker", job("blocker", gate)))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.ensure_future(queue.run("prefetch", job("prefetch"), priority=PREFETCH)),
+            asyncio.ensure_future(queue.run("pan", job("pan"), priority=INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert queue.stats()["queue_depth"] == 2
+        gate.set()
+        return await asyncio.gather(blocker, *waiting)
+
+    assert asyncio.run(main()) == ["blocker", "prefetch", "pan"]
+    assert order == ["blocker", "pan", "prefetch"]
+    assert queue.stats()["queue_depth"] == 0
+
+
+def test_thread_only_jobs_are_not_held_behind_simulations():
+    queue = PredictionJobQueue(max_running=4, max_simulations=1)
+    gate = asyncio.Event()
+
+    async def simulate():
+        await gate.wait()
+        return "anuga"
+
+    async def raster():
+        return "raster"
+
+    async def main():
+        simulations = [
+            asyncio.ensure_future(queue.run(f"sim-{i}", simulate, simulation=True)) for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        assert queue.stats()["simulations_running"] == 1
+        # Queued after two simulations still waiting for the busy slot, yet runs straight away
+        result = await asyncio.wait_for(queue.run("raster", raster, priority=PREFETCH), timeout=1.0)
+        assert queue.stats()["queue_depth"] == 2
+        gate.set()
+        return result, await asyncio.gather(*simulations)
+
+    assert asyncio.run(main()) == ("raster", ["anuga"] * 3)
+    assert queue.stats()["simulations_running"] == 0
+
+
+def test_equal_keys_share_a_job_that_outlives_one_waiter():
+    queue = PredictionJobQueue(max_running=2)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b"png"
+
+    async def main():
+        leaving = asyncio.ensure_future(queue.run("bbox", compute))
+        staying = asyncio.ensure_future(queue.run("bbox", compute))
+        await asyncio.sleep(0.01)
+        leaving.cancel()  # Client disconnected
+        return await staying
+
+    assert asyncio.run(main()) == b"png"
+    assert len(calls) == 1
+    assert queue.stats()["coalesced"] == 1
+    assert queue.cancelled == {"disconnected": 0, "superseded": 0}
+
+
+def test_disconnect_drops_a_queued_job():
+    queue = PredictionJobQueue(max_running=1)
+    ran = []
+
+    async def compute(name, delay):
+        ran.append(name)
+        await asyncio.sleep(delay)
+        return name
+
+    async def main():
+        running = asyncio.ensure_future(queue.run("a", lambda: compute("a", 0.05)))
+        queued = asyncio.ensure_future(queue.run("b", lambda: compute("b", 0.0)))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await running
+
+    asyncio.run(main())
+    assert ran == ["a"]
+    assert queue.cancelled["disconnected"] == 1
+
+
+def test_newer_bbox_from_a_session_cancels_the_running_job():
+    queue = PredictionJobQueue(max_running=1)
+    stopped = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.append("old")
+            raise
+
+    async def fast():
+        return "new"
+
+    async def main():
+        old = asyncio.ensure_future(queue.run("old bbox", slow, session="tab-1"))
+        await asyncio.sleep(0.01)
+        new = await queue.run("new bbox", fast, session="tab-1")
+        with pytest.raises(JobCancelled) as cancelled:
+            await old
+        return new, cancelled.value.reason
+
+    assert asyncio.run(main()) == ("new", "superseded")
+    assert stopped == ["old"]
+    assert queue.cancelled["superseded"] == 1
+    assert queue.stats()["running"] == 0
+
+
+def wait_until_cancelled(cancel, marker, timeout):
+    """Stand-in simulation: runs until cancel is set, then leaves a marker file."""
+    stopped = cancel.wait(timeout)
+    with open(marker, "w") as f:
+        f.write(str(os.getpid()))
+    return stopped
+
+
+def test_superseded_job_stops_its_worker_before_the_next_job_runs(tmp_path):
+    executor = StageExecutor(thread_workers=1, process_workers=1)
+    executor.start()
+    queue = PredictionJobQueue(max_running=1)
+    marker = str(tmp_path / "stopped")
+
+    async def main():
+        await executor.run_in_process("simulation", os.getpid)  # Start the worker
+        cancel = executor.cancel_event()
+
+        async def superseded():
+            return await executor.run_in_process(
+                "simulation", wait_until_cancelled, cancel, marker, 30.0, cancel=cancel
+            )
+
+        async def latest():
+            return os.path.exists(marker)  # The superseded run has stopped by now
+
+        first = asyncio.ensure_future(queue.run("pan-1", superseded, session="s"))
+        await asyncio.sleep(0.5)
+        second = await queue.run("pan-2", latest, session="s")
+        with pytest.raises(JobCancelled):
+            await first
+        return second
+
+    started = time.monotonic()
+    try:
+        assert asyncio.run(main()) is True
+    finally:
+        executor.shutdown()
+    assert time.monotonic() - started < 10.0
+    assert queue.stats()["running"] == 0
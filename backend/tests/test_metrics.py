@@ -0,0 +1,52 @@
+"""
+Tests for per-stage Server-Timing headers and the /metrics endpoint.
+"""
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry, StageTimings
+from app.main import app
+
+BBOX = {"min_lon": 120.9, "min_lat": 14.4, "max_lon": 121.2, "max_lat": 14.8}
+STAGES = ["weather", "terrain", "simulation", "normalization", "png_encode", "total"]
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5.0, stage="a")
+
+    text = registry.render()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1.0' in text
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 2.0' in text
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3.0' in text
+    assert 'test_seconds_count{stage="a"} 3.0' in text
+
+
+def test_server_timing_format():
+    timings = StageTimings()
+    with timings.stage("weather"):
+        pass
+    assert timings.server_timing({"total": 0.25}).endswith("total;dur=250.0")
+    assert timings.server_timing().startswith("weather;dur=")
+
+
+def test_prediction_reports_stage_timings_and_metrics(stand_in_server):
+    with TestClient(app) as client:
+        response = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+        metrics = client.get("/metrics")
+
+    assert response.status_code == 200
+    names = [entry.split(";")[0].strip() for entry in response.headers["Server-Timing"].split(",")]
+    assert names == STAGES
+
+    assert metrics.status_code == 200
+    text = metrics.text
+    assert 'floodlert_stage_duration_seconds_count{stage="simulation"}' in text
+    assert 'floodlert_weather_source_total{source="open-meteo"}' in text
+    assert 'floodlert_simulation_method_total{method="heuristic"}' in text
+    assert 'floodlert_predictions_total{outcome="success"}' in text
+    assert "floodlert_output_bytes_count" in text
+    assert 'floodlert_weather_cache_lookups_total{result="miss"}' in text
@@ -0,0 +1,47 @@
+"""
+Tests for the batched Open-Meteo client, run against a local stand-in server.
+"""
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+
+
+BBOX = {"min_lon": 120.9, "min_lat": 14.4, "max_lon": 121.2, "max_lat": 14.8}
+
+
+def test_one_upstream_request_per_prediction(stand_in_server):
+    with TestClient(app) as client:
+        response = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+
+    assert response.status_code == 200
+    assert response.headers["X-Weather-Source"] == "Open-Meteo"
+    assert float(response.headers["X-Weather-MaxPrecip"]) > 0
+    assert len(stand_in_server.requests) == 1
+    assert stand_in_server.requests[0] > 1
+
+
+def test_rejected_batch_falls_back_to_chunks(stand_in_server, monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_BATCH_CHUNK_SIZE", 4)
+    stand_in_server.max_points = 4
+
+    with TestClient(app) as client:
+        response = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+
+    assert response.status_code == 200
+    assert response.headers["X-Weather-Source"] == "Open-Meteo"
+    n_points = stand_in_server.requests[0]
+    assert stand_in_server.requests[1:] and all(n <= 4 for n in stand_in_server.requests[1:])
+    assert sum(stand_in_server.requests[1:]) == n_points
+
+
+def test_pan_only_fetches_unseen_lattice_points(stand_in_server):
+    panned = dict(BBOX, min_lon=BBOX["min_lon"] + 0.1, max_lon=BBOX["max_lon"] + 0.1)
+
+    with TestClient(app) as client:
+        client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+        client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+        client.post(f"{settings.API_V1_STR}/predict", json=panned)
+
+    first, panned_fetch = stand_in_server.requests
+    assert panned_fetch < first
@@ -0,0 +1,12 @@
+"""
+Tests for the prediction endpoint helpers.
+"""
+from app.api.v1.endpoints.predict import normalize_bbox
+
+
+def test_near_identical_bboxes_normalize_to_same_key():
+    a = normalize_bbox(120.9012, 14.4003, 121.1995, 14.7991)
+    b = normalize_bbox(120.9049, 14.4071, 121.1951, 14.7911)
+
+    assert a == b == (120.9, 14.4, 121.2, 14.8)
+    assert normalize_bbox(120.9, 14.4, 121.2, 14.8) == (120.9, 14.4, 121.2, 14.8)
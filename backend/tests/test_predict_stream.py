@@ -0,0 +1,70 @@
+"""
+Tests for the streamed (Server-Sent Events) prediction endpoint.
+"""
+import asyncio
+import base64
+import io
+import json
+import queue
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api.v1.endpoints import predict
+from app.core.config import settings
+from app.main import app
+
+BBOX = {"min_lon": 120.9, "min_lat": 14.4, "max_lon": 121.2, "max_lat": 14.8}
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def image_size(payload):
+    return Image.open(io.BytesIO(base64.b64decode(payload["png"]))).size
+
+
+def test_stream_sends_preview_then_final(stand_in_server):
+    with TestClient(app) as client:
+        response = client.post(f"{settings.API_V1_STR}/predict/stream", json=BBOX)
+        cached = client.post(f"{settings.API_V1_STR}/predict/stream", json=BBOX)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert [name for name, _ in events][0] == "preview"
+    assert events[-1][0] == "final"
+    size = settings.PREDICTION_STREAM_PREVIEW_SIZE
+    assert image_size(events[0][1]) == (size, size)
+    final = events[-1][1]
+    assert image_size(final) == (settings.PREDICTION_IMAGE_WIDTH, settings.PREDICTION_IMAGE_HEIGHT)
+    assert final["headers"]["X-Bounds-MinLon"]
+
+    # The finished prediction was cached: the second stream is just the final frame
+    cached_events = parse_events(cached.text)
+    assert [name for name, _ in cached_events] == ["final"]
+    assert cached_events[0][1]["headers"]["Server-Timing"].startswith('cache;desc="hit"')
+
+
+def test_forward_snapshots_sends_only_the_newest():
+    snapshots = queue.Queue()
+    for simulated_time in (60.0, 120.0):
+        snapshots.put((simulated_time, np.full((8, 8), simulated_time, dtype=np.uint8)))
+
+    async def forward():
+        progress = asyncio.Queue()
+        done = asyncio.Event()
+        done.set()
+        await predict.forward_snapshots(snapshots, progress, done)
+        return [progress.get_nowait() for _ in range(progress.qsize())]
+
+    frames = asyncio.run(forward())
+    assert len(frames) == 1
+    event, payload = frames[0]
+    assert event == "snapshot" and payload["simulated_time"] == 120.0
@@ -0,0 +1,79 @@
+"""
+Tests for the prefetch scheduler and the prediction cache it fills.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import predict
+from app.core.config import settings
+from app.main import app
+from app.services.prediction_cache import prediction_cache
+from app.services.prefetch import PrefetchScheduler
+from app.services.weather_cache import current_forecast_cycle
+
+BBOX = {"min_lon": 120.9, "min_lat": 14.4, "max_lon": 121.2, "max_lat": 14.8}
+CYCLE = datetime(2024, 7, 24, 6, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(clock, top_n=2):
+    return PrefetchScheduler(
+        top_n=top_n, half_life_s=3600, cpu_budget=0.5, check_interval_s=1, max_tracked=100,
+        cycle_fn=lambda: CYCLE, clock=clock
+    )
+
+
+def test_counts_decay_with_half_life():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    for _ in range(4):
+        scheduler.record("old")
+    clock.now = 2 * 3600  # Two half-lives: 4 requests now weigh 1
+    for _ in range(2):
+        scheduler.record("new")
+
+    (first, first_score), (second, second_score) = scheduler.hot_tiles()
+    assert (first, second) == ("new", "old")
+    assert first_score == 2.0 and second_score == 1.0
+
+
+def test_new_cycle_prefetches_top_tiles_not_cached():
+    scheduler = make_scheduler(FakeClock())
+    for tile, hits in (("a", 3), ("b", 2), ("c", 1)):
+        for _ in range(hits):
+            scheduler.record(tile)
+    computed = []
+
+    async def compute(tile, cycle):
+        computed.append((tile, cycle))
+
+    assert scheduler.schedule(CYCLE, skip=lambda key: key[0] == "a") == 1
+    assert scheduler.stats()["queue_depth"] == 1
+    asyncio.run(scheduler.run_pending(compute))
+
+    assert computed == [("b", CYCLE)]
+    assert scheduler.stats()["queue_depth"] == 0
+    assert scheduler.completed == 1
+
+
+def test_prefetched_prediction_serves_live_request(stand_in_server):
+    bbox = predict.normalize_bbox(*BBOX.values())
+    asyncio.run(predict.prefetch_prediction(bbox, current_forecast_cycle()))
+
+    with TestClient(app) as client:
+        response = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+        health = client.get("/health").json()
+
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith('cache;desc="hit"')
+    assert prediction_cache.prefetch_hits == 1
+    assert health["prefetch"]["hit_contribution"] > 0
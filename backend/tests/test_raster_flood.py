@@ -0,0 +1,178 @@
+"""
+Tests for the raster flood engine.
+"""
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from app.services.raster_flood import (
+    RasterFloodSimulator, cell_size_m, condition_terrain, conditioning_from_directions, d8_directions,
+    fill_depressions, flow_accumulation, pond, priority_flood, receivers_from_directions
+)
+from benchmarks.flood_methods import agreement, synthetic_scene
+
+
+def _reference_fill(elevation):
+    """Fill by iterated erosion from the border (slow but obviously correct)."""
+    filled = np.full_like(elevation, np.inf)
+    border = np.zeros(elevation.shape, dtype=bool)
+    border[[0, -1], :] = border[:, [0, -1]] = True
+    filled[border] = elevation[border]
+    while True:
+        lowered = np.maximum(elevation, ndimage.minimum_filter(filled, size=3))
+        if np.array_equal(lowered, filled):
+            return filled
+        filled = lowered
+
+
+def test_fill_matches_reference_and_drains_every_cell():
+    terrain, _ = synthetic_scene(64, seed=1)
+    direction, _ = d8_directions(terrain, 30.0, 30.0)
+
+    filled, receiver = fill_depressions(terrain, direction)
+
+    np.testing.assert_allclose(filled, _reference_fill(terrain), atol=1e-3)
+    # Every cell's water leaves the grid: accumulation at the outlets is the cell count
+    outlets = receiver == receiver.size
+    assert flow_accumulation(receiver, np.ones(receiver.size))[outlets].sum() == receiver.size
+
+
+def test_priority_flood_matches_reference_and_routes_flats():
+    terrain, _ = synthetic_scene(64, seed=3)
+    terrain[20:30, 20:40] = terrain.min() - 5.0  # Flat-bottomed pit
+
+    filled, direction = priority_flood(terrain, 30.0, 30.0)
+
+    np.testing.assert_allclose(filled, _reference_fill(terrain), atol=1e-3)
+    assert direction.dtype == np.int8
+    interior = direction[1:-1, 1:-1]
+    assert (interior >= 0).all()
+    # Directions never lead uphill in the filled DEM, and all water leaves the grid
+    receiver = receivers_from_directions(direction)
+    inside = receiver < receiver.size
+    assert (filled.ravel()[receiver[inside]] <= filled.ravel()[inside]).all()
+    accumulation = flow_accumulation(receiver, np.ones(receiver.size))
+    assert accumulation[~inside].sum() == receiver.size
+
+
+def test_stored_conditioning_gives_the_same_depths():
+    terrain, precipitation = synthetic_scene(48, seed=4)
+    extent = (121.0, 14.5, 121.05, 14.55)
+    cell_x, cell_y = cell_size_m(terrain.shape, extent)
+    filled, direction = priority_flood(terrain, cell_x, cell_y)
+    accumulation = flow_accumulation(receivers_from_directions(direction), np.ones(terrain.size))
+    simulator = RasterFloodSimulator()
+
+    stored = conditioning_from_directions(terrain, filled, direction, cell_x, cell_y)
+    depth = simulator.water_depth(precipitation, terrain, extent, stored)
+    assert np.corrcoef(depth.ravel(), simulator.water_depth(precipitation, terrain, extent).ravel())[0, 1] > 0.95
+
+    # Counted over the grid itself, the accumulation adds no inflow from outside
+    with_accumulation = conditioning_from_directions(
+        terrain, filled, direction, cell_x, cell_y, accumulation.reshape(terrain.shape)
+    )
+    np.testing.assert_array_equal(with_accumulation.inflow, 0.0)
+    np.testing.assert_allclose(
+        simulator.water_depth(precipitation, terrain, extent, with_accumulation), depth, rtol=1e-6
+    )
+
+
+def test_chip_routes_level_catchment_the_same_under_uniform_and_uneven_rain():
+    # 200 x 200 level sloping east; the chip is its eastern quarter, so most catchment lies outside it
+    level = np.tile(np.linspace(100.0, 0.0, 200), (200, 1))
+    level += np.random.default_rng(0).random(level.shape) * 0.5
+    extent = (121.0, 14.5, 121.2, 14.7)
+    cell_x, cell_y = cell_size_m(level.shape, extent)
+    filled, direction = priority_flood(level, cell_x, cell_y)
+    accumulation = flow_accumulation(receivers_from_directions(direction), np.ones(level.size)).reshape(level.shape)
+    window = np.s_[49:151, 149:200]  # Halo of one cell on every side
+    chip = conditioning_from_directions(
+        level[window], filled[window], direction[window], cell_x, cell_y, accumulation[window], halo=1
+    )
+    terrain = level[window][1:-1, 1:-1]
+    assert chip.inflow.sum() > terrain.size  # Water from the rest of the level enters across the western edge
+
+    simulator = RasterFloodSimulator()
+    uniform = np.full(terrain.shape, 10.0)
+    uneven = uniform.copy()
+    uneven[:terrain.shape[0] // 2, :terrain.shape[1] // 2] *= 1.06  # 6% more rain on a quarter of the chip
+    depth = simulator.water_depth(uniform, terrain, extent, chip)
+    uneven_depth = simulator.water_depth(uneven, terrain, extent, chip)
+
+    assert uneven_depth.max() == pytest.approx(depth.max(), rel=0.05)
+    assert np.all(uneven_depth >= depth - 1e-9)
+
+
+def test_flow_accumulation_on_a_slope():
+    elevation = np.tile(np.arange(5, 0, -1, dtype=np.float64), (3, 1))  # Falls west to east
+    direction, _ = d8_directions(elevation, 1.0, 1.0)
+    direction[:, -1] = -1
+
+    accumulation = flow_accumulation(receivers_from_directions(direction), np.ones(elevation.size))
+
+    np.testing.assert_array_equal(accumulation.reshape(3, 5)[1], [1, 2, 3, 4, 5])
+
+
+def test_flow_accumulation_matches_walking_every_flow_path():
+    terrain, _ = synthetic_scene(40, seed=2)
+    receiver = condition_terrain(terrain, 30.0, 30.0).receiver
+    weights = np.random.default_rng(0).random(receiver.size)
+
+    expected = np.zeros(receiver.size)
+    for source in range(receiver.size):
+        cell = source
+        while cell != receiver.size:
+            expected[cell] += weights[source]
+            cell = receiver[cell]
+
+    np.testing.assert_allclose(flow_accumulation(receiver, weights), expected)
+
+
+def test_ponding_stores_inflow_up_to_capacity():
+    elevation = np.full((5, 5), 10.0)
+    elevation[1:4, 1:4] = [[5, 5, 5], [5, 4, 5], [5, 5, 5]]
+    filled = np.full((5, 5), 10.0)
+    inflow = np.zeros((5, 5))
+    inflow[2, 2] = 9.0  # m³ reaching the pit
+
+    depth = pond(elevation, filled, inflow, cell_area=1.0)
+
+    assert depth.sum() == pytest.approx(9.0)
+    assert depth[2, 2] > depth[1, 1] > 0
+
+    inflow[2, 2] = 1e6
+    np.testing.assert_allclose(pond(elevation, filled, inflow, 1.0), filled - elevation)
+
+
+def test_rain_collects_in_a_bowl():
+    rows, cols = np.mgrid[-20:21, -20:21]
+    terrain = 50.0 + (rows ** 2 + cols ** 2) * 0.05
+    terrain[rows ** 2 + cols ** 2 > 300] = 80.0  # Rim
+    precipitation = np.full(terrain.shape, 20.0)
+
+    risk, metadata = RasterFloodSimulator(storm_hours=1.0).simulate_flood_with_metadata(
+        precipitation, terrain, 121.0, 14.5, 121.01, 14.51
+    )
+
+    assert metadata["method"] == "raster"
+    assert risk.max() == 1.0
+    assert risk[20, 20] == 1.0
+    assert risk[20, 20] > risk[0, 0]
+
+
+def test_conditioning_can_be_reused():
+    terrain, precipitation = synthetic_scene(48, seed=2)
+    extent = (121.0, 14.5, 121.05, 14.55)
+    simulator = RasterFloodSimulator()
+    conditioning = condition_terrain(terrain, *cell_size_m(terrain.shape, extent))
+
+    np.testing.assert_allclose(
+        simulator.water_depth(precipitation, terrain, extent, conditioning),
+        simulator.water_depth(precipitation, terrain, extent)
+    )
+
+
+def test_agreement_scores():
+    a = np.arange(100, dtype=np.float64).reshape(10, 10)
+    assert agreement(a, a) == {"correlation": pytest.approx(1.0), "top_iou": 1.0}
+    assert agreement(a, -a)["top_iou"] == 0.0
@@ -0,0 +1,45 @@
+"""
+Tests for the warm-start checkpoint store.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services.simulation_checkpoint import CheckpointStore, forecast_hour
+
+KEY = (120.0, 14.0, 121.0, 15.0, 0.001)
+
+
+def test_checkpoint_round_trip_is_float32_per_hour(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints"), max_age_s=3600)
+    hour = datetime(2024, 7, 1, 6, 0, tzinfo=timezone.utc)
+    state = np.random.default_rng(0).random((3, 100))
+
+    assert store.get(KEY, hour) is None
+    store.put(KEY, hour + timedelta(minutes=20), state)
+
+    loaded = store.get(KEY, hour)
+    assert loaded.dtype == np.float32
+    np.testing.assert_allclose(loaded, state, rtol=1e-6)
+    assert store.get(KEY, hour + timedelta(hours=1)) is None
+    assert store.get(KEY[:-1] + (0.0005,), hour) is None
+
+
+def test_expired_checkpoints_are_pruned_on_write(tmp_path):
+    store = CheckpointStore(str(tmp_path), max_age_s=3600)
+    old_hour = datetime(2024, 7, 1, 0, 0, tzinfo=timezone.utc)
+    store.put(KEY, old_hour, np.zeros((3, 10)))
+    for entry in os.scandir(tmp_path):
+        os.utime(entry.path, (time.time() - 7200, time.time() - 7200))
+
+    store.put(KEY, old_hour + timedelta(hours=1), np.zeros((3, 10)))
+
+    assert store.get(KEY, old_hour) is None
+    assert store.get(KEY, old_hour + timedelta(hours=1)) is not None
+
+
+def test_forecast_hour_floors_to_utc_hour():
+    local = datetime(2024, 7, 1, 14, 45, 12, tzinfo=timezone(timedelta(hours=8)))
+    assert forecast_hour(local) == datetime(2024, 7, 1, 6, 0, tzinfo=timezone.utc)
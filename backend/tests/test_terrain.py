@@ -0,0 +1,170 @@
+"""
+Tests for windowed terrain reads and the dataset handle pool.
+"""
+import json
+import threading
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio import transform as rasterio_transform
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.warp import reproject
+
+from app.core.config import settings
+from app.services.raster_flood import RasterFloodSimulator
+from app.services.terrain import (
+    TerrainDatasetPool, conditioning_available, load_conditioned_chip, load_terrain_chip, plan_terrain_read
+)
+from app.services.terrain_pyramid import METADATA_FILE, tile_range
+from app.tools.build_terrain_pyramid import build_terrain_pyramid
+from app.tools.condition_terrain import condition_terrain
+
+BOUNDS = (120.0, 14.0, 122.0, 16.0)
+SIZE = 1024
+
+
+@pytest.fixture(scope="module")
+def dem_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("terrain") / "dem.tif")
+    x = np.linspace(0, 6 * np.pi, SIZE, dtype=np.float32)
+    elevation = ((np.sin(x)[None, :] * np.cos(x)[:, None] + 1.0) * 500.0).astype(np.float32)
+    with rasterio.open(
+        path, "w", driver="GTiff", width=SIZE, height=SIZE, count=1, dtype="float32",
+        crs=CRS.from_epsg(4326), transform=rasterio_transform.from_bounds(*BOUNDS, SIZE, SIZE),
+        tiled=True, blockxsize=256, blockysize=256
+    ) as dst:
+        dst.write(elevation, 1)
+        dst.build_overviews([2, 4, 8], Resampling.average)
+    return path
+
+
+def _full_read(path, shape, transform, crs):
+    with rasterio.open(path) as src:
+        out = np.zeros(shape, dtype=np.float32)
+        reproject(
+            source=src.read(1), destination=out, src_transform=src.transform, src_crs=src.crs,
+            dst_transform=transform, dst_crs=crs, resampling=Resampling.bilinear
+        )
+    return out
+
+
+def test_windowed_read_matches_full_read(dem_path):
+    shape = (128, 128)
+    transform = rasterio_transform.from_bounds(120.5, 14.5, 120.7, 14.7, *shape)
+    crs = CRS.from_epsg(4326)
+
+    with rasterio.open(dem_path) as src:
+        plan = plan_terrain_read(src, shape, transform, crs)
+    assert plan.overview_factor == 1
+    assert plan.window.width < SIZE / 4
+
+    chip = load_terrain_chip(dem_path, shape, transform, crs)
+    np.testing.assert_allclose(chip, _full_read(dem_path, shape, transform, crs), atol=1e-3)
+
+
+def test_zoomed_out_read_uses_overview(dem_path):
+    shape = (64, 64)
+    transform = rasterio_transform.from_bounds(*BOUNDS, *shape)
+
+    with rasterio.open(dem_path) as src:
+        plan = plan_terrain_read(src, shape, transform, CRS.from_epsg(4326))
+    assert plan.overview_factor == 8
+    assert plan.out_shape == (128, 128)
+
+
+def test_bbox_outside_raster_returns_zeros(dem_path):
+    transform = rasterio_transform.from_bounds(10.0, 10.0, 11.0, 11.0, 32, 32)
+    chip = load_terrain_chip(dem_path, (32, 32), transform, CRS.from_epsg(4326))
+    assert not chip.any()
+
+
+def test_pool_reuses_handles_per_thread(dem_path):
+    pool = TerrainDatasetPool(max_handles_per_thread=2)
+    main_handle = pool.get(dem_path)
+    assert pool.get(dem_path) is main_handle
+
+    other = {}
+    thread = threading.Thread(target=lambda: other.setdefault("handle", pool.get(dem_path)))
+    thread.start()
+    thread.join()
+
+    assert other["handle"] is not main_handle
+    assert pool.stats() == {"open_handles": 2, "opened": 2, "reused": 1}
+
+    pool.close_all()
+    assert main_handle.closed
+    assert pool.get(dem_path) is not main_handle
+
+
+def test_pool_counts_every_get_across_threads(dem_path):
+    pool = TerrainDatasetPool()
+
+    def read():
+        for _ in range(200):
+            pool.get(dem_path)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.stats() == {"open_handles": 8, "opened": 8, "reused": 8 * 199}
+    pool.close_all()
+
+
+def test_pyramid_chip_matches_warped_read(dem_path, tmp_path, monkeypatch):
+    pyramid_dir = str(tmp_path / "pyramid")
+    metadata = build_terrain_pyramid(dem_path, pyramid_dir)
+    assert metadata["levels"]
+
+    shape = (128, 128)
+    transform = rasterio_transform.from_bounds(120.5, 14.5, 121.0, 15.0, *shape)
+    crs = CRS.from_epsg(4326)
+    expected = load_terrain_chip(dem_path, shape, transform, crs)
+
+    monkeypatch.setattr(settings, "TERRAIN_PYRAMID_PATH", pyramid_dir)
+    chip = load_terrain_chip("missing.tif", shape, transform, crs)
+
+    assert chip.shape == shape
+    assert np.abs(chip - expected).mean() < 1.0
+
+
+def test_conditioned_pyramid_chip(tmp_path, monkeypatch):
+    # Small one-level pyramid: a valley draining south across 3x3 tiles of 32 pixels
+    zoom, tile_size = 10, 32
+    x0, y0, x1, y1 = tile_range(zoom, 120.95, 14.45, 121.15, 14.65)
+    rows, cols = np.mgrid[0:(y1 - y0) * tile_size, 0:(x1 - x0) * tile_size]
+    elevation = 100.0 - rows * 0.5 + np.abs(cols - cols.mean()) * 0.8
+    elevation += np.random.default_rng(0).random(elevation.shape) * 3.0
+    tiles = elevation.astype(np.float32).reshape(y1 - y0, tile_size, x1 - x0, tile_size).transpose(0, 2, 1, 3)
+    np.save(tmp_path / f"z{zoom}.npy", np.ascontiguousarray(tiles))
+    with open(tmp_path / METADATA_FILE, "w") as f:
+        json.dump({
+            "tile_size": tile_size,
+            "levels": {str(zoom): {"file": f"z{zoom}.npy", "x0": x0, "y0": y0, "nx": x1 - x0, "ny": y1 - y0}},
+        }, f)
+
+    metadata = condition_terrain(str(tmp_path))
+    assert set(metadata["levels"][str(zoom)]["layers"]) == {"filled", "direction", "accumulation"}
+
+    shape = (40, 40)
+    bbox = (121.0, 14.5, 121.1, 14.6)
+    transform = rasterio_transform.from_bounds(*bbox, *shape)
+    monkeypatch.setattr(settings, "TERRAIN_PYRAMID_PATH", str(tmp_path))
+    assert conditioning_available()
+    chip = load_conditioned_chip(shape, transform, CRS.from_epsg(4326))
+
+    assert chip is not None
+    assert chip.direction.dtype == np.int8 and chip.accumulation.dtype == np.float32
+    assert chip.terrain.shape == chip.filled.shape == chip.direction.shape
+    assert bbox[0] <= chip.extent[0] < chip.extent[2] <= bbox[2]
+    assert (chip.filled >= chip.terrain - 1e-4).all()
+
+    risk, simulation = RasterFloodSimulator().simulate_conditioned(np.full(shape, 20.0), chip, *bbox)
+    assert risk.shape == shape
+    assert simulation["conditioning"] == "precomputed"
+    # Water gathers along the valley floor
+    assert risk[:, 18:22].mean() > risk[:, :5].mean()
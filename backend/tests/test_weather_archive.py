@@ -0,0 +1,65 @@
+"""
+Tests for recording Open-Meteo responses and replaying them without network access.
+"""
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services import weather_archive
+from app.services.prediction_cache import prediction_cache
+from app.services.weather_cache import weather_cache
+
+BBOX = {"min_lon": 120.9, "min_lat": 14.4, "max_lon": 121.2, "max_lat": 14.8}
+
+
+def _record_then_switch_to_replay(stand_in_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "WEATHER_ARCHIVE_PATH", str(tmp_path / "archive.sqlite"))
+    monkeypatch.setattr(settings, "WEATHER_API_PROVIDER", "record")
+    with TestClient(app) as client:
+        recorded = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+    assert recorded.headers["X-Weather-Source"] == "Open-Meteo"
+    assert weather_archive.get_archive().stats()["series"] == stand_in_server.requests[0]
+
+    weather_cache.clear()
+    prediction_cache.clear()
+    monkeypatch.setattr(settings, "WEATHER_API_PROVIDER", "replay")
+    monkeypatch.setattr(weather_archive, "_rng", None)
+    return recorded
+
+
+def test_replay_serves_recorded_responses_without_upstream(stand_in_server, monkeypatch, tmp_path):
+    recorded = _record_then_switch_to_replay(stand_in_server, monkeypatch, tmp_path)
+    upstream_requests = len(stand_in_server.requests)
+
+    with TestClient(app) as client:
+        replayed = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+
+    assert replayed.status_code == 200
+    assert replayed.headers["X-Weather-Source"] == "Open-Meteo (replay)"
+    assert replayed.headers["X-Weather-MaxPrecip"] == recorded.headers["X-Weather-MaxPrecip"]
+    assert len(stand_in_server.requests) == upstream_requests
+
+
+def test_replay_injects_errors(stand_in_server, monkeypatch, tmp_path):
+    _record_then_switch_to_replay(stand_in_server, monkeypatch, tmp_path)
+    monkeypatch.setattr(settings, "WEATHER_REPLAY_ERROR_RATE", 1.0)
+
+    with TestClient(app) as client:
+        response = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+
+    assert response.status_code == 200
+    assert response.headers["X-Weather-Source"].startswith("Synthetic")
+
+
+def test_replay_of_unrecorded_cycle_finds_nothing(tmp_path):
+    archive = weather_archive.WeatherArchive(str(tmp_path / "archive.sqlite"))
+    cycle = datetime(2024, 7, 24, 0, tzinfo=timezone.utc)
+    archive.record(cycle, [14.45], [120.95], [[0.0, 12.5, 30.0]])
+
+    assert archive.lookup([14.45], [120.95]) == [[0.0, 12.5, 30.0]]
+    assert archive.lookup([14.45], [120.95], datetime(2024, 7, 24, 6, tzinfo=timezone.utc)) == [[0.0, 12.5, 30.0]]
+    assert archive.lookup([14.45], [120.95], datetime(2024, 7, 23, 18, tzinfo=timezone.utc)) == [None]
+    assert archive.lookup([14.5], [120.95]) == [None]
+    archive.close()
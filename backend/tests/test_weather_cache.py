@@ -0,0 +1,62 @@
+"""
+Tests for the lattice-snapped, forecast-cycle-aware weather cache.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.weather_cache import WeatherCache, current_forecast_cycle, lattice_for_bbox
+
+
+def test_lattice_encloses_bbox_and_is_shared_by_overlapping_boxes():
+    lat_a, lon_a = lattice_for_bbox(120.91, 14.41, 121.19, 14.69)
+    lat_b, lon_b = lattice_for_bbox(120.96, 14.43, 121.24, 14.71)
+    step = settings.WEATHER_LATTICE_STEP
+
+    assert lat_a[0] * step <= 14.41 and lat_a[-1] * step >= 14.69
+    assert lon_a[0] * step <= 120.91 and lon_a[-1] * step >= 121.19
+    assert len(np.intersect1d(lon_a, lon_b)) >= len(lon_a) - 2
+    assert len(np.intersect1d(lat_a, lat_b)) >= len(lat_a) - 1
+
+
+def test_large_bbox_uses_coarser_nested_lattice():
+    lat_indices, lon_indices = lattice_for_bbox(115.0, 5.0, 127.0, 20.0)
+    stride = lat_indices[1] - lat_indices[0]
+
+    assert len(lat_indices) <= settings.WEATHER_LATTICE_MAX_POINTS_PER_SIDE
+    assert len(lon_indices) <= settings.WEATHER_LATTICE_MAX_POINTS_PER_SIDE
+    assert stride > 1 and np.all(lat_indices % stride == 0)
+
+
+def test_entries_expire_with_forecast_cycle():
+    cache = WeatherCache(max_points=10)
+    cycle = current_forecast_cycle()
+    cache.put_many({(1, 2): [0.0, 3.0]}, cycle)
+
+    assert cache.get_many([(1, 2)], cycle) == {(1, 2): [0.0, 3.0]}
+    next_cycle = cycle + timedelta(hours=settings.WEATHER_FORECAST_CYCLE_HOURS)
+    assert cache.get_many([(1, 2)], next_cycle) == {}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_eviction():
+    cache = WeatherCache(max_points=2)
+    cycle = current_forecast_cycle()
+    cache.put_many({(0, 0): [1.0], (0, 1): [2.0]}, cycle)
+    cache.get_many([(0, 0)], cycle)
+    cache.put_many({(0, 2): [3.0]}, cycle)
+
+    assert set(cache.get_many([(0, 0), (0, 1), (0, 2)], cycle)) == {(0, 0), (0, 2)}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "weather_cache.json")
+    cache = WeatherCache(max_points=10)
+    cache.put_many({(5, 6): [1.5, 2.5]})
+    cache.put_many({(7, 8): [9.0]}, datetime(2000, 1, 1, tzinfo=timezone.utc))
+    cache.save(path)
+
+    restored = WeatherCache(max_points=10)
+    assert restored.load(path) == 1
+    assert restored.get_many([(5, 6)]) == {(5, 6): [1.5, 2.5]}
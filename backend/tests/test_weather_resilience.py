@@ -0,0 +1,94 @@
+"""
+Tests for bounded-latency weather fetching: deadlines, hedging, gap filling
+and the circuit breaker.
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services import open_meteo
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.weather_cache import current_forecast_cycle, lattice_for_bbox, weather_cache
+
+BBOX = {"min_lon": 120.9, "min_lat": 14.4, "max_lon": 121.2, "max_lat": 14.8}
+LATS, LONS = [14.4, 14.45, 14.5], [120.9, 120.95, 121.0]
+
+
+async def _fetch(**kwargs):
+    try:
+        return await open_meteo.fetch_hourly_precipitation(LATS, LONS, **kwargs)
+    finally:
+        await open_meteo.close_http_client()
+
+
+def test_straggler_is_hedged(stand_in_server, monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_HEDGE_DELAY", 0.1)
+    stand_in_server.delays = [3.0]  # Only the first request stalls
+
+    started = time.perf_counter()
+    series = asyncio.run(_fetch())
+
+    assert time.perf_counter() - started < 1.5
+    assert all(s is not None for s in series)
+    assert len(stand_in_server.requests) == 2
+
+
+def test_deadline_bounds_fetch_time(stand_in_server, monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_HEDGE_DELAY", 10.0)
+    stand_in_server.delays = [3.0]
+
+    started = time.perf_counter()
+    series = asyncio.run(_fetch(deadline=0.3))
+
+    assert time.perf_counter() - started < 1.0
+    assert series == [None] * len(LATS)
+
+
+def test_missing_points_are_filled_from_previous_cycle(stand_in_server, monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_FETCH_DEADLINE", 0.3)
+    monkeypatch.setattr(settings, "WEATHER_HEDGE_DELAY", 10.0)
+    stand_in_server.delays = [3.0]
+    previous_cycle = current_forecast_cycle() - timedelta(hours=settings.WEATHER_FORECAST_CYCLE_HOURS)
+    lat_indices, lon_indices = lattice_for_bbox(*BBOX.values())
+    weather_cache.put_many({(int(i), int(j)): [7.0] for i in lat_indices for j in lon_indices}, previous_cycle)
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        response = client.post(f"{settings.API_V1_STR}/predict", json=BBOX)
+        elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    assert response.headers["X-Weather-Source"] == "Open-Meteo"
+    assert float(response.headers["X-Weather-MaxPrecip"]) == pytest.approx(7.0)
+    assert elapsed < 2.5
+
+
+def test_breaker_opens_on_errors_and_recovers_after_trial():
+    now = [0.0]
+    breaker = CircuitBreaker("test", error_rate=0.5, min_requests=4, window_s=60, cooldown_s=30, clock=lambda: now[0])
+    for success in (True, False, False, True):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    now[0] = 31.0
+    assert breaker.allow()  # One trial request
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_open_breaker_skips_upstream(stand_in_server):
+    for _ in range(settings.WEATHER_BREAKER_MIN_REQUESTS):
+        open_meteo.breaker.record(False)
+
+    series = asyncio.run(_fetch())
+
+    assert series == [None] * len(LATS)
+    assert stand_in_server.requests == []
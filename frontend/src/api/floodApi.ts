@@ -6,17 +6,41 @@ import { BoundingBox, FloodPredictionResponse } from '../types';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
+// Identifies this tab to the server, so a newer request cancels the previous one
+let sessionId: string | undefined;
+
+/**
+ * Return this tab's session id, creating it on first use.
+ * crypto.randomUUID only exists in secure contexts (HTTPS or localhost).
+ */
+function getSessionId(): string {
+  if (sessionId === undefined) {
+    if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+      sessionId = crypto.randomUUID();
+    } else if (typeof crypto !== 'undefined' && typeof crypto.getRandomValues === 'function') {
+      const bytes = crypto.getRandomValues(new Uint8Array(16));
+      sessionId = Array.from(bytes, (byte) => byte.toString(16).padStart(2, '0')).join('');
+    } else {
+      sessionId = `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}`;
+    }
+  }
+  return sessionId;
+}
+
 /**
  * Predict flood risk for a bounding box.
  * Returns a blob URL for the prediction PNG image.
+ * Aborting the signal disconnects, which cancels the server-side computation.
  */
-export async function predictFlood(bbox: BoundingBox): Promise<FloodPredictionResponse> {
+export async function predictFlood(bbox: BoundingBox, signal?: AbortSignal): Promise<FloodPredictionResponse> {
   const response = await fetch(`${API_BASE_URL}/api/v1/predict`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      'X-Session-Id': getSessionId(),
     },
     body: JSON.stringify(bbox),
+    signal,
   });
 
   if (!response.ok) {
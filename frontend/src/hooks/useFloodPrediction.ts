@@ -18,27 +18,38 @@ export function useFloodPrediction(): UseFloodPredictionReturn {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const predictionRef = useRef<FloodPredictionResponse | null>(null);
+  const abortRef = useRef<AbortController | null>(null);
 
   const predict = useCallback(async (bbox: BoundingBox) => {
-    // Revoke previous prediction URL to free memory
-    if (predictionRef.current?.imageUrl) {
-      URL.revokeObjectURL(predictionRef.current.imageUrl);
-    }
+    // A newer pan supersedes the request still in flight
+    abortRef.current?.abort();
+    const controller = new AbortController();
+    abortRef.current = controller;
 
     setIsLoading(true);
     setError(null);
 
     try {
-      const response = await predictFlood(bbox);
+      const response = await predictFlood(bbox, controller.signal);
+      // Revoke previous prediction URL to free memory
+      if (predictionRef.current?.imageUrl) {
+        URL.revokeObjectURL(predictionRef.current.imageUrl);
+      }
       predictionRef.current = response;
       setPrediction(response);
     } catch (err) {
+      if (controller.signal.aborted) {
+        return;
+      }
       const errorMessage = err instanceof Error ? err.message : 'Failed to predict flood risk';
       setError(errorMessage);
       predictionRef.current = null;
       setPrediction(null);
     } finally {
-      setIsLoading(false);
+      if (abortRef.current === controller) {
+        abortRef.current = null;
+        setIsLoading(false);
+      }
     }
   }, []);
 
@@ -54,6 +65,7 @@ export function useFloodPrediction(): UseFloodPredictionReturn {
   // Cleanup on unmount
   useEffect(() => {
     return () => {
+      abortRef.current?.abort();
       if (predictionRef.current?.imageUrl) {
         URL.revokeObjectURL(predictionRef.current.imageUrl);
       }